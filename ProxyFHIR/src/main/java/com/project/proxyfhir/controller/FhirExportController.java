@@ -1,6 +1,8 @@
 package com.project.proxyfhir.controller;
 
 import org.springframework.beans.factory.annotation.Value;
+import org.springframework.core.io.FileSystemResource;
+import org.springframework.core.io.Resource;
 import org.springframework.http.HttpHeaders;
 import org.springframework.http.ResponseEntity;
 import org.springframework.stereotype.Controller;
@@ -20,7 +22,6 @@ import java.util.ArrayList;
 import java.util.HashMap;
 import java.util.List;
 import java.util.Map;
-import java.util.stream.Collectors;
 
 @Controller
 @RequestMapping("/bulk")
@@ -34,6 +35,19 @@ public class FhirExportController {
     @Value("${fhir.hospital.dir:/synthea-sample/FHIR-patients}")
     private String hospitalFhirDir;
 
+    /**
+     * Manifest entry of an export file. size and lastModified let clients skip
+     * files that have not changed since their last ingestion.
+     */
+    private static Map<String, String> fileEntry(Path p, String url) throws IOException {
+        Map<String, String> it = new HashMap<>();
+        it.put("fileName", p.getFileName().toString());
+        it.put("url", url);
+        it.put("size", String.valueOf(Files.size(p)));
+        it.put("lastModified", Files.getLastModifiedTime(p).toInstant().toString());
+        return it;
+    }
+
     /**
      * Endpoint to get hospital FHIR data manifest
      * Simulates a real hospital FHIR server bulk export
@@ -48,24 +62,19 @@ public class FhirExportController {
             return ResponseEntity.badRequest().body(m);
         }
 
-        List<String> files = new ArrayList<>();
+        List<Map<String, String>> items = new ArrayList<>();
         try (DirectoryStream<Path> ds = Files.newDirectoryStream(dir, "*.ndjson")) {
             for (Path p : ds) {
+                String f = p.getFileName().toString();
                 // Exclude log files
-                if (!p.getFileName().toString().equals("log.ndjson")) {
-                    files.add(p.getFileName().toString());
+                if (!f.equals("log.ndjson")) {
+                    Map<String, String> it = fileEntry(p, "/bulk/hospital/files/" + f);
+                    it.put("resourceType", f.split("\\.")[0]); // Extract resource type from filename
+                    items.add(it);
                 }
             }
         }
 
-        List<Map<String, String>> items = files.stream().map(f -> {
-            Map<String, String> it = new HashMap<>();
-            it.put("fileName", f);
-            it.put("url", "/bulk/hospital/files/" + f);
-            it.put("resourceType", f.split("\\.")[0]); // Extract resource type from filename
-            return it;
-        }).collect(Collectors.toList());
-
         Map<String, Object> out = new HashMap<>();
         out.put("exportId", "hospital-fhir-export");
         out.put("exportType", "hospital");
@@ -75,31 +84,32 @@ public class FhirExportController {
         return ResponseEntity.ok(out);
     }
 
+    /**
+     * Export file as a Resource body: Spring answers Range requests with
+     * 206 Partial Content, so clients can resume an interrupted download.
+     * Last-Modified lets them check the file did not change in between.
+     */
+    private static ResponseEntity.BodyBuilder fileResponse(Path file) throws IOException {
+        return ResponseEntity.ok()
+                .header(HttpHeaders.CONTENT_TYPE, "application/fhir+ndjson; charset=utf-8")
+                .header(HttpHeaders.ACCEPT_RANGES, "bytes")
+                .lastModified(Files.getLastModifiedTime(file).toMillis());
+    }
+
     /**
      * Get a specific file from hospital FHIR data
      */
     @GetMapping("/hospital/files/{filename:.+}")
-    public ResponseEntity<StreamingResponseBody> getHospitalFile(@PathVariable String filename) throws IOException {
+    public ResponseEntity<Resource> getHospitalFile(@PathVariable String filename) throws IOException {
         Path dir = Paths.get(hospitalFhirDir);
         Path file = dir.resolve(filename).normalize();
         if (!file.startsWith(dir) || !Files.exists(file)) {
             return ResponseEntity.notFound().build();
         }
 
-        StreamingResponseBody body = outputStream -> {
-            try (InputStream in = Files.newInputStream(file)) {
-                byte[] buffer = new byte[8192];
-                int len;
-                while ((len = in.read(buffer)) != -1) {
-                    outputStream.write(buffer, 0, len);
-                }
-            }
-        };
-
-        return ResponseEntity.ok()
-                .header(HttpHeaders.CONTENT_TYPE, "application/fhir+ndjson; charset=utf-8")
+        return fileResponse(file)
                 .header("X-FHIR-Source", "hospital-system")
-                .body(body);
+                .body(new FileSystemResource(file));
     }
 
     /**
@@ -193,18 +203,11 @@ public class FhirExportController {
             return ResponseEntity.badRequest().body(m);
         }
 
-        List<String> files = new ArrayList<>();
+        List<Map<String, String>> items = new ArrayList<>();
         try (DirectoryStream<Path> ds = Files.newDirectoryStream(dir, "*.ndjson")) {
-            for (Path p : ds) files.add(p.getFileName().toString());
+            for (Path p : ds) items.add(fileEntry(p, "/bulk/files/" + p.getFileName()));
         }
 
-        List<Map<String, String>> items = files.stream().map(f -> {
-            Map<String, String> it = new HashMap<>();
-            it.put("fileName", f);
-            it.put("url", "/bulk/files/" + f);
-            return it;
-        }).collect(Collectors.toList());
-
         Map<String, Object> out = new HashMap<>();
         out.put("exportId", "synthea-export");
         out.put("files", items);
@@ -212,26 +215,14 @@ public class FhirExportController {
     }
 
     @GetMapping("/files/{filename:.+}")
-    public ResponseEntity<StreamingResponseBody> getFile(@PathVariable String filename) throws IOException {
+    public ResponseEntity<Resource> getFile(@PathVariable String filename) throws IOException {
         Path dir = Paths.get(filesDir);
         Path file = dir.resolve(filename).normalize();
         if (!file.startsWith(dir) || !Files.exists(file)) {
             return ResponseEntity.notFound().build();
         }
 
-        StreamingResponseBody body = outputStream -> {
-            try (InputStream in = Files.newInputStream(file)) {
-                byte[] buffer = new byte[8192];
-                int len;
-                while ((len = in.read(buffer)) != -1) {
-                    outputStream.write(buffer, 0, len);
-                }
-            }
-        };
-
-        return ResponseEntity.ok()
-                .header(HttpHeaders.CONTENT_TYPE, "application/fhir+ndjson; charset=utf-8")
-                .body(body);
+        return fileResponse(file).body(new FileSystemResource(file));
     }
 
     @GetMapping("/resource/{resourceType}")
@@ -1,17 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status, BackgroundTasks
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Awaitable, Callable, NamedTuple, Optional
+from functools import partial
 from datetime import datetime
+import asyncio
 import json
+import secrets
 import time
 
-from app.db.session import get_db
-from app.services.fhir_client import FHIRClient, get_fhir_client
+from app.core.config import settings
+from app.db.session import get_db, get_async_db, AsyncSessionLocal
+from app.services.fhir_client import FHIRClient, critical_manifest_files, get_fhir_client
 from app.services.deid_service import deid_service
-from app.models import (
-    patient, encounter, condition, observation, medication_request, procedure, diagnostic_report,
-    document_reference, allergy_intolerance, immunization, practitioner, practitioner_role, organization
-)
+from app.services.batch_writer import filter_new_resources, write_batch, write_rows
+from app.services.copy_loader import load_rows
+from app.services.upsert_writer import content_hash, filter_changed_resources, upsert_rows
+from app.services.parallel_deid import deidentify_chunk, get_thread
+from app.services.pseudonym_store import pseudonym_store
+from app.services import raw_store
+from app.services.resource_registry import RESOURCE_SPECS, deidentify_resource
+from app.services.pagination import list_page
+from app.services.patient_bundle import patient_bundles
+from app.services.ndjson_export import export_statement, stream_ndjson
+from app.services.incremental import parse_timestamp, plan_incremental, record_ingestion, updated_since
+from app.services import ingest_jobs
+from app.services.db_reset import create_secondary_indexes, drop_secondary_indexes, reset_deid_tables
+from app.models import patient
+from app.models.ingest_job import IngestJob
 from app.models.schemas import (
     IngestionResult,
     PatientList, PatientSchema,
@@ -27,866 +46,198 @@ from app.models.schemas import (
     PractitionerList, PractitionerSchema,
     PractitionerRoleList, PractitionerRoleSchema,
     OrganizationList, OrganizationSchema,
+    DeidCacheStats,
+    IngestJobStatus, IngestJobList,
+    RawQueryResult,
+    PatientEverything, PatientEverythingRequest, PatientEverythingBatch,
 )
 
 router = APIRouter(prefix="/deid", tags=["De-Identification"])
 
 
-def parse_fhir_date(date_str: str) -> datetime:
-    """Parse FHIR date/datetime string."""
-    if not date_str:
-        return None
-    try:
-        # Try full datetime
-        return datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-    except:
-        try:
-            # Try date only
-            return datetime.strptime(date_str, '%Y-%m-%d')
-        except:
-            return None
-
-
-def process_patient(fhir_resource: Dict[str, Any], db: Session) -> patient.Patient:
-    """De-identify and store a Patient resource."""
-    resource_id = fhir_resource.get("id")
-    
-    # Check if already exists
-    existing = db.query(patient.Patient).filter(patient.Patient.resource_id == resource_id).first()
-    if existing:
-        return existing
-    
-    # Extract original data - handle official name (use="official")
-    name_list = fhir_resource.get("name", [])
-    official_name = next((n for n in name_list if n.get("use") == "official"), name_list[0] if name_list else {})
-    given_names = official_name.get("given", [])
-    given_name = given_names[0] if given_names else None
-    family_name = official_name.get("family")
-    
-    # Note: Identifiers (SSN, DL, Passport) are in the identifier array but we're removing them entirely
-    # They are direct identifiers and should not be stored even in anonymized form
-    
-    address_list = fhir_resource.get("address", [])
-    address_line = address_list[0].get("line", [""])[0] if address_list else None
-    city = address_list[0].get("city") if address_list else None
-    state = address_list[0].get("state") if address_list else None
-    postal_code = address_list[0].get("postalCode") if address_list else None
-    
-    telecom_list = fhir_resource.get("telecom", [])
-    phone = next((t.get("value") for t in telecom_list if t.get("system") == "phone"), None)
-    email = next((t.get("value") for t in telecom_list if t.get("system") == "email"), None)
-    
-    birth_date_str = fhir_resource.get("birthDate")
-    birth_date = parse_fhir_date(birth_date_str) if birth_date_str else None
-    gender = fhir_resource.get("gender")
-    
-    # Apply de-identification
-    db_patient = patient.Patient(
-        resource_id=resource_id,
-        given_name=deid_service.anonymize_name(given_name, "given"),
-        family_name=deid_service.anonymize_name(family_name, "family"),
-        birth_date=deid_service.shift_date(birth_date, resource_id),
-        gender=gender,  # Not PII
-        address_line=deid_service.anonymize_address(address_line),
-        city=deid_service.anonymize_city(city),
-        state=state,  # Can keep state level
-        postal_code=deid_service.anonymize_postal_code(postal_code),
-        phone=deid_service.anonymize_phone(phone),
-        email=deid_service.anonymize_email(email),
-        raw_fhir_data=json.dumps(fhir_resource),
-    )
-    
-    db.add(db_patient)
-    db.commit()
-    db.refresh(db_patient)
-    return db_patient
-
-
-def process_encounter(fhir_resource: Dict[str, Any], db: Session) -> encounter.Encounter:
-    """De-identify and store an Encounter resource."""
-    resource_id = fhir_resource.get("id")
-    
-    existing = db.query(encounter.Encounter).filter(encounter.Encounter.resource_id == resource_id).first()
-    if existing:
-        return existing
-    
-    # Extract patient reference
-    patient_ref = fhir_resource.get("subject", {}).get("reference", "")
-    patient_resource_id = patient_ref.split("/")[-1] if "/" in patient_ref else patient_ref
-    
-    status = fhir_resource.get("status")
-    # class is an object with system and code
-    class_obj = fhir_resource.get("class", {})
-    class_code = class_obj.get("code")
-    type_list = fhir_resource.get("type", [])
-    type_code = type_list[0].get("coding", [{}])[0].get("code") if type_list else None
-    
-    period = fhir_resource.get("period", {})
-    start_date = parse_fhir_date(period.get("start"))
-    end_date = parse_fhir_date(period.get("end"))
-    
-    # Calculate length of stay
-    length_of_stay = None
-    if start_date and end_date:
-        length_of_stay = (end_date - start_date).days
-    
-    # Apply date shifting
-    start_date = deid_service.shift_date(start_date, patient_resource_id)
-    end_date = deid_service.shift_date(end_date, patient_resource_id)
-    
-    location_list = fhir_resource.get("location", [])
-    location_name = location_list[0].get("location", {}).get("display") if location_list else None
-    location_name = deid_service.anonymize_location(location_name)
-    
-    db_encounter = encounter.Encounter(
-        resource_id=resource_id,
-        patient_resource_id=patient_resource_id,
-        status=status,
-        class_code=class_code,
-        type_code=type_code,
-        start_date=start_date,
-        end_date=end_date,
-        length_of_stay_days=length_of_stay,
-        location_name=location_name,
-        raw_fhir_data=json.dumps(fhir_resource),
-    )
-    
-    db.add(db_encounter)
-    db.commit()
-    db.refresh(db_encounter)
-    return db_encounter
-
-
-def process_condition(fhir_resource: Dict[str, Any], db: Session) -> condition.Condition:
-    """De-identify and store a Condition resource."""
-    resource_id = fhir_resource.get("id")
-    
-    existing = db.query(condition.Condition).filter(condition.Condition.resource_id == resource_id).first()
-    if existing:
-        return existing
-    
-    patient_ref = fhir_resource.get("subject", {}).get("reference", "")
-    patient_resource_id = patient_ref.split("/")[-1] if "/" in patient_ref else patient_ref
-    
-    encounter_ref = fhir_resource.get("encounter", {}).get("reference", "")
-    encounter_resource_id = encounter_ref.split("/")[-1] if "/" in encounter_ref else None
-    
-    code_data = fhir_resource.get("code", {}).get("coding", [{}])[0]
-    code = code_data.get("code")
-    display = code_data.get("display")
-    
-    clinical_status = fhir_resource.get("clinicalStatus", {}).get("coding", [{}])[0].get("code")
-    verification_status = fhir_resource.get("verificationStatus", {}).get("coding", [{}])[0].get("code")
-    
-    category_list = fhir_resource.get("category", [])
-    category = category_list[0].get("coding", [{}])[0].get("code") if category_list else None
-    
-    onset_date = parse_fhir_date(fhir_resource.get("onsetDateTime"))
-    recorded_date = parse_fhir_date(fhir_resource.get("recordedDate"))
-    
-    onset_date = deid_service.shift_date(onset_date, patient_resource_id)
-    recorded_date = deid_service.shift_date(recorded_date, patient_resource_id)
-    
-    db_condition = condition.Condition(
-        resource_id=resource_id,
-        patient_resource_id=patient_resource_id,
-        encounter_resource_id=encounter_resource_id,
-        code=code,  # Clinical code - keep
-        display=display,  # Clinical term - keep
-        clinical_status=clinical_status,
-        verification_status=verification_status,
-        category=category,
-        onset_date=onset_date,
-        recorded_date=recorded_date,
-        raw_fhir_data=json.dumps(fhir_resource),
-    )
-    
-    db.add(db_condition)
-    db.commit()
-    db.refresh(db_condition)
-    return db_condition
-
-
-def process_observation(fhir_resource: Dict[str, Any], db: Session) -> observation.Observation:
-    """Process and store an Observation resource."""
-    resource_id = fhir_resource.get("id")
-    
-    existing = db.query(observation.Observation).filter(observation.Observation.resource_id == resource_id).first()
-    if existing:
-        return existing
-    
-    patient_ref = fhir_resource.get("subject", {}).get("reference", "")
-    patient_resource_id = patient_ref.split("/")[-1] if "/" in patient_ref else patient_ref
-    
-    encounter_ref = fhir_resource.get("encounter", {}).get("reference", "")
-    encounter_resource_id = encounter_ref.split("/")[-1] if "/" in encounter_ref else None
-    
-    status = fhir_resource.get("status")
-    
-    category_list = fhir_resource.get("category", [])
-    category = category_list[0].get("coding", [{}])[0].get("code") if category_list else None
-    
-    code_data = fhir_resource.get("code", {}).get("coding", [{}])[0]
-    code = code_data.get("code")
-    display = code_data.get("display")
-    
-    # Value can be quantity, string, boolean, etc.
-    value_quantity = None
-    value_unit = None
-    value_string = None
-    
-    if "valueQuantity" in fhir_resource:
-        value_quantity = fhir_resource["valueQuantity"].get("value")
-        value_unit = fhir_resource["valueQuantity"].get("unit")
-    elif "valueString" in fhir_resource:
-        value_string = fhir_resource["valueString"]
-    
-    effective_date = parse_fhir_date(fhir_resource.get("effectiveDateTime"))
-    issued_date = parse_fhir_date(fhir_resource.get("issued"))
-    
-    effective_date = deid_service.shift_date(effective_date, patient_resource_id)
-    issued_date = deid_service.shift_date(issued_date, patient_resource_id)
-    
-    db_observation = observation.Observation(
-        resource_id=resource_id,
-        patient_resource_id=patient_resource_id,
-        encounter_resource_id=encounter_resource_id,
-        status=status,
-        category=category,
-        code=code,
-        display=display,
-        value_quantity=value_quantity,
-        value_unit=value_unit,
-        value_string=value_string,
-        effective_date=effective_date,
-        issued_date=issued_date,
-        raw_fhir_data=json.dumps(fhir_resource),
-    )
-    
-    db.add(db_observation)
-    db.commit()
-    db.refresh(db_observation)
-    return db_observation
-
-
-def process_medication_request(fhir_resource: Dict[str, Any], db: Session) -> medication_request.MedicationRequest:
-    """Process and store a MedicationRequest resource."""
-    resource_id = fhir_resource.get("id")
-    
-    existing = db.query(medication_request.MedicationRequest).filter(
-        medication_request.MedicationRequest.resource_id == resource_id
-    ).first()
-    if existing:
-        return existing
-    
-    patient_ref = fhir_resource.get("subject", {}).get("reference", "")
-    patient_resource_id = patient_ref.split("/")[-1] if "/" in patient_ref else patient_ref
-    
-    encounter_ref = fhir_resource.get("encounter", {}).get("reference", "")
-    encounter_resource_id = encounter_ref.split("/")[-1] if "/" in encounter_ref else None
-    
-    status = fhir_resource.get("status")
-    intent = fhir_resource.get("intent")
-    
-    medication_data = fhir_resource.get("medicationCodeableConcept", {}).get("coding", [{}])[0]
-    medication_code = medication_data.get("code")
-    medication_display = medication_data.get("display")
-    
-    dosage_list = fhir_resource.get("dosageInstruction", [])
-    dosage_text = dosage_list[0].get("text") if dosage_list else None
-    
-    requester_display = fhir_resource.get("requester", {}).get("display")
-    requester_display = deid_service.anonymize_provider_name(requester_display)
-    
-    authored_on = parse_fhir_date(fhir_resource.get("authoredOn"))
-    authored_on = deid_service.shift_date(authored_on, patient_resource_id)
-    
-    db_med_request = medication_request.MedicationRequest(
-        resource_id=resource_id,
-        patient_resource_id=patient_resource_id,
-        encounter_resource_id=encounter_resource_id,
-        status=status,
-        intent=intent,
-        medication_code=medication_code,
-        medication_display=medication_display,
-        dosage_text=dosage_text,
-        requester_display=requester_display,
-        authored_on=authored_on,
-        raw_fhir_data=json.dumps(fhir_resource),
-    )
-    
-    db.add(db_med_request)
-    db.commit()
-    db.refresh(db_med_request)
-    return db_med_request
-
-
-def process_procedure(fhir_resource: Dict[str, Any], db: Session) -> procedure.Procedure:
-    """Process and store a Procedure resource."""
-    resource_id = fhir_resource.get("id")
-    
-    existing = db.query(procedure.Procedure).filter(procedure.Procedure.resource_id == resource_id).first()
-    if existing:
-        return existing
-    
-    patient_ref = fhir_resource.get("subject", {}).get("reference", "")
-    patient_resource_id = patient_ref.split("/")[-1] if "/" in patient_ref else patient_ref
-    
-    encounter_ref = fhir_resource.get("encounter", {}).get("reference", "")
-    encounter_resource_id = encounter_ref.split("/")[-1] if "/" in encounter_ref else None
-    
-    status = fhir_resource.get("status")
-    
-    code_data = fhir_resource.get("code", {}).get("coding", [{}])[0]
-    code = code_data.get("code")
-    display = code_data.get("display")
-    
-    category_data = fhir_resource.get("category", {}).get("coding", [{}])[0]
-    category = category_data.get("code")
-    
-    performer_list = fhir_resource.get("performer", [])
-    # Performer info is in Procedure (not always present)
-    performer_list = fhir_resource.get("performer", [])
-    performer_display = performer_list[0].get("actor", {}).get("display") if performer_list else None
-    performer_display = deid_service.anonymize_provider_name(performer_display)
-    
-    # performedPeriod has start/end, not performedDateTime in sample
-    performed_period = fhir_resource.get("performedPeriod", {})
-    performed_start = parse_fhir_date(performed_period.get("start"))
-    performed_date = deid_service.shift_date(performed_start, patient_resource_id)
-    
-    db_procedure = procedure.Procedure(
-        resource_id=resource_id,
-        patient_resource_id=patient_resource_id,
-        encounter_resource_id=encounter_resource_id,
-        status=status,
-        code=code,
-        display=display,
-        category=category,
-        performer_display=performer_display,
-        performed_date=performed_date,
-        raw_fhir_data=json.dumps(fhir_resource),
-    )
-    
-    db.add(db_procedure)
-    db.commit()
-    db.refresh(db_procedure)
-    return db_procedure
-
-
-def process_diagnostic_report(fhir_resource: Dict[str, Any], db: Session) -> diagnostic_report.DiagnosticReport:
-    """Process and store a DiagnosticReport resource."""
-    resource_id = fhir_resource.get("id")
-    
-    existing = db.query(diagnostic_report.DiagnosticReport).filter(
-        diagnostic_report.DiagnosticReport.resource_id == resource_id
-    ).first()
-    if existing:
-        return existing
-    
-    patient_ref = fhir_resource.get("subject", {}).get("reference", "")
-    patient_resource_id = patient_ref.split("/")[-1] if "/" in patient_ref else patient_ref
-    
-    encounter_ref = fhir_resource.get("encounter", {}).get("reference", "")
-    encounter_resource_id = encounter_ref.split("/")[-1] if "/" in encounter_ref else None
-    
-    status = fhir_resource.get("status")
-    
-    category_list = fhir_resource.get("category", [])
-    category = category_list[0].get("coding", [{}])[0].get("code") if category_list else None
-    
-    code_data = fhir_resource.get("code", {}).get("coding", [{}])[0]
-    code = code_data.get("code")
-    display = code_data.get("display")
-    
-    # Conclusion text and presentedForm (base64 encoded notes) contain free text with PII
-    conclusion = fhir_resource.get("conclusion")
-    conclusion = deid_service.remove_free_text_pii(conclusion)
-    
-    # presentedForm contains base64 encoded clinical notes - redact for PII
-    # We don't store the actual encoded data, just note it was redacted
-    
-    effective_date = parse_fhir_date(fhir_resource.get("effectiveDateTime"))
-    issued_date = parse_fhir_date(fhir_resource.get("issued"))
-    
-    effective_date = deid_service.shift_date(effective_date, patient_resource_id)
-    issued_date = deid_service.shift_date(issued_date, patient_resource_id)
-    
-    db_report = diagnostic_report.DiagnosticReport(
-        resource_id=resource_id,
-        patient_resource_id=patient_resource_id,
-        encounter_resource_id=encounter_resource_id,
-        status=status,
-        category=category,
-        code=code,
-        display=display,
-        conclusion=conclusion,
-        effective_date=effective_date,
-        issued_date=issued_date,
-        raw_fhir_data=json.dumps(fhir_resource),
-    )
-    
-    db.add(db_report)
-    db.commit()
-    db.refresh(db_report)
-    return db_report
-
-
-def process_document_reference(fhir_resource: Dict[str, Any], db: Session) -> document_reference.DocumentReference:
-    """Process and store a DocumentReference resource."""
-    resource_id = fhir_resource.get("id")
-    
-    existing = db.query(document_reference.DocumentReference).filter(
-        document_reference.DocumentReference.resource_id == resource_id
-    ).first()
-    if existing:
-        return existing
-    
-    # Subject (patient)
-    patient_ref = fhir_resource.get("subject", {}).get("reference", "")
-    patient_resource_id = patient_ref.split("/")[-1] if "/" in patient_ref else patient_ref
-    
-    # Encounter (from context)
-    context = fhir_resource.get("context", {})
-    encounter_list = context.get("encounter", [])
-    encounter_ref = encounter_list[0].get("reference", "") if encounter_list else ""
-    encounter_resource_id = encounter_ref.split("/")[-1] if "/" in encounter_ref else None
-    
-    status = fhir_resource.get("status")
-    doc_status = fhir_resource.get("docStatus")
-    
-    # Type (LOINC code)
-    type_obj = fhir_resource.get("type", {}).get("coding", [{}])[0]
-    type_code = type_obj.get("code")
-    type_display = type_obj.get("display")
-    
-    # Category
-    category_list = fhir_resource.get("category", [])
-    category_code = category_list[0].get("coding", [{}])[0].get("code") if category_list else None
-    
-    # Description (may contain PII)
-    description = fhir_resource.get("description")
-    description = deid_service.remove_free_text_pii(description)
-    
-    # Author (provider)
-    author_list = fhir_resource.get("author", [])
-    author_display = author_list[0].get("display") if author_list else None
-    author_display = deid_service.anonymize_provider_name(author_display)
-    
-    # Custodian (organization)
-    custodian = fhir_resource.get("custodian", {})
-    custodian_display = custodian.get("display")
-    custodian_display = deid_service.anonymize_location(custodian_display)
-    
-    # Date
-    created_date = parse_fhir_date(fhir_resource.get("date"))
-    created_date = deid_service.shift_date(created_date, patient_resource_id)
-    
-    # Preserve attachment base64 data when present and allowed by contentType.
-    # This is useful when attachments contain encrypted/encoded payloads required by
-    # downstream featureizers (NLP/ML). We limit by allowed MIME types and size.
-    attachment_data = None
-    content_list = fhir_resource.get("content", [])
-    if content_list:
-        # Prefer the first attachment
-        att = content_list[0].get("attachment", {})
-        att_data = att.get("data")
-        att_type = att.get("contentType")
-        allowed_types = [
-            "text/plain",
-            "text/plain; charset=utf-8",
-            "application/octet-stream",
-            "application/pdf",
-            "text/html",
-        ]
-        if att_data and (att_type in allowed_types):
-            # Protect DB from extremely large payloads; 200k chars ~= 150KB base64
-            try:
-                if len(att_data) <= 200000:
-                    attachment_data = att_data
-            except Exception:
-                attachment_data = None
-
-    db_doc_ref = document_reference.DocumentReference(
-        resource_id=resource_id,
-        patient_resource_id=patient_resource_id,
-        encounter_resource_id=encounter_resource_id,
-        status=status,
-        doc_status=doc_status,
-        type_code=type_code,
-        type_display=type_display,
-        category_code=category_code,
-        description=description,
-        author_display=author_display,
-        custodian_display=custodian_display,
-        created_date=created_date,
-        attachment_data=attachment_data,
-        raw_fhir_data=json.dumps(fhir_resource),
-    )
-    
-    db.add(db_doc_ref)
-    db.commit()
-    db.refresh(db_doc_ref)
-    return db_doc_ref
-
-
-def process_allergy_intolerance(fhir_resource: Dict[str, Any], db: Session) -> allergy_intolerance.AllergyIntolerance:
-    """Process and store an AllergyIntolerance resource."""
-    resource_id = fhir_resource.get("id")
-    
-    existing = db.query(allergy_intolerance.AllergyIntolerance).filter(
-        allergy_intolerance.AllergyIntolerance.resource_id == resource_id
-    ).first()
-    if existing:
-        return existing
-    
-    patient_ref = fhir_resource.get("patient", {}).get("reference", "")
-    patient_resource_id = patient_ref.split("/")[-1] if "/" in patient_ref else patient_ref
-    
-    encounter_ref = fhir_resource.get("encounter", {}).get("reference", "")
-    encounter_resource_id = encounter_ref.split("/")[-1] if "/" in encounter_ref else None
-    
-    # Clinical/verification status
-    clinical_status_obj = fhir_resource.get("clinicalStatus", {}).get("coding", [{}])[0]
-    clinical_status = clinical_status_obj.get("code")
-    
-    verification_status_obj = fhir_resource.get("verificationStatus", {}).get("coding", [{}])[0]
-    verification_status = verification_status_obj.get("code")
-    
-    allergy_type = fhir_resource.get("type")
-    
-    # Category is an array of strings
-    category_list = fhir_resource.get("category", [])
-    category = category_list[0] if category_list else None
-    
-    criticality = fhir_resource.get("criticality")
-    
-    # Allergen code (SNOMED - keep)
-    code_obj = fhir_resource.get("code", {}).get("coding", [{}])[0]
-    code = code_obj.get("code")
-    display = code_obj.get("display")
-    
-    # Recorder (provider - anonymize)
-    recorder = fhir_resource.get("recorder", {})
-    recorder_display = recorder.get("display")
-    recorder_display = deid_service.anonymize_provider_name(recorder_display)
-    
-    # Dates
-    onset_date = parse_fhir_date(fhir_resource.get("onsetDateTime"))
-    recorded_date = parse_fhir_date(fhir_resource.get("recordedDate"))
-    
-    onset_date = deid_service.shift_date(onset_date, patient_resource_id)
-    recorded_date = deid_service.shift_date(recorded_date, patient_resource_id)
-    
-    db_allergy = allergy_intolerance.AllergyIntolerance(
-        resource_id=resource_id,
-        patient_resource_id=patient_resource_id,
-        encounter_resource_id=encounter_resource_id,
-        clinical_status=clinical_status,
-        verification_status=verification_status,
-        type=allergy_type,
-        category=category,
-        criticality=criticality,
-        code=code,
-        display=display,
-        recorder_display=recorder_display,
-        onset_date=onset_date,
-        recorded_date=recorded_date,
-        raw_fhir_data=json.dumps(fhir_resource),
-    )
-    
-    db.add(db_allergy)
-    db.commit()
-    db.refresh(db_allergy)
-    return db_allergy
-
-
-def process_immunization(fhir_resource: Dict[str, Any], db: Session) -> immunization.Immunization:
-    """Process and store an Immunization resource."""
-    resource_id = fhir_resource.get("id")
-    
-    existing = db.query(immunization.Immunization).filter(
-        immunization.Immunization.resource_id == resource_id
-    ).first()
-    if existing:
-        return existing
-    
-    patient_ref = fhir_resource.get("patient", {}).get("reference", "")
-    patient_resource_id = patient_ref.split("/")[-1] if "/" in patient_ref else patient_ref
-    
-    encounter_ref = fhir_resource.get("encounter", {}).get("reference", "")
-    encounter_resource_id = encounter_ref.split("/")[-1] if "/" in encounter_ref else None
-    
-    status = fhir_resource.get("status")
-    
-    status_reason = fhir_resource.get("statusReason", {}).get("coding", [{}])[0]
-    status_reason_code = status_reason.get("code")
-    
-    # Vaccine code (CVX - keep)
-    vaccine_obj = fhir_resource.get("vaccineCode", {}).get("coding", [{}])[0]
-    vaccine_code = vaccine_obj.get("code")
-    vaccine_display = vaccine_obj.get("display")
-    
-    primary_source = fhir_resource.get("primarySource")
-    
-    # Performer (provider - anonymize)
-    performer_list = fhir_resource.get("performer", [])
-    performer_display = performer_list[0].get("actor", {}).get("display") if performer_list else None
-    performer_display = deid_service.anonymize_provider_name(performer_display)
-    
-    # Location (facility - anonymize)
-    location = fhir_resource.get("location", {})
-    location_display = location.get("display")
-    location_display = deid_service.anonymize_location(location_display)
-    
-    # Lot number (optional)
-    lot_number = fhir_resource.get("lotNumber")
-    
-    # Dates
-    occurrence_date = parse_fhir_date(fhir_resource.get("occurrenceDateTime"))
-    recorded_date = parse_fhir_date(fhir_resource.get("recorded"))
-    
-    occurrence_date = deid_service.shift_date(occurrence_date, patient_resource_id)
-    recorded_date = deid_service.shift_date(recorded_date, patient_resource_id)
-    
-    db_immunization = immunization.Immunization(
-        resource_id=resource_id,
-        patient_resource_id=patient_resource_id,
-        encounter_resource_id=encounter_resource_id,
-        status=status,
-        status_reason_code=status_reason_code,
-        vaccine_code=vaccine_code,
-        vaccine_display=vaccine_display,
-        primary_source=primary_source,
-        performer_display=performer_display,
-        location_display=location_display,
-        lot_number=lot_number,
-        occurrence_date=occurrence_date,
-        recorded_date=recorded_date,
-        raw_fhir_data=json.dumps(fhir_resource),
-    )
-    
-    db.add(db_immunization)
-    db.commit()
-    db.refresh(db_immunization)
-    return db_immunization
-
-
-def process_practitioner(fhir_resource: Dict[str, Any], db: Session) -> practitioner.Practitioner:
-    """Process and store a Practitioner resource."""
-    resource_id = fhir_resource.get("id")
-    
-    existing = db.query(practitioner.Practitioner).filter(
-        practitioner.Practitioner.resource_id == resource_id
-    ).first()
-    if existing:
-        return existing
-    
-    # Name
-    name_list = fhir_resource.get("name", [])
-    name_obj = name_list[0] if name_list else {}
-    given_names = name_obj.get("given", [])
-    given_name = given_names[0] if given_names else None
-    family_name = name_obj.get("family")
-    prefix_list = name_obj.get("prefix", [])
-    prefix = prefix_list[0] if prefix_list else None
-    
-    gender = fhir_resource.get("gender")
-    
-    birth_date_str = fhir_resource.get("birthDate")
-    birth_date = parse_fhir_date(birth_date_str) if birth_date_str else None
-    
-    # NPI (professional identifier - keep for linking)
-    identifier_list = fhir_resource.get("identifier", [])
-    npi = None
-    for identifier in identifier_list:
-        if identifier.get("system") == "http://hl7.org/fhir/sid/us-npi":
-            npi = identifier.get("value")
-            break
-    
-    # Telecom
-    telecom_list = fhir_resource.get("telecom", [])
-    phone = next((t.get("value") for t in telecom_list if t.get("system") == "phone"), None)
-    email = next((t.get("value") for t in telecom_list if t.get("system") == "email"), None)
-    
-    # Address
-    address_list = fhir_resource.get("address", [])
-    address_obj = address_list[0] if address_list else {}
-    address_line = address_obj.get("line", [""])[0] if address_obj.get("line") else None
-    city = address_obj.get("city")
-    state = address_obj.get("state")
-    postal_code = address_obj.get("postalCode")
-    
-    active = fhir_resource.get("active")
-    
-    # Anonymize provider info
-    db_practitioner = practitioner.Practitioner(
-        resource_id=resource_id,
-        given_name=deid_service.anonymize_name(given_name, "given"),
-        family_name=deid_service.anonymize_name(family_name, "family"),
-        prefix=prefix,  # Keep prefix (Dr., etc.)
-        gender=gender,
-        birth_date=deid_service.shift_date(birth_date, resource_id),
-        npi=npi,  # Keep NPI for professional linking
-        phone=deid_service.anonymize_phone(phone),
-        email=deid_service.anonymize_email(email),
-        address_line=deid_service.anonymize_address(address_line),
-        city=deid_service.anonymize_city(city),
-        state=state,
-        postal_code=deid_service.anonymize_postal_code(postal_code),
-        active=active,
-        raw_fhir_data=json.dumps(fhir_resource),
-    )
-    
-    db.add(db_practitioner)
-    db.commit()
-    db.refresh(db_practitioner)
-    return db_practitioner
-
-
-def process_practitioner_role(fhir_resource: Dict[str, Any], db: Session) -> practitioner_role.PractitionerRole:
-    """Process and store a PractitionerRole resource."""
-    resource_id = fhir_resource.get("id")
-    
-    existing = db.query(practitioner_role.PractitionerRole).filter(
-        practitioner_role.PractitionerRole.resource_id == resource_id
-    ).first()
-    if existing:
-        return existing
-    
-    # Practitioner reference (extract NPI from identifier)
-    pract_obj = fhir_resource.get("practitioner", {})
-    pract_identifier = pract_obj.get("identifier", {})
-    pract_npi = pract_identifier.get("value")
-    practitioner_resource_id = pract_npi  # Store NPI as reference
-    
-    # Organization reference
-    org_obj = fhir_resource.get("organization", {})
-    org_identifier = org_obj.get("identifier", {})
-    org_id = org_identifier.get("value")
-    organization_resource_id = org_id
-    
-    active = fhir_resource.get("active")
-    
-    # Role codes (NUCC - keep)
-    code_list = fhir_resource.get("code", [])
-    role_obj = code_list[0].get("coding", [{}])[0] if code_list else {}
-    role_code = role_obj.get("code")
-    role_display = role_obj.get("display")
-    
-    # Specialty
-    specialty_list = fhir_resource.get("specialty", [])
-    specialty_obj = specialty_list[0].get("coding", [{}])[0] if specialty_list else {}
-    specialty_code = specialty_obj.get("code")
-    specialty_display = specialty_obj.get("display")
-    
-    # Location
-    location_list = fhir_resource.get("location", [])
-    loc_identifier = location_list[0].get("identifier", {}) if location_list else {}
-    location_resource_id = loc_identifier.get("value")
-    
-    # Telecom
-    telecom_list = fhir_resource.get("telecom", [])
-    phone = next((t.get("value") for t in telecom_list if t.get("system") == "phone"), None)
-    email = next((t.get("value") for t in telecom_list if t.get("system") == "email"), None)
-    
-    db_role = practitioner_role.PractitionerRole(
-        resource_id=resource_id,
-        practitioner_resource_id=practitioner_resource_id,
-        organization_resource_id=organization_resource_id,
-        active=active,
-        role_code=role_code,
-        role_display=role_display,
-        specialty_code=specialty_code,
-        specialty_display=specialty_display,
-        location_resource_id=location_resource_id,
-        phone=deid_service.anonymize_phone(phone),
-        email=deid_service.anonymize_email(email),
-        raw_fhir_data=json.dumps(fhir_resource),
-    )
-    
-    db.add(db_role)
-    db.commit()
-    db.refresh(db_role)
-    return db_role
-
-
-def process_organization(fhir_resource: Dict[str, Any], db: Session) -> organization.Organization:
-    """Process and store an Organization resource."""
-    resource_id = fhir_resource.get("id")
-    
-    existing = db.query(organization.Organization).filter(
-        organization.Organization.resource_id == resource_id
-    ).first()
-    if existing:
-        return existing
-    
-    # Name (anonymize)
-    name = fhir_resource.get("name")
-    name = deid_service.anonymize_location(name)
-    
-    active = fhir_resource.get("active")
-    
-    # Type
-    type_list = fhir_resource.get("type", [])
-    type_obj = type_list[0].get("coding", [{}])[0] if type_list else {}
-    type_code = type_obj.get("code")
-    type_display = type_obj.get("display")
-    
-    # NPI (organizational identifier - keep for linking)
-    identifier_list = fhir_resource.get("identifier", [])
-    npi = None
-    for identifier in identifier_list:
-        if identifier.get("system") == "http://hl7.org/fhir/sid/us-npi":
-            npi = identifier.get("value")
-            break
-    
-    # Telecom
-    telecom_list = fhir_resource.get("telecom", [])
-    phone = next((t.get("value") for t in telecom_list if t.get("system") == "phone"), None)
-    email = next((t.get("value") for t in telecom_list if t.get("system") == "email"), None)
-    
-    # Address
-    address_list = fhir_resource.get("address", [])
-    address_obj = address_list[0] if address_list else {}
-    address_line = address_obj.get("line", [""])[0] if address_obj.get("line") else None
-    city = address_obj.get("city")
-    state = address_obj.get("state")
-    postal_code = address_obj.get("postalCode")
-    
-    db_organization = organization.Organization(
-        resource_id=resource_id,
-        name=name,
-        active=active,
-        type_code=type_code,
-        type_display=type_display,
-        npi=npi,
-        phone=deid_service.anonymize_phone(phone),
-        email=deid_service.anonymize_email(email),
-        address_line=deid_service.anonymize_address(address_line),
-        city=deid_service.anonymize_city(city),
-        state=state,  # Keep state
-        postal_code=deid_service.anonymize_postal_code(postal_code),
-        raw_fhir_data=json.dumps(fhir_resource),
+# Chunk writers of the write modes
+CHUNK_WRITERS = {
+    "row": write_rows,  # one ORM insert and one commit per resource
+    "batch": write_batch,  # multi-row INSERT, one commit per chunk
+    "copy": load_rows,  # COPY ... FROM STDIN on PostgreSQL
+    "upsert": upsert_rows,  # INSERT ... ON CONFLICT (resource_id) DO UPDATE
+}
+
+
+def get_write_mode(batched: bool, copy: bool, upsert: bool, parallel: bool = False) -> str:
+    """Resolve the write mode from the ingest endpoint flags (parallel implies a chunked mode)."""
+    if upsert:
+        return "upsert"
+    if copy:
+        return "copy"
+    if batched or parallel:
+        return "batch"
+    return "row"
+
+
+async def ingest_chunk(
+    resource_type: str,
+    resources: List[Dict[str, Any]],
+    db: AsyncSession,
+    write_mode: str = "row",
+    parallel: bool = False,
+) -> int:
+    """
+    De-identify and store a chunk of resources of one type.
+    Resources already stored (for "upsert": stored with the same content hash)
+    are dropped with one IN query, then the rest of the chunk is de-identified
+    into row dicts and handed to its CHUNK_WRITERS entry.
+    Only "upsert" computes content_hash (canonical JSON + SHA-256 per resource);
+    the other modes leave it NULL, and a later upsert rewrites those rows once.
+    Only the queries and writes go through db.run_sync: hashing and
+    de-identification run off the event loop, in the de-identification thread
+    or, with parallel=True, in the worker process pool (see
+    parallel_deid.deidentify_chunk). With settings.pseudonym_store the chunk's
+    pseudonyms are read from / written to the pseudonym_mappings table.
+    Returns the number of rows stored (chunked modes) or processed (row).
+    """
+    spec = RESOURCE_SPECS[resource_type]
+    if write_mode == "upsert":
+        hashes = await asyncio.get_running_loop().run_in_executor(
+            get_thread(), lambda: {fhir_resource.get("id"): content_hash(fhir_resource) for fhir_resource in resources}
+        )
+        new_resources = await db.run_sync(filter_changed_resources, spec.model, resources, hashes)
+    else:
+        new_resources = await db.run_sync(filter_new_resources, spec.model, resources)
+    if len(new_resources) < len(resources):
+        print(f"{resource_type}: skipping {len(resources) - len(new_resources)} unchanged resources")
+    # A partial of the module-level function (not the spec's bound method) pickles to the workers
+    deidentify = partial(deidentify_resource, resource_type)
+    if settings.pseudonym_store and write_mode != "row":
+        rows = await pseudonym_store.deidentify_chunk(db, deidentify, new_resources, parallel)
+    else:
+        rows, _ = await deidentify_chunk(deidentify, new_resources, parallel)
+    if write_mode == "upsert":
+        for row in rows:
+            row["content_hash"] = hashes[row["resource_id"]]
+    raw_rows = raw_store.detach_raw_rows(resource_type, rows)
+    stored = await db.run_sync(CHUNK_WRITERS[write_mode], spec.model, rows, raw_store.raw_rows_writer(raw_rows))
+    return len(resources) if write_mode == "row" else stored
+
+
+async def ingest_loaded(
+    fhir_data: Dict[str, List[Dict[str, Any]]], db: AsyncSession, write_mode: str, parallel: bool = False
+) -> Dict[str, int]:
+    """Ingest already downloaded resources in chunks of settings.ingest_chunk_size."""
+    counts = {resource_type: 0 for resource_type in RESOURCE_SPECS}
+    chunk_size = settings.ingest_chunk_size
+    
+    for resource_type in RESOURCE_SPECS:
+        resources = fhir_data.get(resource_type, [])
+        type_start = time.time()
+        for i in range(0, len(resources), chunk_size):
+            counts[resource_type] += await ingest_chunk(
+                resource_type, resources[i:i + chunk_size], db, write_mode, parallel
+            )
+        if resources:
+            print(f"{resource_type}: {counts[resource_type]}/{len(resources)} stored in {time.time() - type_start:.2f}s")
+    
+    if settings.pseudonym_store:
+        await db.run_sync(pseudonym_store.flush)
+    return counts
+
+
+async def stream_ingest(
+    fhir_client: FHIRClient,
+    manifest: Dict[str, Any],
+    db: AsyncSession,
+    write_mode: str = "row",
+    parallel: bool = False,
+    since: Optional[datetime] = None,
+) -> Dict[str, int]:
+    """
+    Stream every critical file of the manifest and ingest it in chunks of
+    settings.ingest_chunk_size resources (see ingest_chunk).
+    Peak memory is bounded by one chunk, whatever the size of the export.
+    Only the queries and writes of a chunk go through db.run_sync; its
+    de-identification runs off the event loop (see ingest_chunk), which keeps
+    serving requests meanwhile.
+    With since, resources last updated before it are skipped (see updated_since).
+    Returns the number of processed resources per resource type.
+    """
+    counts = {resource_type: 0 for resource_type in RESOURCE_SPECS}
+    chunk_size = settings.ingest_chunk_size
+    
+    async for resource_type, file_name, chunk in fhir_client.iter_manifest_chunks(manifest, chunk_size):
+        if since:
+            chunk = updated_since(chunk, since)
+        counts[resource_type] += await ingest_chunk(resource_type, chunk, db, write_mode, parallel)
+        print(f"{file_name}: {counts[resource_type]} {resource_type} resources processed")
+    
+    if settings.pseudonym_store:
+        await db.run_sync(pseudonym_store.flush)
+    return counts
+
+
+def build_ingestion_result(
+    message: str,
+    counts: Dict[str, int],
+    file_timings: Optional[List[Dict[str, Any]]] = None,
+    cache_stats: Optional[Dict[str, int]] = None,
+) -> IngestionResult:
+    """Build an IngestionResult from per-resource-type counts (and file cache hits/misses)."""
+    cache_stats = cache_stats or {}
+    return IngestionResult(
+        status="success",
+        message=message,
+        files_processed=[resource_type for resource_type, count in counts.items() if count],
+        file_timings=file_timings or [],
+        cache_hits=cache_stats.get("hits", 0),
+        cache_misses=cache_stats.get("misses", 0),
+        **{spec.result_field: counts.get(resource_type, 0) for resource_type, spec in RESOURCE_SPECS.items()},
     )
-    
-    db.add(db_organization)
-    db.commit()
-    db.refresh(db_organization)
-    return db_organization
 
 
-@router.post("/ingest", response_model=IngestionResult)
-async def ingest_and_deid(clear_existing: bool = False, db: Session = Depends(get_db)):
+class IngestSource(NamedTuple):
+    """A FHIR bulk export the ingest endpoints and jobs can read from."""
+    label: str  # log banner prefix
+    origin: str  # where the files are fetched from, for logs
+    message: str  # IngestionResult message
+    error: str  # HTTPException detail prefix
+    get_manifest: Callable[[FHIRClient], Awaitable[Dict[str, Any]]]
+
+
+INGEST_SOURCES: Dict[str, IngestSource] = {
+    "synthea": IngestSource(
+        "", "proxy",
+        "FHIR data ingested and de-identified successfully", "Error during ingestion",
+        lambda fhir_client: fhir_client.get_manifest(),
+    ),
+    "hospital": IngestSource(
+        "HOSPITAL ", "hospital endpoint",
+        "Hospital FHIR data ingested and de-identified successfully", "Error during hospital data ingestion",
+        lambda fhir_client: fhir_client.get_hospital_manifest(),
+    ),
+}
+
+
+async def run_ingestion(
+    source_name: str,
+    db: AsyncSession,
+    clear_existing: bool,
+    stream: bool,
+    write_mode: str,
+    parallel: bool,
+    incremental: bool,
+    since: Optional[datetime],
+    rebuild_indexes: bool = False,
+) -> IngestionResult:
     """
-    Fetch FHIR data from proxy, de-identify, and store in PostgreSQL.
-    This is the main ingestion endpoint.
-    
-    Args:
-        clear_existing: If True, clears all existing data before ingestion to prevent duplicates/overflow
+    Ingestion engine of /ingest and /ingest-hospital: resolve the manifest of
+    the source, then either stream its files (stream_ingest) or download them
+    all first (ingest_loaded); both go through ingest_chunk per resource type.
+    With rebuild_indexes the secondary indexes are dropped before the writes
+    and built again once at the end, even if the ingestion fails.
     """
+    source = INGEST_SOURCES[source_name]
     start_time = time.time()
-    print(f"\n=== DEID INGESTION STARTED at {datetime.now()} ===")
+    started_at = datetime.utcnow()
+    print(f"\n=== {source.label}DEID INGESTION ({write_mode}) STARTED at {datetime.now()} ===")
     
     fhir_client = get_fhir_client()
     
@@ -895,451 +246,578 @@ async def ingest_and_deid(clear_existing: bool = False, db: Session = Depends(ge
         if clear_existing:
             print("Clearing existing database records...")
             clear_start = time.time()
-            db.query(document_reference.DocumentReference).delete()
-            db.query(allergy_intolerance.AllergyIntolerance).delete()
-            db.query(immunization.Immunization).delete()
-            db.query(diagnostic_report.DiagnosticReport).delete()
-            db.query(procedure.Procedure).delete()
-            db.query(medication_request.MedicationRequest).delete()
-            db.query(observation.Observation).delete()
-            db.query(condition.Condition).delete()
-            db.query(practitioner_role.PractitionerRole).delete()
-            db.query(practitioner.Practitioner).delete()
-            db.query(organization.Organization).delete()
-            db.query(encounter.Encounter).delete()
-            db.query(patient.Patient).delete()
-            db.commit()
+            cleared = await db.run_sync(reset_deid_tables)
             clear_time = time.time() - clear_start
-            print(f"Database cleared successfully in {clear_time:.2f} seconds.")
-        
-        # Fetch all critical files
-        print("Fetching FHIR data from proxy...")
-        fetch_start = time.time()
-        fhir_data = await fhir_client.get_critical_files()
-        fetch_time = time.time() - fetch_start
-        print(f"FHIR data fetched in {fetch_time:.2f} seconds.")
-        
-        # Log data summary
-        print("\n=== FHIR Data Summary ===")
-        for resource_type, resources in fhir_data.items():
-            count = len(resources)
-            print(f"{resource_type}: {count} resources")
-        print("=" * 30)
-        
-        # Process each resource type with verbose logging
-        print("\n=== Processing Patients ===")
-        patients_count = 0
-        total_patients = len(fhir_data.get("Patient", []))
-        print(f"Processing {total_patients} patients...")
-        patient_start = time.time()
-        
-        for i, patient_resource in enumerate(fhir_data.get("Patient", []), 1):
-            if i % 10 == 0 or i == total_patients:
-                elapsed = time.time() - patient_start
-                print(f"Processing patient {i}/{total_patients} (ID: {patient_resource.get('id', 'unknown')}) - {elapsed:.1f}s elapsed")
-            process_patient(patient_resource, db)
-            patients_count += 1
-        
-        patient_time = time.time() - patient_start
-        print(f"✅ Patients complete: {patients_count} processed in {patient_time:.2f} seconds")
-        
-        print("\n=== Processing Encounters ===")
-        encounters_count = 0
-        total_encounters = len(fhir_data.get("Encounter", []))
-        print(f"Processing {total_encounters} encounters...")
-        
-        for i, encounter_resource in enumerate(fhir_data.get("Encounter", []), 1):
-            if i % 25 == 0 or i == total_encounters:
-                print(f"Processing encounter {i}/{total_encounters}")
-            process_encounter(encounter_resource, db)
-            encounters_count += 1
-        
-        print("\n=== Processing Other Resources ===")
-        conditions_count = 0
-        total_conditions = len(fhir_data.get("Condition", []))
-        print(f"Processing {total_conditions} conditions...")
-        
-        for condition_resource in fhir_data.get("Condition", []):
-            process_condition(condition_resource, db)
-            conditions_count += 1
-        
-        observations_count = 0
-        total_observations = len(fhir_data.get("Observation", []))
-        print(f"Processing {total_observations} observations...")
-        
-        for observation_resource in fhir_data.get("Observation", []):
-            process_observation(observation_resource, db)
-            observations_count += 1
-        
-        med_requests_count = 0
-        for med_request_resource in fhir_data.get("MedicationRequest", []):
-            process_medication_request(med_request_resource, db)
-            med_requests_count += 1
-        
-        procedures_count = 0
-        for procedure_resource in fhir_data.get("Procedure", []):
-            process_procedure(procedure_resource, db)
-            procedures_count += 1
-        
-        reports_count = 0
-        for report_resource in fhir_data.get("DiagnosticReport", []):
-            process_diagnostic_report(report_resource, db)
-            reports_count += 1
-        
-        document_references_count = 0
-        for doc_ref_resource in fhir_data.get("DocumentReference", []):
-            process_document_reference(doc_ref_resource, db)
-            document_references_count += 1
-        
-        allergy_intolerances_count = 0
-        for allergy_resource in fhir_data.get("AllergyIntolerance", []):
-            process_allergy_intolerance(allergy_resource, db)
-            allergy_intolerances_count += 1
-        
-        immunizations_count = 0
-        for immunization_resource in fhir_data.get("Immunization", []):
-            process_immunization(immunization_resource, db)
-            immunizations_count += 1
-        
-        practitioners_count = 0
-        for practitioner_resource in fhir_data.get("Practitioner", []):
-            process_practitioner(practitioner_resource, db)
-            practitioners_count += 1
-        
-        practitioner_roles_count = 0
-        for role_resource in fhir_data.get("PractitionerRole", []):
-            process_practitioner_role(role_resource, db)
-            practitioner_roles_count += 1
-        
-        organizations_count = 0
-        for org_resource in fhir_data.get("Organization", []):
-            process_organization(org_resource, db)
-            organizations_count += 1
-        
-        files_processed = [k for k, v in fhir_data.items() if v]
-        
-        print(f"\n=== Processing Complete ===")
-        total_time = time.time() - start_time
-        print(f"🎉 ENTIRE INGESTION COMPLETED in {total_time:.2f} seconds")
-        print(f"Total patients processed: {patients_count}")
-        print(f"Total encounters processed: {encounters_count}")
-        print(f"Total conditions processed: {conditions_count}")
-        print(f"Total observations processed: {observations_count}")
-        print(f"Total medication requests processed: {med_requests_count}")
-        print(f"Total procedures processed: {procedures_count}")
-        print(f"Average processing rate: {(patients_count / total_time):.2f} patients/second")
-        print("=" * 50)
-        
-        return IngestionResult(
-            status="success",
-            message="FHIR data ingested and de-identified successfully",
-            files_processed=files_processed,
-            patients_created=patients_count,
-            encounters_created=encounters_count,
-            conditions_created=conditions_count,
-            observations_created=observations_count,
-            medication_requests_created=med_requests_count,
-            procedures_created=procedures_count,
-            diagnostic_reports_created=reports_count,
-            document_references_created=document_references_count,
-            allergy_intolerances_created=allergy_intolerances_count,
-            immunizations_created=immunizations_count,
-            practitioners_created=practitioners_count,
-            practitioner_roles_created=practitioner_roles_count,
-            organizations_created=organizations_count,
-        )
+            print(f"Database cleared successfully in {clear_time:.2f} seconds ({sum(cleared.values())} records).")
+        
+        if rebuild_indexes:
+            dropped = await db.run_sync(drop_secondary_indexes)
+            print(f"Dropped {len(dropped)} secondary indexes for the bulk load")
+        
+        manifest = await source.get_manifest(fhir_client)
+        if incremental and not clear_existing:
+            manifest, since = await db.run_sync(plan_incremental, manifest, since)
+        if since:
+            print(f"Processing resources updated after {since.isoformat()}")
+        
+        if stream:
+            print(f"Streaming FHIR data from {source.origin}...")
+            counts = await stream_ingest(fhir_client, manifest, db, write_mode, parallel, since)
+            file_timings = None
+        else:
+            # Fetch all critical files
+            print(f"Fetching FHIR data from {source.origin}...")
+            fetch_start = time.time()
+            fhir_data = await fhir_client.fetch_manifest_files(manifest)
+            if since:
+                fhir_data = {resource_type: updated_since(resources, since) for resource_type, resources in fhir_data.items()}
+            fetch_time = time.time() - fetch_start
+            print(f"FHIR data fetched in {fetch_time:.2f} seconds.")
+            
+            # Log data summary
+            print("\n=== FHIR Data Summary ===")
+            for resource_type, resources in fhir_data.items():
+                print(f"{resource_type}: {len(resources)} resources")
+            print("=" * 30)
+            
+            counts = await ingest_loaded(fhir_data, db, write_mode, parallel)
+            file_timings = fhir_client.fetch_timings
+        
+        await db.run_sync(record_ingestion, manifest, started_at)
+        print(f"🎉 {source.label}INGESTION COMPLETED in {time.time() - start_time:.2f} seconds")
+        return build_ingestion_result(source.message, counts, file_timings, fhir_client.cache_stats)
     
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error during ingestion: {str(e)}"
+            detail=f"{source.error}: {str(e)}"
         )
     finally:
-        await fhir_client.close()
+        if rebuild_indexes:
+            await db.rollback()
+            index_start = time.time()
+            await db.run_sync(create_secondary_indexes)
+            print(f"Secondary indexes rebuilt in {time.time() - index_start:.2f} seconds")
+
+
+@router.post("/ingest", response_model=IngestionResult)
+async def ingest_and_deid(
+    clear_existing: bool = False,
+    stream: bool = False,
+    batched: bool = False,
+    copy: bool = False,
+    upsert: bool = False,
+    parallel: bool = False,
+    incremental: bool = False,
+    since: Optional[datetime] = None,
+    rebuild_indexes: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Fetch FHIR data from proxy, de-identify, and store in PostgreSQL.
+    This is the main ingestion endpoint.
+    
+    Args:
+        clear_existing: If True, clears all existing data before ingestion to prevent duplicates/overflow
+        stream: If True, streams the NDJSON files and processes them in chunks instead of
+            loading every resource in memory first (recommended for large exports)
+        batched: If True, writes each chunk with one multi-row INSERT and one commit
+            instead of one commit per resource
+        copy: If True, writes each chunk with PostgreSQL COPY (fastest; meant for initial
+            loads and clear_existing re-ingests)
+        upsert: If True, re-ingests in place: new resources are inserted and stored ones are
+            updated only when their content hash changed
+        parallel: If True, de-identifies each chunk across DEID_WORKERS processes
+            (implies batched unless copy/upsert is set)
+        incremental: If True, skips the manifest files whose size/lastModified did not change
+            since the last ingestion of the export, and the resources last updated before
+            its high-water mark (ignored with clear_existing)
+        since: Only process resources whose meta.lastUpdated is after this timestamp
+        rebuild_indexes: If True, drops the secondary indexes (patient/encounter references,
+            ...) before writing and rebuilds them at the end: faster bulk reloads, typically
+            with clear_existing and copy
+    """
+    return await run_ingestion("synthea", db, clear_existing, stream, get_write_mode(batched, copy, upsert, parallel), parallel, incremental, since, rebuild_indexes)
 
 
 @router.post("/ingest-hospital", response_model=IngestionResult)
-async def ingest_hospital_data(clear_existing: bool = False, db: Session = Depends(get_db)):
+async def ingest_hospital_data(
+    clear_existing: bool = False,
+    stream: bool = False,
+    batched: bool = False,
+    copy: bool = False,
+    upsert: bool = False,
+    parallel: bool = False,
+    incremental: bool = False,
+    since: Optional[datetime] = None,
+    rebuild_indexes: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+):
     """
     Fetch FHIR data from hospital endpoint (/bulk/hospital/manifest), de-identify, and store in PostgreSQL.
     This endpoint uses the hospital FHIR data source instead of the default Synthea data.
     
     Args:
         clear_existing: If True, clears all existing data before ingestion to prevent duplicates/overflow
+        stream: If True, streams the NDJSON files and processes them in chunks instead of
+            loading every resource in memory first (recommended for large exports)
+        batched: If True, writes each chunk with one multi-row INSERT and one commit
+            instead of one commit per resource
+        copy: If True, writes each chunk with PostgreSQL COPY (fastest; meant for initial
+            loads and clear_existing re-ingests)
+        upsert: If True, re-ingests in place: new resources are inserted and stored ones are
+            updated only when their content hash changed
+        parallel: If True, de-identifies each chunk across DEID_WORKERS processes
+            (implies batched unless copy/upsert is set)
+        incremental: If True, skips the manifest files whose size/lastModified did not change
+            since the last ingestion of the export, and the resources last updated before
+            its high-water mark (ignored with clear_existing)
+        since: Only process resources whose meta.lastUpdated is after this timestamp
+        rebuild_indexes: If True, drops the secondary indexes (patient/encounter references,
+            ...) before writing and rebuilds them at the end: faster bulk reloads, typically
+            with clear_existing and copy
     """
-    start_time = time.time()
-    print(f"\n=== HOSPITAL DEID INGESTION STARTED at {datetime.now()} ===")
-    
+    return await run_ingestion("hospital", db, clear_existing, stream, get_write_mode(batched, copy, upsert, parallel), parallel, incremental, since, rebuild_indexes)
+
+
+# ========== Background ingest jobs ==========
+
+async def run_ingest_job(job_id: str):
+    """
+    Run (or resume) a background ingest job.
+    Files are streamed in critical_manifest_files order and ingested in chunks of
+    settings.ingest_chunk_size resources; after each chunk the job's counts and
+    per-file offsets are checkpointed in ingest_jobs. A resumed job reuses the
+    manifest fixed by its first run, skips completed files and the resources
+    before the offset of the file it stopped in (the last chunk before a crash
+    may be seen twice: stored rows are skipped by the dedupe/upsert checks).
+    """
+    db = AsyncSessionLocal()
     fhir_client = get_fhir_client()
-    
+    job = await db.run_sync(ingest_jobs.get_job, job_id)
     try:
-        # Clear existing data if requested
-        if clear_existing:
-            print("Clearing existing database records...")
-            clear_start = time.time()
-            db.query(document_reference.DocumentReference).delete()
-            db.query(allergy_intolerance.AllergyIntolerance).delete()
-            db.query(immunization.Immunization).delete()
-            db.query(diagnostic_report.DiagnosticReport).delete()
-            db.query(procedure.Procedure).delete()
-            db.query(medication_request.MedicationRequest).delete()
-            db.query(observation.Observation).delete()
-            db.query(condition.Condition).delete()
-            db.query(practitioner_role.PractitionerRole).delete()
-            db.query(practitioner.Practitioner).delete()
-            db.query(organization.Organization).delete()
-            db.query(encounter.Encounter).delete()
-            db.query(patient.Patient).delete()
-            db.commit()
-            clear_time = time.time() - clear_start
-            print(f"Database cleared successfully in {clear_time:.2f} seconds.")
-        
-        # Fetch all critical files from hospital endpoint
-        print("Fetching FHIR data from hospital endpoint...")
-        fetch_start = time.time()
-        fhir_data = await fhir_client.get_hospital_critical_files()
-        fetch_time = time.time() - fetch_start
-        print(f"Hospital FHIR data fetched in {fetch_time:.2f} seconds.")
-        
-        # Log data summary
-        print("\n=== Hospital FHIR Data Summary ===")
-        for resource_type, resources in fhir_data.items():
-            count = len(resources)
-            print(f"{resource_type}: {count} resources")
-        print("=" * 30)
-        
-        # Process each resource type with verbose logging
-        print("\n=== Processing Patients ===")
-        patients_count = 0
-        total_patients = len(fhir_data.get("Patient", []))
-        print(f"Processing {total_patients} patients...")
-        patient_start = time.time()
-        
-        for i, patient_resource in enumerate(fhir_data.get("Patient", []), 1):
-            if i % 10 == 0 or i == total_patients:
-                elapsed = time.time() - patient_start
-                print(f"Processing patient {i}/{total_patients} (ID: {patient_resource.get('id', 'unknown')}) - {elapsed:.1f}s elapsed")
-            process_patient(patient_resource, db)
-            patients_count += 1
-        
-        patient_time = time.time() - patient_start
-        print(f"✅ Patients complete: {patients_count} processed in {patient_time:.2f} seconds")
-        
-        print("\n=== Processing Encounters ===")
-        encounters_count = 0
-        total_encounters = len(fhir_data.get("Encounter", []))
-        print(f"Processing {total_encounters} encounters...")
-        
-        for i, encounter_resource in enumerate(fhir_data.get("Encounter", []), 1):
-            if i % 25 == 0 or i == total_encounters:
-                print(f"Processing encounter {i}/{total_encounters}")
-            process_encounter(encounter_resource, db)
-            encounters_count += 1
-        
-        print("\n=== Processing Other Resources ===")
-        conditions_count = 0
-        total_conditions = len(fhir_data.get("Condition", []))
-        print(f"Processing {total_conditions} conditions...")
-        
-        for condition_resource in fhir_data.get("Condition", []):
-            process_condition(condition_resource, db)
-            conditions_count += 1
-        
-        observations_count = 0
-        total_observations = len(fhir_data.get("Observation", []))
-        print(f"Processing {total_observations} observations...")
-        
-        for observation_resource in fhir_data.get("Observation", []):
-            process_observation(observation_resource, db)
-            observations_count += 1
-        
-        med_requests_count = 0
-        for med_request_resource in fhir_data.get("MedicationRequest", []):
-            process_medication_request(med_request_resource, db)
-            med_requests_count += 1
-        
-        procedures_count = 0
-        for procedure_resource in fhir_data.get("Procedure", []):
-            process_procedure(procedure_resource, db)
-            procedures_count += 1
-        
-        reports_count = 0
-        for report_resource in fhir_data.get("DiagnosticReport", []):
-            process_diagnostic_report(report_resource, db)
-            reports_count += 1
-        
-        document_references_count = 0
-        for doc_ref_resource in fhir_data.get("DocumentReference", []):
-            process_document_reference(doc_ref_resource, db)
-            document_references_count += 1
-        
-        allergy_intolerances_count = 0
-        for allergy_resource in fhir_data.get("AllergyIntolerance", []):
-            process_allergy_intolerance(allergy_resource, db)
-            allergy_intolerances_count += 1
-        
-        immunizations_count = 0
-        for immunization_resource in fhir_data.get("Immunization", []):
-            process_immunization(immunization_resource, db)
-            immunizations_count += 1
-        
-        practitioners_count = 0
-        for practitioner_resource in fhir_data.get("Practitioner", []):
-            process_practitioner(practitioner_resource, db)
-            practitioners_count += 1
-        
-        practitioner_roles_count = 0
-        for role_resource in fhir_data.get("PractitionerRole", []):
-            process_practitioner_role(role_resource, db)
-            practitioner_roles_count += 1
-        
-        organizations_count = 0
-        for org_resource in fhir_data.get("Organization", []):
-            process_organization(org_resource, db)
-            organizations_count += 1
-        
-        files_processed = [k for k, v in fhir_data.items() if v]
-        
-        print(f"\n=== Hospital Processing Complete ===")
-        total_time = time.time() - start_time
-        print(f"🎉 HOSPITAL INGESTION COMPLETED in {total_time:.2f} seconds")
-        print(f"Total patients processed: {patients_count}")
-        print(f"Total encounters processed: {encounters_count}")
-        print(f"Total conditions processed: {conditions_count}")
-        print(f"Total observations processed: {observations_count}")
-        print(f"Total medication requests processed: {med_requests_count}")
-        print(f"Total procedures processed: {procedures_count}")
-        print(f"Average processing rate: {(patients_count / total_time):.2f} patients/second")
-        print("=" * 50)
-        
-        return IngestionResult(
-            status="success",
-            message="Hospital FHIR data ingested and de-identified successfully",
-            files_processed=files_processed,
-            patients_created=patients_count,
-            encounters_created=encounters_count,
-            conditions_created=conditions_count,
-            observations_created=observations_count,
-            medication_requests_created=med_requests_count,
-            procedures_created=procedures_count,
-            diagnostic_reports_created=reports_count,
-            document_references_created=document_references_count,
-            allergy_intolerances_created=allergy_intolerances_count,
-            immunizations_created=immunizations_count,
-            practitioners_created=practitioners_count,
-            practitioner_roles_created=practitioner_roles_count,
-            organizations_created=organizations_count,
-        )
-    
+        params = json.loads(job.params)
+        write_mode = get_write_mode(params["batched"], params["copy"], params["upsert"], params["parallel"])
+        await db.run_sync(ingest_jobs.start_job, job)
+        print(f"\n=== INGEST JOB {job_id} ({job.source}, {write_mode}) STARTED at {datetime.now()} ===")
+        
+        if job.manifest is None:
+            if params["clear_existing"]:
+                await db.run_sync(reset_deid_tables)
+            manifest = await INGEST_SOURCES[job.source].get_manifest(fhir_client)
+            since = parse_timestamp(params.get("since"))
+            if params["incremental"] and not params["clear_existing"]:
+                manifest, since = await db.run_sync(plan_incremental, manifest, since)
+            params["since"] = since.isoformat() if since else None
+            await db.run_sync(ingest_jobs.save_manifest, job, manifest, params)
+        manifest = json.loads(job.manifest)
+        since = parse_timestamp(params.get("since"))
+        
+        counts = json.loads(job.counts or "{}")
+        checkpoint = json.loads(job.checkpoint or "{}")
+        offsets = checkpoint.setdefault("offsets", {})
+        completed = checkpoint.setdefault("completed", [])
+        elapsed_before = job.elapsed_seconds or 0.0
+        run_start = time.time()
+        
+        for resource_type, file_info in critical_manifest_files(manifest):
+            file_name = file_info["fileName"]
+            if file_name in completed:
+                continue
+            offset = offsets.get(file_name, 0)
+            print(f"Job {job_id}: streaming {file_name}" + (f" from resource {offset}" if offset else ""))
+            position = 0
+            async for chunk in fhir_client.iter_file_chunks(file_info["url"], settings.ingest_chunk_size):
+                chunk_start = position
+                position += len(chunk)
+                if position <= offset:
+                    continue
+                chunk = chunk[max(offset - chunk_start, 0):]
+                if since:
+                    chunk = updated_since(chunk, since)
+                counts[resource_type] = counts.get(resource_type, 0) + await ingest_chunk(
+                    resource_type, chunk, db, write_mode, params["parallel"]
+                )
+                offsets[file_name] = position
+                await db.run_sync(ingest_jobs.save_progress, job, counts, checkpoint, elapsed_before + time.time() - run_start)
+            completed.append(file_name)
+            offsets.pop(file_name, None)
+            await db.run_sync(ingest_jobs.save_progress, job, counts, checkpoint, elapsed_before + time.time() - run_start)
+        
+        if settings.pseudonym_store:
+            await db.run_sync(pseudonym_store.flush)
+        await db.run_sync(record_ingestion, manifest, job.started_at)
+        await db.run_sync(ingest_jobs.finish_job, job, "completed")
+        print(f"🎉 INGEST JOB {job_id} COMPLETED in {time.time() - run_start:.2f} seconds")
     except Exception as e:
+        await db.rollback()
+        print(f"❌ Ingest job {job_id} failed: {e}")
+        await db.run_sync(ingest_jobs.finish_job, job, "failed", str(e))
+    finally:
+        await db.close()
+
+
+@router.post("/jobs", response_model=IngestJobStatus, status_code=status.HTTP_202_ACCEPTED)
+def create_ingest_job(
+    background_tasks: BackgroundTasks,
+    source: str = "synthea",
+    clear_existing: bool = False,
+    batched: bool = False,
+    copy: bool = False,
+    upsert: bool = False,
+    parallel: bool = False,
+    incremental: bool = False,
+    since: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Start a background ingestion of the Synthea (source=synthea, /bulk/manifest) or
+    hospital (source=hospital) export and return its job id right away.
+    Options are the same as POST /deid/ingest; files are always streamed.
+    Follow the job with GET /deid/jobs/{job_id}.
+    """
+    if source not in ingest_jobs.JOB_SOURCES:
+        raise HTTPException(status_code=400, detail=f"Unknown source {source!r}, expected one of {ingest_jobs.JOB_SOURCES}")
+    params = {
+        "clear_existing": clear_existing,
+        "batched": batched,
+        "copy": copy,
+        "upsert": upsert,
+        "parallel": parallel,
+        "incremental": incremental,
+        "since": since.isoformat() if since else None,
+    }
+    job = ingest_jobs.create_job(db, source, params)
+    background_tasks.add_task(run_ingest_job, job.job_id)
+    return ingest_jobs.job_status(job)
+
+
+@router.get("/jobs", response_model=IngestJobList)
+def get_ingest_jobs(limit: int = 20, db: Session = Depends(get_db)):
+    """List the most recent ingest jobs."""
+    jobs = db.query(IngestJob).order_by(IngestJob.id.desc()).limit(limit).all()
+    return {"jobs": [ingest_jobs.job_status(job) for job in jobs]}
+
+
+@router.get("/jobs/{job_id}", response_model=IngestJobStatus)
+def get_ingest_job(job_id: str, db: Session = Depends(get_db)):
+    """Status of an ingest job: per-resource-type counts and rates, and its checkpoint."""
+    job = ingest_jobs.get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return ingest_jobs.job_status(job)
+
+
+@router.post("/jobs/{job_id}/resume", response_model=IngestJobStatus, status_code=status.HTTP_202_ACCEPTED)
+def resume_ingest_job(job_id: str, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    """
+    Resume a failed or interrupted ingest job from its last checkpoint, or a
+    queued/running one whose process stopped sending heartbeats (see
+    ingest_jobs.is_stale).
+    """
+    job = ingest_jobs.get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status not in ("failed", "interrupted") and not ingest_jobs.is_stale(job):
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error during hospital data ingestion: {str(e)}"
+            status_code=409,
+            detail=f"Job is {job.status} (owner {job.owner}), only failed, interrupted or stale jobs can be resumed",
         )
-    finally:
-        await fhir_client.close()
+    ingest_jobs.queue_job(db, job)
+    background_tasks.add_task(run_ingest_job, job.job_id)
+    return ingest_jobs.job_status(job)
 
 
 # ========== Retrieval endpoints ==========
 
+class ListParams:
+    """
+    Query parameters of the list endpoints:
+        limit: page size
+        cursor: next_cursor of the previous page (keyset pagination over the primary key)
+        skip: legacy OFFSET, ignored with a cursor (slower the deeper the page)
+        patient_resource_id / encounter_resource_id: only the resources referencing them
+        date_from / date_to: clinical date (e.g. Observation.effective_date) in [date_from, date_to)
+    """
+
+    def __init__(
+        self,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        skip: int = 0,
+        patient_resource_id: Optional[str] = None,
+        encounter_resource_id: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+    ):
+        self.limit = limit
+        self.cursor = cursor
+        self.skip = skip
+        self.patient_resource_id = patient_resource_id
+        self.encounter_resource_id = encounter_resource_id
+        self.date_from = date_from
+        self.date_to = date_to
+
+
+async def list_resources(db: AsyncSession, resource_type: str, params: ListParams):
+    """Page of a resource type and its next_cursor (see list_page); bad parameters are a 400."""
+    try:
+        return await db.run_sync(lambda session: list_page(session, RESOURCE_SPECS[resource_type], **vars(params)))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("/patients", response_model=PatientList)
-def get_patients(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def get_patients(params: ListParams = Depends(), db: AsyncSession = Depends(get_async_db)):
     """Get de-identified patient data."""
-    patients = db.query(patient.Patient).offset(skip).limit(limit).all()
-    return {"patients": patients}
+    patients, next_cursor = await list_resources(db, "Patient", params)
+    return {"patients": patients, "next_cursor": next_cursor}
 
 
 @router.get("/patients/{resource_id}", response_model=PatientSchema)
-def get_patient(resource_id: str, db: Session = Depends(get_db)):
+async def get_patient(resource_id: str, db: AsyncSession = Depends(get_async_db)):
     """Get a specific de-identified patient by resource ID."""
-    db_patient = db.query(patient.Patient).filter(patient.Patient.resource_id == resource_id).first()
+    db_patient = await db.scalar(select(patient.Patient).where(patient.Patient.resource_id == resource_id))
     if not db_patient:
         raise HTTPException(status_code=404, detail="Patient not found")
     return db_patient
 
 
+@router.get("/patients/{resource_id}/everything", response_model=PatientEverything)
+async def get_patient_everything(resource_id: str, db: AsyncSession = Depends(get_async_db)):
+    """
+    A patient and all of its encounters, conditions, observations, medication
+    requests, diagnostic reports and document references in one response
+    (one indexed query per resource type).
+    """
+    bundles, _ = await db.run_sync(patient_bundles, [resource_id])
+    if not bundles:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    return bundles[0]
+
+
+@router.post("/patients/everything", response_model=PatientEverythingBatch)
+async def get_patients_everything(request: PatientEverythingRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Batch variant of /patients/{resource_id}/everything: the bundles of many
+    patients with one query per resource type, plus the ids not found.
+    """
+    if len(request.patient_resource_ids) > settings.everything_batch_max_patients:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.everything_batch_max_patients} patients per request",
+        )
+    bundles, missing = await db.run_sync(patient_bundles, request.patient_resource_ids)
+    return {"patients": bundles, "missing": missing}
+
+
 @router.get("/encounters", response_model=EncounterList)
-def get_encounters(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def get_encounters(params: ListParams = Depends(), db: AsyncSession = Depends(get_async_db)):
     """Get de-identified encounter data."""
-    encounters = db.query(encounter.Encounter).offset(skip).limit(limit).all()
-    return {"encounters": encounters}
+    encounters, next_cursor = await list_resources(db, "Encounter", params)
+    return {"encounters": encounters, "next_cursor": next_cursor}
 
 
 @router.get("/conditions", response_model=ConditionList)
-def get_conditions(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def get_conditions(params: ListParams = Depends(), db: AsyncSession = Depends(get_async_db)):
     """Get de-identified condition data."""
-    conditions = db.query(condition.Condition).offset(skip).limit(limit).all()
-    return {"conditions": conditions}
+    conditions, next_cursor = await list_resources(db, "Condition", params)
+    return {"conditions": conditions, "next_cursor": next_cursor}
 
 
 @router.get("/observations", response_model=ObservationList)
-def get_observations(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def get_observations(params: ListParams = Depends(), db: AsyncSession = Depends(get_async_db)):
     """Get de-identified observation data."""
-    observations = db.query(observation.Observation).offset(skip).limit(limit).all()
-    return {"observations": observations}
+    observations, next_cursor = await list_resources(db, "Observation", params)
+    return {"observations": observations, "next_cursor": next_cursor}
 
 
 @router.get("/medication-requests", response_model=MedicationRequestList)
-def get_medication_requests(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def get_medication_requests(params: ListParams = Depends(), db: AsyncSession = Depends(get_async_db)):
     """Get de-identified medication request data."""
-    med_requests = db.query(medication_request.MedicationRequest).offset(skip).limit(limit).all()
-    return {"medication_requests": med_requests}
+    med_requests, next_cursor = await list_resources(db, "MedicationRequest", params)
+    return {"medication_requests": med_requests, "next_cursor": next_cursor}
 
 
 @router.get("/procedures", response_model=ProcedureList)
-def get_procedures(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def get_procedures(params: ListParams = Depends(), db: AsyncSession = Depends(get_async_db)):
     """Get de-identified procedure data."""
-    procedures = db.query(procedure.Procedure).offset(skip).limit(limit).all()
-    return {"procedures": procedures}
+    procedures, next_cursor = await list_resources(db, "Procedure", params)
+    return {"procedures": procedures, "next_cursor": next_cursor}
 
 
 @router.get("/diagnostic-reports", response_model=DiagnosticReportList)
-def get_diagnostic_reports(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def get_diagnostic_reports(params: ListParams = Depends(), db: AsyncSession = Depends(get_async_db)):
     """Get de-identified diagnostic report data."""
-    reports = db.query(diagnostic_report.DiagnosticReport).offset(skip).limit(limit).all()
-    return {"diagnostic_reports": reports}
+    reports, next_cursor = await list_resources(db, "DiagnosticReport", params)
+    return {"diagnostic_reports": reports, "next_cursor": next_cursor}
 
 
 @router.get("/document-references", response_model=DocumentReferenceList)
-def get_document_references(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def get_document_references(params: ListParams = Depends(), db: AsyncSession = Depends(get_async_db)):
     """Get de-identified document reference data."""
-    doc_refs = db.query(document_reference.DocumentReference).offset(skip).limit(limit).all()
-    return {"document_references": doc_refs}
+    doc_refs, next_cursor = await list_resources(db, "DocumentReference", params)
+    return {"document_references": doc_refs, "next_cursor": next_cursor}
 
 
 @router.get("/allergy-intolerances", response_model=AllergyIntoleranceList)
-def get_allergy_intolerances(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def get_allergy_intolerances(params: ListParams = Depends(), db: AsyncSession = Depends(get_async_db)):
     """Get de-identified allergy intolerance data."""
-    allergies = db.query(allergy_intolerance.AllergyIntolerance).offset(skip).limit(limit).all()
-    return {"allergy_intolerances": allergies}
+    allergies, next_cursor = await list_resources(db, "AllergyIntolerance", params)
+    return {"allergy_intolerances": allergies, "next_cursor": next_cursor}
 
 
 @router.get("/immunizations", response_model=ImmunizationList)
-def get_immunizations(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def get_immunizations(params: ListParams = Depends(), db: AsyncSession = Depends(get_async_db)):
     """Get de-identified immunization data."""
-    immunizations = db.query(immunization.Immunization).offset(skip).limit(limit).all()
-    return {"immunizations": immunizations}
+    immunizations, next_cursor = await list_resources(db, "Immunization", params)
+    return {"immunizations": immunizations, "next_cursor": next_cursor}
 
 
 @router.get("/practitioners", response_model=PractitionerList)
-def get_practitioners(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def get_practitioners(params: ListParams = Depends(), db: AsyncSession = Depends(get_async_db)):
     """Get de-identified practitioner data."""
-    practitioners = db.query(practitioner.Practitioner).offset(skip).limit(limit).all()
-    return {"practitioners": practitioners}
+    practitioners, next_cursor = await list_resources(db, "Practitioner", params)
+    return {"practitioners": practitioners, "next_cursor": next_cursor}
 
 
 @router.get("/practitioner-roles", response_model=PractitionerRoleList)
-def get_practitioner_roles(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def get_practitioner_roles(params: ListParams = Depends(), db: AsyncSession = Depends(get_async_db)):
     """Get de-identified practitioner role data."""
-    roles = db.query(practitioner_role.PractitionerRole).offset(skip).limit(limit).all()
-    return {"practitioner_roles": roles}
+    roles, next_cursor = await list_resources(db, "PractitionerRole", params)
+    return {"practitioner_roles": roles, "next_cursor": next_cursor}
 
 
 @router.get("/organizations", response_model=OrganizationList)
-def get_organizations(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def get_organizations(params: ListParams = Depends(), db: AsyncSession = Depends(get_async_db)):
     """Get de-identified organization data."""
-    organizations = db.query(organization.Organization).offset(skip).limit(limit).all()
-    return {"organizations": organizations}
+    organizations, next_cursor = await list_resources(db, "Organization", params)
+    return {"organizations": organizations, "next_cursor": next_cursor}
+
+
+# ========== Streaming exports ==========
+
+# Resource type -> schema of its rows (the columns exported, as in the list endpoints)
+RESOURCE_SCHEMAS = {
+    "Patient": PatientSchema,
+    "Encounter": EncounterSchema,
+    "Condition": ConditionSchema,
+    "Observation": ObservationSchema,
+    "MedicationRequest": MedicationRequestSchema,
+    "Procedure": ProcedureSchema,
+    "DiagnosticReport": DiagnosticReportSchema,
+    "DocumentReference": DocumentReferenceSchema,
+    "AllergyIntolerance": AllergyIntoleranceSchema,
+    "Immunization": ImmunizationSchema,
+    "Practitioner": PractitionerSchema,
+    "PractitionerRole": PractitionerRoleSchema,
+    "Organization": OrganizationSchema,
+}
+
+
+@router.get("/export/{resource_type}")
+def export_resources(
+    resource_type: str,
+    gzip: bool = False,
+    patient_resource_id: Optional[str] = None,
+    encounter_resource_id: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    limit: Optional[int] = Query(default=None, ge=1),
+):
+    """
+    Stream a whole de-identified table as NDJSON (application/x-ndjson), one
+    row per line with the fields of its list endpoint, in primary key order, e.g.
+    /deid/export/Observation?gzip=true
+    
+    Args:
+        resource_type: FHIR resource type (Patient, Observation, ...)
+        gzip: gzip the body (Content-Encoding: gzip)
+        patient_resource_id / encounter_resource_id / date_from / date_to: as in the list endpoints
+        limit: stop after this many rows (the first ones in primary key order)
+    
+    Rows are read from a server-side cursor EXPORT_BATCH_SIZE at a time and
+    sent as they are read, so memory stays flat for any table size.
+    """
+    if resource_type not in RESOURCE_SCHEMAS:
+        raise HTTPException(status_code=404, detail=f"Unknown resource type {resource_type!r}")
+    try:
+        statement = export_statement(
+            RESOURCE_SPECS[resource_type],
+            list(RESOURCE_SCHEMAS[resource_type].model_fields),
+            patient_resource_id=patient_resource_id,
+            encounter_resource_id=encounter_resource_id,
+            date_from=date_from,
+            date_to=date_to,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if limit is not None:
+        statement = statement.limit(limit)
+    headers = {"Content-Encoding": "gzip"} if gzip else {}
+    return StreamingResponse(stream_ndjson(statement, gzip), media_type="application/x-ndjson", headers=headers)
+
+
+# ========== Raw FHIR queries ==========
+
+def require_raw_query_access(authorization: Optional[str] = Header(default=None)):
+    """
+    Gate of /raw-query, which returns source (identified) JSON: 404 unless
+    RAW_QUERY_ENABLED, 401 without "Authorization: Bearer <RAW_QUERY_TOKEN>".
+    """
+    if not settings.raw_query_enabled:
+        raise HTTPException(status_code=404, detail="Raw FHIR queries are disabled (RAW_QUERY_ENABLED)")
+    expected = f"Bearer {settings.raw_query_token}"
+    if not secrets.compare_digest((authorization or "").encode(), expected.encode()):
+        raise HTTPException(
+            status_code=401, detail="Invalid or missing raw query token", headers={"WWW-Authenticate": "Bearer"}
+        )
+
+
+@router.get("/raw-query", response_model=RawQueryResult, dependencies=[Depends(require_raw_query_access)])
+def query_raw_fhir(
+    resource_type: str,
+    where: Optional[str] = None,
+    select: List[str] = Query(default=[]),
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+):
+    """
+    Filter and project the source FHIR JSON of stored resources inside PostgreSQL
+    (RAW_FHIR_STORAGE=jsonb), e.g.
+    /deid/raw-query?resource_type=Observation&where=$.code.coding[*].code == "8867-4"&select=$.valueQuantity.value
+    
+    Args:
+        resource_type: FHIR resource type (Observation, DocumentReference, ...)
+        where: JSON path predicate the resource must match (jsonb @@, GIN indexed)
+        select: JSON paths to return per matching resource (first match, null if none)
+    
+    The source JSON is not de-identified: the endpoint is off unless
+    RAW_QUERY_ENABLED, and needs the RAW_QUERY_TOKEN bearer token (see
+    require_raw_query_access).
+    """
+    if resource_type not in RESOURCE_SPECS:
+        raise HTTPException(status_code=400, detail=f"Unknown resource type {resource_type!r}")
+    if db.get_bind().dialect.name != "postgresql":
+        raise HTTPException(status_code=400, detail="Raw FHIR queries require PostgreSQL (RAW_FHIR_STORAGE=jsonb)")
+    try:
+        items = raw_store.query_documents(db, resource_type, where, select, skip, limit)
+    except DBAPIError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Invalid JSON path query: {str(e.orig).splitlines()[0]}")
+    return {"resource_type": resource_type, "count": len(items), "items": items}
+
+
+# ========== Service stats ==========
+
+@router.get("/cache-stats", response_model=DeidCacheStats)
+def get_cache_stats():
+    """
+    Size and hit/miss/eviction counters of the pseudonym and date-shift caches
+    of this process (parallel=true workers keep their own caches).
+    """
+    return {"caches": deid_service.cache_stats()}
 
 
 # ========== Database Management ==========
@@ -1349,30 +827,13 @@ def clear_database(db: Session = Depends(get_db)):
     """
     Clear all de-identified data from the database.
     Use this before re-ingesting data to prevent duplicates and database overflow.
+    On PostgreSQL all tables are emptied by one TRUNCATE ... RESTART IDENTITY
+    (see reset_deid_tables); deleted_counts are the row counts just before.
     
     WARNING: This will permanently delete all records!
     """
     try:
-        # Delete in order respecting foreign key constraints
-        # Child tables first, then parent tables
-        deleted_counts = {}
-        
-        deleted_counts["document_references"] = db.query(document_reference.DocumentReference).delete()
-        deleted_counts["allergy_intolerances"] = db.query(allergy_intolerance.AllergyIntolerance).delete()
-        deleted_counts["immunizations"] = db.query(immunization.Immunization).delete()
-        deleted_counts["diagnostic_reports"] = db.query(diagnostic_report.DiagnosticReport).delete()
-        deleted_counts["procedures"] = db.query(procedure.Procedure).delete()
-        deleted_counts["medication_requests"] = db.query(medication_request.MedicationRequest).delete()
-        deleted_counts["observations"] = db.query(observation.Observation).delete()
-        deleted_counts["conditions"] = db.query(condition.Condition).delete()
-        deleted_counts["practitioner_roles"] = db.query(practitioner_role.PractitionerRole).delete()
-        deleted_counts["practitioners"] = db.query(practitioner.Practitioner).delete()
-        deleted_counts["organizations"] = db.query(organization.Organization).delete()
-        deleted_counts["encounters"] = db.query(encounter.Encounter).delete()
-        deleted_counts["patients"] = db.query(patient.Patient).delete()
-        
-        db.commit()
-        
+        deleted_counts = reset_deid_tables(db)
         total_deleted = sum(deleted_counts.values())
         
         return {
@@ -1382,7 +843,6 @@ def clear_database(db: Session = Depends(get_db)):
         }
     
     except Exception as e:
-        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error clearing database: {str(e)}"
@@ -1,4 +1,6 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
@@ -9,9 +11,38 @@ engine = create_engine(settings.database_url, pool_pre_ping=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+# Async driver of each database backend
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+
+def async_database_url(database_url: str) -> URL:
+    """DATABASE_URL with the async driver of its backend (postgresql+psycopg2 -> postgresql+asyncpg)."""
+    url = make_url(database_url)
+    return url.set(drivername=f"{url.get_backend_name()}+{ASYNC_DRIVERS[url.get_backend_name()]}")
+
+
+# One pool for the ingest and read routes: database I/O awaits instead of
+# blocking the event loop, so reads are served while an ingest runs
+_async_url = make_url(settings.async_database_url or async_database_url(settings.database_url))
+# Pool sizing applies to PostgreSQL; SQLite (aiosqlite) pools reject these arguments
+_pool_options = (
+    {"pool_size": settings.db_pool_size, "max_overflow": settings.db_max_overflow}
+    if _async_url.get_backend_name() == "postgresql"
+    else {}
+)
+async_engine = create_async_engine(_async_url, pool_pre_ping=True, **_pool_options)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,18 @@
+from datetime import timezone
+from sqlalchemy import DateTime
+from sqlalchemy.types import TypeDecorator
+
+
+class UTCDateTime(TypeDecorator):
+    """
+    "timestamp without time zone" column storing aware datetimes as naive UTC.
+    FHIR dates carry an offset: psycopg2 lets PostgreSQL convert them to the
+    session time zone, asyncpg rejects them, so they are converted here.
+    """
+    impl = DateTime
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is not None and value.tzinfo is not None:
+            return value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
@@ -1,8 +1,15 @@
 from fastapi import FastAPI
 from app.api.routes import router as api_router
 from app.api.deid_routes import router as deid_router
-from app.db.session import engine
+from app.core.config import DEFAULT_PSEUDONYM_SECRET, settings
+from app.db.session import engine, async_engine, SessionLocal
 from app.db.base import Base
+from app.services.parallel_deid import shutdown_pool
+from app.services import pseudonym_store
+from app.services.fhir_client import close_http_client
+from app.services.deid_service import deid_service
+from app.services.ingest_jobs import mark_interrupted_jobs
+from app.services.db_reset import create_secondary_indexes
 from contextlib import asynccontextmanager
 import py_eureka_client.eureka_client as eureka_client
 
@@ -11,9 +18,36 @@ async def lifespan(app: FastAPI):
     """
     Lifespan context manager for startup and shutdown events
     """
+    # Startup: Pseudonyms keyed by the published placeholder secret can be reversed
+    if settings.pseudonym_secret == DEFAULT_PSEUDONYM_SECRET:
+        raise RuntimeError("❌ PSEUDONYM_SECRET is not set: refusing to start with the default pseudonym secret")
+    
+    # Startup: The pseudonym store is written through the async engine
+    if settings.pseudonym_store:
+        pseudonym_store.check_backend(async_engine.url)
+    
     # Startup: Create database tables if they don't exist
     Base.metadata.create_all(bind=engine)
     
+    # Startup: Flag ingest jobs cut short by a previous shutdown/crash (resumable)
+    db = SessionLocal()
+    try:
+        interrupted = mark_interrupted_jobs(db)
+    finally:
+        db.close()
+    if interrupted:
+        print(f"⚠ {interrupted} ingest job(s) interrupted, resume with POST /deid/jobs/{{job_id}}/resume")
+    
+    # Startup: Rebuild secondary indexes left dropped by an interrupted rebuild_indexes ingest
+    db = SessionLocal()
+    try:
+        create_secondary_indexes(db)
+    finally:
+        db.close()
+    
+    # Startup: Generate the pseudonym pools before the first ingest
+    deid_service.pseudonyms.warm_up()
+    
     # Startup: Register with Eureka when FastAPI starts
     await eureka_client.init_async(
         eureka_server="http://localhost:8761/eureka",
@@ -29,6 +63,15 @@ async def lifespan(app: FastAPI):
     # Shutdown: Unregister when FastAPI stops
     await eureka_client.stop_async()
     print("✓ DeID service unregistered from Eureka")
+    
+    # Shutdown: Stop the de-identification worker pool
+    shutdown_pool()
+    
+    # Shutdown: Close the keep-alive connections to the FHIR proxy
+    await close_http_client()
+    
+    # Shutdown: Close the connections of the async pool
+    await async_engine.dispose()
 
 app = FastAPI(
     title="FHIR De-Identification Service",
@@ -1,7 +1,9 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy import Column, Integer, String, Text
+from sqlalchemy.orm import deferred
 from datetime import datetime
 
 from app.db.base import Base
+from app.db.types import UTCDateTime
 
 
 class Condition(Base):
@@ -21,10 +23,13 @@ class Condition(Base):
     category = Column(String(255), nullable=True)  # problem-list-item, encounter-diagnosis
     
     # Time-shifted
-    onset_date = Column(DateTime, nullable=True)
-    recorded_date = Column(DateTime, nullable=True)
+    onset_date = Column(UTCDateTime, index=True, nullable=True)
+    recorded_date = Column(UTCDateTime, nullable=True)
     
-    raw_fhir_data = Column(Text, nullable=True)
+    # Source JSON: deferred, list queries never load it
+    raw_fhir_data = deferred(Column(Text, nullable=True))
+    # SHA-256 of the canonical source JSON, used by upsert re-ingestion
+    content_hash = Column(String(64), nullable=True)
     
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(UTCDateTime, default=datetime.utcnow)
+    updated_at = Column(UTCDateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
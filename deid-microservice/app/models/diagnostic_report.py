@@ -1,7 +1,9 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy import Column, Integer, String, Text
+from sqlalchemy.orm import deferred
 from datetime import datetime
 
 from app.db.base import Base
+from app.db.types import UTCDateTime
 
 
 class DiagnosticReport(Base):
@@ -23,10 +25,13 @@ class DiagnosticReport(Base):
     conclusion = Column(Text, nullable=True)
     
     # Time-shifted
-    effective_date = Column(DateTime, nullable=True)
-    issued_date = Column(DateTime, nullable=True)
+    effective_date = Column(UTCDateTime, index=True, nullable=True)
+    issued_date = Column(UTCDateTime, nullable=True)
     
-    raw_fhir_data = Column(Text, nullable=True)
+    # Source JSON: deferred, list queries never load it
+    raw_fhir_data = deferred(Column(Text, nullable=True))
+    # SHA-256 of the canonical source JSON, used by upsert re-ingestion
+    content_hash = Column(String(64), nullable=True)
     
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(UTCDateTime, default=datetime.utcnow)
+    updated_at = Column(UTCDateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1,7 +1,9 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy import Column, Integer, String, Text
+from sqlalchemy.orm import deferred
 from datetime import datetime
 
 from app.db.base import Base
+from app.db.types import UTCDateTime
 
 
 class DocumentReference(Base):
@@ -30,13 +32,16 @@ class DocumentReference(Base):
     custodian_display = Column(String(255), nullable=True)
     
     # Time-shifted
-    created_date = Column(DateTime, nullable=True)
+    created_date = Column(UTCDateTime, index=True, nullable=True)
     
     # Preserve base64 attachment data for document references when needed
     # (e.g. encrypted payload used by downstream NLP featureizers)
     attachment_data = Column(Text, nullable=True)
 
-    raw_fhir_data = Column(Text, nullable=True)
+    # Source JSON: deferred, list queries never load it
+    raw_fhir_data = deferred(Column(Text, nullable=True))
+    # SHA-256 of the canonical source JSON, used by upsert re-ingestion
+    content_hash = Column(String(64), nullable=True)
     
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(UTCDateTime, default=datetime.utcnow)
+    updated_at = Column(UTCDateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
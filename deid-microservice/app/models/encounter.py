@@ -1,7 +1,9 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float
+from sqlalchemy import Column, Integer, String, Text, Float
+from sqlalchemy.orm import deferred
 from datetime import datetime
 
 from app.db.base import Base
+from app.db.types import UTCDateTime
 
 
 class Encounter(Base):
@@ -18,8 +20,8 @@ class Encounter(Base):
     type_code = Column(String(255), nullable=True)
     
     # Time-shifted dates for privacy
-    start_date = Column(DateTime, nullable=True)
-    end_date = Column(DateTime, nullable=True)
+    start_date = Column(UTCDateTime, index=True, nullable=True)
+    end_date = Column(UTCDateTime, nullable=True)
     
     # Length of stay (derived, important for readmission)
     length_of_stay_days = Column(Float, nullable=True)
@@ -27,7 +29,10 @@ class Encounter(Base):
     # Location info (may need de-identification)
     location_name = Column(String(255), nullable=True)
     
-    raw_fhir_data = Column(Text, nullable=True)
+    # Source JSON: deferred, list queries never load it
+    raw_fhir_data = deferred(Column(Text, nullable=True))
+    # SHA-256 of the canonical source JSON, used by upsert re-ingestion
+    content_hash = Column(String(64), nullable=True)
     
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(UTCDateTime, default=datetime.utcnow)
+    updated_at = Column(UTCDateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
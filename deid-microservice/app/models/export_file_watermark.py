@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, UniqueConstraint
+from datetime import datetime
+
+from app.db.base import Base
+from app.db.types import UTCDateTime
+
+
+class ExportFileWatermark(Base):
+    __tablename__ = "export_file_watermarks"
+    __table_args__ = (UniqueConstraint("export_id", "file_name", name="uq_export_file_watermarks_file"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    export_id = Column(String(255), index=True, nullable=False)  # Manifest exportId
+    file_name = Column(String(255), nullable=False)
+    
+    # "<size>:<lastModified>" from the manifest when the file was last ingested
+    fingerprint = Column(String(255), nullable=True)
+    
+    ingested_at = Column(UTCDateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String
+from datetime import datetime
+
+from app.db.base import Base
+from app.db.types import UTCDateTime
+
+
+class ExportWatermark(Base):
+    __tablename__ = "export_watermarks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    export_id = Column(String(255), unique=True, index=True, nullable=False)  # Manifest exportId
+    
+    # Resources last updated before this time were ingested by a previous run
+    # (manifest transactionTime, or the start time of the run)
+    high_water_mark = Column(UTCDateTime, nullable=False)
+    
+    created_at = Column(UTCDateTime, default=datetime.utcnow)
+    updated_at = Column(UTCDateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,33 @@
+from sqlalchemy import Column, Integer, String, Text, Float
+from datetime import datetime
+
+from app.db.base import Base
+from app.db.types import UTCDateTime
+
+
+class IngestJob(Base):
+    __tablename__ = "ingest_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String(36), unique=True, index=True, nullable=False)  # UUID returned to clients
+    source = Column(String(20), nullable=False)  # "synthea" (/bulk/manifest) or "hospital"
+    status = Column(String(20), nullable=False, index=True)  # queued, running, completed, failed, interrupted
+    
+    # JSON documents
+    params = Column(Text, nullable=False)  # Ingest options (write mode flags, incremental, since)
+    manifest = Column(Text, nullable=True)  # Manifest being ingested, fixed by the first run
+    counts = Column(Text, nullable=True)  # {resource_type: rows stored}
+    checkpoint = Column(Text, nullable=True)  # {"offsets": {file_name: resources done}, "completed": [file_name]}
+    
+    # Process running the job ("<hostname>:<pid>") and its last sign of life,
+    # so a restarting replica only flags its own or abandoned jobs as interrupted
+    owner = Column(String(255), nullable=True)
+    heartbeat_at = Column(UTCDateTime, nullable=True)
+    
+    elapsed_seconds = Column(Float, default=0.0)  # Running time, summed over resumes
+    error = Column(Text, nullable=True)
+    
+    started_at = Column(UTCDateTime, nullable=True)
+    finished_at = Column(UTCDateTime, nullable=True)
+    created_at = Column(UTCDateTime, default=datetime.utcnow)
+    updated_at = Column(UTCDateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
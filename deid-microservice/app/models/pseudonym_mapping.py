@@ -0,0 +1,16 @@
+from sqlalchemy import Column, String, Text
+from datetime import datetime
+
+from app.db.base import Base
+from app.db.types import UTCDateTime
+
+
+class PseudonymMapping(Base):
+    __tablename__ = "pseudonym_mappings"
+
+    # HMAC-SHA256(PSEUDONYM_SECRET, "<kind>:<original>") - the original value is never stored
+    key_hash = Column(String(64), primary_key=True)
+    kind = Column(String(20), nullable=False)  # Pseudonym pool (given, family, city, ...)
+    pseudonym = Column(Text, nullable=False)
+    
+    created_at = Column(UTCDateTime, default=datetime.utcnow)
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, String, JSON, Index
+from sqlalchemy.dialects.postgresql import JSONB
+from datetime import datetime
+
+from app.db.base import Base
+from app.db.types import UTCDateTime
+
+
+class RawFhirDocument(Base):
+    """Source JSON of a stored resource as JSONB (RAW_FHIR_STORAGE=jsonb, PostgreSQL)."""
+    __tablename__ = "raw_fhir_documents"
+    __table_args__ = (
+        # jsonb_path_ops GIN index: serves the @@ / @? JSON path filters of /deid/raw-query
+        Index(
+            "ix_raw_fhir_documents_payload",
+            "payload",
+            postgresql_using="gin",
+            postgresql_ops={"payload": "jsonb_path_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
+
+    resource_type = Column(String(64), primary_key=True)
+    resource_id = Column(String(255), primary_key=True)
+    
+    payload = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=False)
+    
+    created_at = Column(UTCDateTime, default=datetime.utcnow)
+    updated_at = Column(UTCDateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
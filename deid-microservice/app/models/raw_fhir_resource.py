@@ -0,0 +1,19 @@
+from sqlalchemy import Column, String, LargeBinary
+from datetime import datetime
+
+from app.db.base import Base
+from app.db.types import UTCDateTime
+
+
+class RawFhirResource(Base):
+    """Compressed source JSON of a stored resource (RAW_FHIR_STORAGE=compressed)."""
+    __tablename__ = "raw_fhir_resources"
+
+    resource_type = Column(String(64), primary_key=True)
+    resource_id = Column(String(255), primary_key=True)
+    
+    codec = Column(String(10), nullable=False)  # zstd / zlib
+    data = Column(LargeBinary, nullable=False)
+    
+    created_at = Column(UTCDateTime, default=datetime.utcnow)
+    updated_at = Column(UTCDateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
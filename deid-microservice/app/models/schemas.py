@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import date, datetime
 
 # Unified ORM-friendly BaseModel for Pydantic v1 and v2
@@ -142,32 +142,40 @@ class DiagnosticReportSchema(OrmModel):
 
 
 # ========== List schemas for bulk retrieval ==========
+# next_cursor: cursor of the next page (keyset pagination), None on the last one
 class PatientList(OrmModel):
     patients: List[PatientSchema]
+    next_cursor: Optional[str] = None
 
 
 class EncounterList(OrmModel):
     encounters: List[EncounterSchema]
+    next_cursor: Optional[str] = None
 
 
 class ConditionList(OrmModel):
     conditions: List[ConditionSchema]
+    next_cursor: Optional[str] = None
 
 
 class ObservationList(OrmModel):
     observations: List[ObservationSchema]
+    next_cursor: Optional[str] = None
 
 
 class MedicationRequestList(OrmModel):
     medication_requests: List[MedicationRequestSchema]
+    next_cursor: Optional[str] = None
 
 
 class ProcedureList(OrmModel):
     procedures: List[ProcedureSchema]
+    next_cursor: Optional[str] = None
 
 
 class DiagnosticReportList(OrmModel):
     diagnostic_reports: List[DiagnosticReportSchema]
+    next_cursor: Optional[str] = None
 
 
 class DocumentReferenceSchema(OrmModel):
@@ -190,6 +198,7 @@ class DocumentReferenceSchema(OrmModel):
 
 class DocumentReferenceList(OrmModel):
     document_references: List[DocumentReferenceSchema]
+    next_cursor: Optional[str] = None
 
 
 class AllergyIntoleranceSchema(OrmModel):
@@ -212,6 +221,7 @@ class AllergyIntoleranceSchema(OrmModel):
 
 class AllergyIntoleranceList(OrmModel):
     allergy_intolerances: List[AllergyIntoleranceSchema]
+    next_cursor: Optional[str] = None
 
 
 class ImmunizationSchema(OrmModel):
@@ -234,6 +244,7 @@ class ImmunizationSchema(OrmModel):
 
 class ImmunizationList(OrmModel):
     immunizations: List[ImmunizationSchema]
+    next_cursor: Optional[str] = None
 
 
 class PractitionerSchema(OrmModel):
@@ -257,6 +268,7 @@ class PractitionerSchema(OrmModel):
 
 class PractitionerList(OrmModel):
     practitioners: List[PractitionerSchema]
+    next_cursor: Optional[str] = None
 
 
 class PractitionerRoleSchema(OrmModel):
@@ -277,6 +289,7 @@ class PractitionerRoleSchema(OrmModel):
 
 class PractitionerRoleList(OrmModel):
     practitioner_roles: List[PractitionerRoleSchema]
+    next_cursor: Optional[str] = None
 
 
 class OrganizationSchema(OrmModel):
@@ -298,6 +311,27 @@ class OrganizationSchema(OrmModel):
 
 class OrganizationList(OrmModel):
     organizations: List[OrganizationSchema]
+    next_cursor: Optional[str] = None
+
+
+# ========== Patient $everything ==========
+class PatientEverything(OrmModel):
+    patient: PatientSchema
+    encounters: List[EncounterSchema]
+    conditions: List[ConditionSchema]
+    observations: List[ObservationSchema]
+    medication_requests: List[MedicationRequestSchema]
+    diagnostic_reports: List[DiagnosticReportSchema]
+    document_references: List[DocumentReferenceSchema]
+
+
+class PatientEverythingRequest(OrmModel):
+    patient_resource_ids: List[str]
+
+
+class PatientEverythingBatch(OrmModel):
+    patients: List[PatientEverything]
+    missing: List[str]  # requested ids with no stored patient
 
 
 # ========== FHIR Proxy API schemas ==========
@@ -312,6 +346,14 @@ class FHIRManifest(OrmModel):
 
 
 # ========== Ingestion response ==========
+class FileFetchTiming(OrmModel):
+    file_name: str
+    resource_type: str
+    resources: int
+    seconds: float
+    cache: Optional[str] = None  # "hit" / "miss" with FHIR_CACHE_DIR
+
+
 class IngestionResult(OrmModel):
     status: str
     message: str
@@ -329,3 +371,53 @@ class IngestionResult(OrmModel):
     practitioners_created: int
     practitioner_roles_created: int
     organizations_created: int
+    file_timings: List[FileFetchTiming] = []
+    cache_hits: int = 0
+    cache_misses: int = 0
+
+
+# ========== Ingest jobs ==========
+class IngestJobStatus(OrmModel):
+    job_id: str
+    source: str
+    status: str
+    params: Dict[str, Any]
+    counts: Dict[str, int]
+    rates: Dict[str, float]
+    resources_per_second: float
+    elapsed_seconds: float
+    file_offsets: Dict[str, int]
+    completed_files: List[str]
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class IngestJobList(OrmModel):
+    jobs: List[IngestJobStatus]
+
+
+# ========== Raw FHIR queries ==========
+class RawQueryItem(OrmModel):
+    resource_id: str
+    values: Dict[str, Any]  # select path -> value
+
+
+class RawQueryResult(OrmModel):
+    resource_type: str
+    count: int
+    items: List[RawQueryItem]
+
+
+# ========== Service stats ==========
+class CacheStats(OrmModel):
+    size: int
+    max_size: int
+    hits: int
+    misses: int
+    evictions: int
+
+
+class DeidCacheStats(OrmModel):
+    caches: Dict[str, CacheStats]
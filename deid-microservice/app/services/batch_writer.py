@@ -0,0 +1,83 @@
+from typing import List, Dict, Any, Type, Set, Iterable, Callable, Optional
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.db.base import Base
+
+# Hook of the chunk writers: before_commit(db, rows) runs in the transaction of
+# the rows it is given, just before their commit (side rows stored atomically)
+BeforeCommit = Optional[Callable[[Session, List[Dict[str, Any]]], Any]]
+
+
+def existing_resource_ids(db: Session, model: Type[Base], resource_ids: Iterable[str]) -> Set[str]:
+    """Return the subset of resource_ids already stored in the model's table (one indexed IN query)."""
+    resource_ids = list(resource_ids)
+    if not resource_ids:
+        return set()
+    result = db.execute(select(model.resource_id).where(model.resource_id.in_(resource_ids)))
+    return set(result.scalars())
+
+
+def filter_new_resources(db: Session, model: Type[Base], resources: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Dedupe stage run before de-identification: drop the FHIR resources of a chunk
+    whose id is already stored, or that repeat an earlier id of the same chunk.
+    """
+    stored = existing_resource_ids(db, model, {r.get("id") for r in resources if r.get("id")})
+    new_resources = []
+    for fhir_resource in resources:
+        resource_id = fhir_resource.get("id")
+        if resource_id in stored:
+            continue
+        stored.add(resource_id)
+        new_resources.append(fhir_resource)
+    return new_resources
+
+
+def write_rows(db: Session, model: Type[Base], rows: List[Dict[str, Any]], before_commit: BeforeCommit = None) -> int:
+    """
+    Store de-identified row dicts one at a time: one ORM insert and one commit
+    per row (the "row" write mode). Returns the number of stored rows.
+    """
+    for row in rows:
+        db.add(model(**row))
+        if before_commit:
+            before_commit(db, [row])
+        db.commit()
+    return len(rows)
+
+
+def write_batch(db: Session, model: Type[Base], rows: List[Dict[str, Any]], before_commit: BeforeCommit = None) -> int:
+    """
+    Insert a chunk of de-identified row dicts with one multi-row INSERT and one commit.
+    If the chunk fails (e.g. a duplicate resource_id or a value too long for its
+    column), it is rolled back and retried row by row so that only the bad
+    records are skipped. before_commit only ever sees the rows being committed.
+    Returns the number of inserted rows.
+    """
+    if not rows:
+        return 0
+
+    try:
+        db.execute(insert(model), rows)
+        if before_commit:
+            before_commit(db, rows)
+        db.commit()
+        return len(rows)
+    except SQLAlchemyError as e:
+        db.rollback()
+        print(f"Batch insert of {len(rows)} rows into {model.__tablename__} failed, retrying row by row: {e.__class__.__name__}")
+
+    inserted = 0
+    for row in rows:
+        try:
+            db.execute(insert(model), [row])
+            if before_commit:
+                before_commit(db, [row])
+            db.commit()
+            inserted += 1
+        except SQLAlchemyError as e:
+            db.rollback()
+            print(f"Skipping {model.__tablename__} resource {row.get('resource_id')}: {e.__class__.__name__}")
+    return inserted
@@ -0,0 +1,153 @@
+from datetime import date, datetime, timezone
+from typing import List, Dict, Any, Type, Iterable, Iterator, Callable
+from sqlalchemy import Date
+from sqlalchemy.orm import Session
+from sqlalchemy.util import await_only
+
+from app.db.base import Base
+from app.services.batch_writer import BeforeCommit, write_batch
+
+
+def _copy_text(value: str) -> str:
+    """Escape a value for the COPY text format."""
+    return (
+        value.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _format_value(value: Any) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        # Columns are "timestamp without time zone": store aware datetimes as naive
+        # UTC, like the ORM path does on a UTC server, instead of letting COPY
+        # silently drop the offset
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.isoformat(sep=" ")
+    if isinstance(value, date):
+        return value.isoformat()
+    return _copy_text(str(value))
+
+
+def _format_date(value: Any) -> str:
+    if isinstance(value, datetime):
+        value = value.date()
+    return _format_value(value)
+
+
+def _record_value(value: Any) -> Any:
+    # asyncpg rejects aware datetimes for "timestamp without time zone" (see _format_value)
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _record_date(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+class _CopyStream:
+    """File-like object that renders rows to COPY text lines lazily, as psycopg2 reads them."""
+
+    def __init__(self, lines: Iterator[str]):
+        self._lines = lines
+        self._buffer = ""
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def readline(self, size: int = -1) -> str:
+        return self.read(size)
+
+
+def copy_rows(db: Session, model: Type[Base], rows: Iterable[Dict[str, Any]], before_commit: BeforeCommit = None) -> int:
+    """
+    Load de-identified row dicts into the model's table with
+    COPY ... FROM STDIN (psycopg2 copy_expert, or asyncpg copy_records_to_table
+    for the session of an AsyncSession), streaming the rows as they are
+    produced. created_at/updated_at are filled in here since COPY bypasses the
+    ORM column defaults. Commits once at the end, after before_commit(db, rows)
+    (rows must then be a list).
+    Returns the number of copied rows.
+    """
+    table = model.__table__
+    now = datetime.utcnow()
+    columns = [c for c in table.columns if c.name != "id"]
+    formatters: List[Callable[[Any], str]] = [
+        _format_date if isinstance(c.type, Date) else _format_value
+        for c in columns
+    ]
+    converters: List[Callable[[Any], Any]] = [
+        _record_date if isinstance(c.type, Date) else _record_value
+        for c in columns
+    ]
+    defaults = {"created_at": now, "updated_at": now}
+    copied = 0
+
+    def lines() -> Iterator[str]:
+        nonlocal copied
+        for row in rows:
+            values = [row.get(c.name, defaults.get(c.name)) for c in columns]
+            copied += 1
+            yield "\t".join(fmt(v) for fmt, v in zip(formatters, values)) + "\n"
+
+    def records() -> Iterator[List[Any]]:
+        nonlocal copied
+        for row in rows:
+            copied += 1
+            yield [convert(row.get(c.name, defaults.get(c.name))) for convert, c in zip(converters, columns)]
+
+    connection = db.connection().connection
+    if db.get_bind().dialect.driver == "asyncpg":
+        # Session of an AsyncSession (run_sync): binary COPY of the Python values
+        # on the asyncpg connection, awaited from the session's greenlet
+        await_only(connection.driver_connection.copy_records_to_table(
+            table.name, records=records(), columns=[c.name for c in columns]
+        ))
+    else:
+        column_list = ", ".join(c.name for c in columns)
+        cursor = connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY {table.name} ({column_list}) FROM STDIN", _CopyStream(lines()))
+        finally:
+            cursor.close()
+    if before_commit:
+        before_commit(db, rows)
+    db.commit()
+    return copied
+
+
+def load_rows(db: Session, model: Type[Base], rows: List[Dict[str, Any]], before_commit: BeforeCommit = None) -> int:
+    """
+    Write a chunk of rows with COPY on PostgreSQL. Falls back to write_batch
+    (multi-row INSERT, then row by row) on other databases or when COPY fails,
+    e.g. because a resource_id of the chunk is already stored.
+    Returns the number of stored rows.
+    """
+    if not rows:
+        return 0
+    if db.get_bind().dialect.name != "postgresql":
+        return write_batch(db, model, rows, before_commit)
+
+    try:
+        return copy_rows(db, model, rows, before_commit)
+    except Exception as e:
+        db.rollback()
+        print(f"COPY of {len(rows)} rows into {model.__tablename__} failed, falling back to INSERT: {e.__class__.__name__}")
+        return write_batch(db, model, rows, before_commit)
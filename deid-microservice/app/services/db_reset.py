@@ -0,0 +1,105 @@
+from typing import Dict, List
+from sqlalchemy import Index, func, select, text
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex, DropIndex
+
+from app.db.base import Base
+from app.models import (
+    patient, encounter, condition, observation, medication_request, procedure, diagnostic_report,
+    document_reference, allergy_intolerance, immunization, practitioner, practitioner_role, organization
+)
+from app.models.export_file_watermark import ExportFileWatermark
+from app.models.export_watermark import ExportWatermark
+from app.models.raw_fhir_document import RawFhirDocument
+from app.models.raw_fhir_resource import RawFhirResource
+
+# Tables emptied by a reset, child tables first (the order of the per-table DELETE path).
+# The export watermarks go too: an incremental ingest after a reset must load every file again
+DEID_MODELS: List[Base] = [
+    document_reference.DocumentReference,
+    allergy_intolerance.AllergyIntolerance,
+    immunization.Immunization,
+    diagnostic_report.DiagnosticReport,
+    procedure.Procedure,
+    medication_request.MedicationRequest,
+    observation.Observation,
+    condition.Condition,
+    practitioner_role.PractitionerRole,
+    practitioner.Practitioner,
+    organization.Organization,
+    encounter.Encounter,
+    patient.Patient,
+    RawFhirResource,
+    RawFhirDocument,
+    ExportFileWatermark,
+    ExportWatermark,
+]
+
+
+def count_rows(db: Session) -> Dict[str, int]:
+    """Row count of every deid table, in one round trip (one scalar subquery per table)."""
+    counts = select(*[
+        select(func.count()).select_from(model).scalar_subquery().label(model.__tablename__)
+        for model in DEID_MODELS
+    ])
+    return dict(db.execute(counts).one()._mapping)
+
+
+def reset_deid_tables(db: Session) -> Dict[str, int]:
+    """
+    Empty every deid table in one transaction and return the per-table row
+    counts taken just before.
+    On PostgreSQL the tables are locked, counted, then emptied with a single
+    TRUNCATE ... RESTART IDENTITY (no per-row DELETE, dead tuples or WAL per
+    row, and the id sequences restart). Elsewhere each table gets a DELETE.
+    """
+    try:
+        if db.get_bind().dialect.name == "postgresql":
+            tables = ", ".join(model.__tablename__ for model in DEID_MODELS)
+            # Fail instead of queueing every reader behind a lock held by a long transaction
+            db.execute(text("SET LOCAL lock_timeout = '30s'"))
+            db.execute(text(f"LOCK TABLE {tables} IN ACCESS EXCLUSIVE MODE"))
+            counts = count_rows(db)
+            db.execute(text(f"TRUNCATE {tables} RESTART IDENTITY"))
+        else:
+            counts = {model.__tablename__: db.query(model).delete() for model in DEID_MODELS}
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return counts
+
+
+def secondary_indexes(dialect: str) -> List[Index]:
+    """
+    Non-unique indexes of the deid tables (unique ones back the dedupe and
+    ON CONFLICT paths), without the PostgreSQL-only ones (GIN) elsewhere.
+    """
+    return [
+        index
+        for model in DEID_MODELS
+        for index in model.__table__.indexes
+        if not index.unique and (dialect == "postgresql" or not index.dialect_options["postgresql"]["using"])
+    ]
+
+
+def drop_secondary_indexes(db: Session) -> List[str]:
+    """
+    Drop the secondary indexes before a bulk reload, so rows are written
+    without index maintenance. Rebuild them with create_secondary_indexes.
+    Returns the names of the indexes dropped.
+    """
+    indexes = secondary_indexes(db.get_bind().dialect.name)
+    for index in indexes:
+        db.execute(DropIndex(index, if_exists=True))
+    db.commit()
+    return [index.name for index in indexes]
+
+
+def create_secondary_indexes(db: Session) -> List[str]:
+    """(Re)build the secondary indexes, one sorted build per index. Returns their names."""
+    indexes = secondary_indexes(db.get_bind().dialect.name)
+    for index in indexes:
+        db.execute(CreateIndex(index, if_not_exists=True))
+    db.commit()
+    return [index.name for index in indexes]
@@ -1,9 +1,13 @@
 from faker import Faker
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
-import random
+from typing import Dict, Iterator, Optional
 import hashlib
 
+from app.core.config import settings
+from app.services.lru_cache import LRUCache
+from app.services.pseudonym_engine import PseudonymEngine
+
 fake = Faker()
 Faker.seed(42)  # For reproducibility in testing
 
@@ -11,25 +15,72 @@ Faker.seed(42)  # For reproducibility in testing
 class DeIdentificationService:
     """Service to anonymize/de-identify FHIR resource data using Faker."""
     
-    def __init__(self):
+    def __init__(self, secret: Optional[str] = None, cache_size: Optional[int] = None):
         self.fake = Faker()
-        # Maintain consistent mapping for same original values (deterministic)
-        self._name_cache: Dict[str, str] = {}
-        self._address_cache: Dict[str, str] = {}
-        self._phone_cache: Dict[str, str] = {}
-        self._email_cache: Dict[str, str] = {}
+        # Pseudonyms are picked from pre-generated pools by a keyed hash of the
+        # original value: the same in every process (e.g. parallel workers)
+        self.pseudonyms = PseudonymEngine(secret=secret)
+        # Maintain consistent mapping for same original values (deterministic).
+        # Caches are bounded LRUs: an evicted value is derived again to the same
+        # pseudonym, so eviction never breaks consistency
+        cache_size = cache_size or settings.deid_cache_size
+        self._name_cache = LRUCache(cache_size)
+        self._address_cache = LRUCache(cache_size)
+        self._phone_cache = LRUCache(cache_size)
+        self._email_cache = LRUCache(cache_size)
         
         # Date shift strategy: consistent shift per patient
-        self._date_shift_cache: Dict[str, int] = {}
+        self._date_shift_cache = LRUCache(cache_size)
+        # Stored pseudonyms pinned for the chunk being de-identified (see pinning)
+        self._pinned: Dict[str, str] = {}
+    
+    @staticmethod
+    def _derive_shift(patient_id: str) -> int:
+        """Hash patient ID to get consistent random shift between -365 and +365 days."""
+        hash_val = int(hashlib.sha256(patient_id.encode()).hexdigest(), 16)
+        return (hash_val % 731) - 365  # Range: -365 to +365
     
     def _get_deterministic_shift(self, patient_id: str) -> int:
         """Get a consistent date shift (in days) for a patient based on their ID."""
-        if patient_id not in self._date_shift_cache:
-            # Hash patient ID to get consistent random shift between -365 and +365 days
-            hash_val = int(hashlib.sha256(patient_id.encode()).hexdigest(), 16)
-            shift_days = (hash_val % 731) - 365  # Range: -365 to +365
-            self._date_shift_cache[patient_id] = shift_days
-        return self._date_shift_cache[patient_id]
+        return self._date_shift_cache.get_or_compute(patient_id, lambda: self._derive_shift(patient_id))
+    
+    @contextmanager
+    def pinning(self, pseudonyms: Dict[str, str]) -> Iterator[None]:
+        """
+        Use stored pseudonyms ({key hash: pseudonym}) instead of the pool values
+        for the block (the chunk they were looked up for); nothing is kept
+        after it. Only the cache entries of the pinned keys are replaced.
+        """
+        with self.pseudonyms.pinning(pseudonyms):
+            self._pinned = pseudonyms
+            try:
+                yield
+            finally:
+                self._pinned = {}
+    
+    def _cached_pseudonym(self, cache: LRUCache, cache_key: str, kind: str, original: str) -> str:
+        # Caches hold (key hash, pseudonym): cache hits are recorded too, so the
+        # pseudonym store checks every value used, whichever process cached it
+        if self._pinned:
+            entry = self.pseudonyms.entry(kind, original)
+            if entry[0] in self._pinned:
+                cache.put(cache_key, entry)
+            else:
+                entry = cache.get_or_compute(cache_key, lambda: entry)
+        else:
+            entry = cache.get_or_compute(cache_key, lambda: self.pseudonyms.entry(kind, original))
+        self.pseudonyms.record(kind, *entry)
+        return entry[1]
+    
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """Size and hit/miss/eviction counters of each pseudonym cache."""
+        return {
+            "names": self._name_cache.stats(),
+            "addresses": self._address_cache.stats(),
+            "phones": self._phone_cache.stats(),
+            "emails": self._email_cache.stats(),
+            "date_shifts": self._date_shift_cache.stats(),
+        }
     
     def anonymize_name(self, original_name: str, name_type: str = "given") -> str:
         """Anonymize a name (first or last) consistently."""
@@ -37,34 +88,28 @@ class DeIdentificationService:
             return None
         
         cache_key = f"{name_type}:{original_name}"
-        if cache_key not in self._name_cache:
-            if name_type == "given":
-                self._name_cache[cache_key] = self.fake.first_name()
-            else:
-                self._name_cache[cache_key] = self.fake.last_name()
-        return self._name_cache[cache_key]
+        kind = "given" if name_type == "given" else "family"
+        return self._cached_pseudonym(self._name_cache, cache_key, kind, original_name)
     
     def anonymize_address(self, original_address: str) -> str:
         """Anonymize an address consistently."""
         if not original_address:
             return None
         
-        if original_address not in self._address_cache:
-            self._address_cache[original_address] = self.fake.street_address()
-        return self._address_cache[original_address]
+        return self._cached_pseudonym(self._address_cache, original_address, "address", original_address)
     
     def anonymize_city(self, original_city: str) -> str:
-        """Generate a fake city name."""
+        """Generate a fake city name (consistent per original)."""
         if not original_city:
             return None
-        return self.fake.city()
+        return self.pseudonyms.pseudonym("city", original_city)
     
     def anonymize_postal_code(self, original_postal: str) -> str:
         """Generate a fake postal code or generalize to first 3 digits."""
         if not original_postal:
             return None
         # Option 1: Completely fake
-        return self.fake.zipcode()
+        return self.pseudonyms.pseudonym("postal", original_postal)
         # Option 2: Generalize (keep first 3 digits)
         # return original_postal[:3] + "XX" if len(original_postal) >= 3 else "XXXXX"
     
@@ -73,18 +118,14 @@ class DeIdentificationService:
         if not original_phone:
             return None
         
-        if original_phone not in self._phone_cache:
-            self._phone_cache[original_phone] = self.fake.phone_number()
-        return self._phone_cache[original_phone]
+        return self._cached_pseudonym(self._phone_cache, original_phone, "phone", original_phone)
     
     def anonymize_email(self, original_email: str) -> str:
         """Anonymize email consistently."""
         if not original_email:
             return None
         
-        if original_email not in self._email_cache:
-            self._email_cache[original_email] = self.fake.email()
-        return self._email_cache[original_email]
+        return self._cached_pseudonym(self._email_cache, original_email, "email", original_email)
     
     def shift_date(self, original_date: Optional[datetime], patient_id: str) -> Optional[datetime]:
         """Shift a date by a consistent amount for a given patient."""
@@ -98,14 +139,14 @@ class DeIdentificationService:
         """Anonymize provider/practitioner name."""
         if not original_name:
             return None
-        return self.fake.name()
+        return self.pseudonyms.pseudonym("provider", original_name)
     
     def anonymize_location(self, original_location: str) -> str:
         """Anonymize location/facility name."""
         if not original_location:
             return None
-        # Generate generic hospital/facility name
-        return f"{self.fake.city()} Medical Center"
+        # Generic hospital/facility name ("<city> Medical Center")
+        return self.pseudonyms.pseudonym("location", original_location)
     
     def generalize_age(self, birth_date: Optional[datetime]) -> Optional[int]:
         """Calculate age from birth date (useful for ML features)."""
@@ -1,18 +1,146 @@
+import asyncio
+import importlib.util
 import httpx
-from typing import List, Dict, Any
+import os
+import random
+import time
+from itertools import islice
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
 from app.core.config import settings
+from app.services import file_cache
+from app.services.ndjson_spool import create_spool_file, iter_ndjson_file, parse_ndjson_lines, read_ndjson_file
+
+
+# Critical resource types, in the order they are ingested
+CRITICAL_RESOURCE_TYPES = (
+    "Patient",
+    "Encounter",
+    "Condition",
+    "Observation",
+    "MedicationRequest",
+    "Procedure",
+    "DiagnosticReport",
+    "DocumentReference",
+    "AllergyIntolerance",
+    "Immunization",
+    "Practitioner",
+    "PractitionerRole",
+    "Organization",
+)
+
+
+def match_resource_type(file_info: Dict[str, Any]) -> Optional[str]:
+    """
+    Resolve the critical resource type of a manifest file entry.
+    Uses the "resourceType" field when the manifest provides it, otherwise the
+    file name prefix ("PractitionerRole.000.ndjson" -> "PractitionerRole").
+    """
+    resource_type = file_info.get("resourceType") or file_info["fileName"].split(".")[0]
+    return resource_type if resource_type in CRITICAL_RESOURCE_TYPES else None
+
+
+def critical_manifest_files(manifest: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    (resource_type, file_info) of every critical file of a manifest, in
+    CRITICAL_RESOURCE_TYPES order (patients first), then manifest order.
+    """
+    files_by_type: Dict[str, List[Dict[str, Any]]] = {t: [] for t in CRITICAL_RESOURCE_TYPES}
+    for file_info in manifest.get("files", []):
+        resource_type = match_resource_type(file_info)
+        if resource_type:
+            files_by_type[resource_type].append(file_info)
+    return [(resource_type, file_info) for resource_type in CRITICAL_RESOURCE_TYPES for file_info in files_by_type[resource_type]]
+
+
+# Proxy responses worth retrying: overloaded or restarting upstream
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def build_http_client() -> httpx.AsyncClient:
+    """
+    AsyncClient for the FHIR proxy: pooled keep-alive connections (FHIR_MAX_*
+    limits), HTTP/2 when FHIR_HTTP2 is set and h2 is installed. Responses are
+    decoded transparently (Accept-Encoding gzip/deflate, zstd with zstandard).
+    """
+    http2 = settings.fhir_http2
+    if http2 and importlib.util.find_spec("h2") is None:
+        print("⚠ FHIR_HTTP2 is set but the h2 package is not installed: using HTTP/1.1")
+        http2 = False
+    return httpx.AsyncClient(
+        timeout=30.0,
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.fhir_max_connections,
+            max_keepalive_connections=settings.fhir_max_keepalive_connections,
+            keepalive_expiry=settings.fhir_keepalive_expiry,
+        ),
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """HTTP client shared by every FHIRClient, created on first use."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = build_http_client()
+    return _http_client
+
+
+async def close_http_client():
+    """Close the shared HTTP client (app shutdown), if it was created."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def retry_delay(attempt: int, response: Optional[httpx.Response] = None) -> float:
+    """Seconds to wait before retry number attempt + 1: Retry-After when given, else jittered exponential backoff."""
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    return settings.fhir_retry_backoff * 2 ** attempt * random.uniform(0.5, 1.0)
 
 
 class FHIRClient:
     """Client to interact with FHIR Proxy service."""
     
-    def __init__(self, base_url: str = None):
+    def __init__(self, base_url: str = None, client: Optional[httpx.AsyncClient] = None):
         self.base_url = base_url or settings.fhir_proxy_base_url
-        self.client = httpx.AsyncClient(timeout=30.0)
+        # The shared client outlives this FHIRClient; a client passed in is the caller's
+        self.client = client or get_http_client()
+        # Per-file download report of the last get_*_critical_files call
+        self.fetch_timings: List[Dict[str, Any]] = []
+        # Manifest files read from / fetched for the file cache (FHIR_CACHE_DIR)
+        self.cache_stats = {"hits": 0, "misses": 0}
     
-    async def close(self):
-        """Close the HTTP client."""
-        await self.client.aclose()
+    async def send(self, url: str, stream: bool = False) -> httpx.Response:
+        """
+        GET url, retrying connection errors and RETRY_STATUS_CODES responses up
+        to FHIR_RETRIES times with backoff (see retry_delay). Raises for an error
+        status. With stream the body is not read: close the response when done
+        (errors while reading it are not retried).
+        """
+        for attempt in range(settings.fhir_retries + 1):
+            response = None
+            try:
+                response = await self.client.send(self.client.build_request("GET", url), stream=stream)
+                if response.status_code not in RETRY_STATUS_CODES or attempt == settings.fhir_retries:
+                    response.raise_for_status()
+                    return response
+                await response.aclose()
+                error = f"HTTP {response.status_code}"
+            except httpx.TransportError as e:
+                if attempt == settings.fhir_retries:
+                    raise
+                error = e.__class__.__name__
+            except httpx.HTTPStatusError:
+                await response.aclose()
+                raise
+            delay = retry_delay(attempt, response)
+            print(f"⚠ GET {url} failed ({error}), retry {attempt + 1}/{settings.fhir_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
     
     async def get_manifest(self) -> Dict[str, Any]:
         """
@@ -22,71 +150,249 @@ class FHIRClient:
             "exportId": "..."
         }
         """
-        url = f"{self.base_url}/bulk/manifest"
-        response = await self.client.get(url)
-        response.raise_for_status()
+        response = await self.send(f"{self.base_url}/bulk/manifest")
         return response.json()
     
+    async def download_to_spool(self, url: str, path: str) -> int:
+        """
+        Download url into the file at path. After a connection error, a
+        truncated body or a RETRY_STATUS_CODES response, the download resumes
+        with a Range request for the missing bytes only (up to FHIR_RETRIES
+        times, see retry_delay). It restarts from zero if the server ignores
+        the range or the file changed in between (ETag / Last-Modified).
+        Bodies are requested without Content-Encoding so offsets are file offsets,
+        and written to the file from a worker thread (not on the event loop).
+        Returns the size of the downloaded file.
+        """
+        validator = None  # ETag or Last-Modified of the file being downloaded
+        size = None  # expected size, when announced
+        resumable = True  # False if the server encoded the body anyway
+        with open(path, "wb") as spool:
+            for attempt in range(settings.fhir_retries + 1):
+                if not resumable:
+                    spool.seek(0)
+                    spool.truncate()
+                offset = spool.tell()
+                headers = {"Accept-Encoding": "identity"}
+                if offset:
+                    headers["Range"] = f"bytes={offset}-"
+                    if validator:
+                        headers["If-Range"] = validator
+                try:
+                    async with self.client.stream("GET", url, headers=headers) as response:
+                        current = response.headers.get("ETag") or response.headers.get("Last-Modified")
+                        resumed = (
+                            current == validator
+                            and response.headers.get("Content-Range", "").startswith(f"bytes {offset}-")
+                        )
+                        if response.status_code in RETRY_STATUS_CODES and attempt < settings.fhir_retries:
+                            error = f"HTTP {response.status_code}"
+                        elif response.status_code == 206 and not resumed:
+                            # The file changed since the first bytes: start over
+                            spool.seek(0)
+                            spool.truncate()
+                            validator = None
+                            error = "file changed"
+                        else:
+                            response.raise_for_status()
+                            if response.status_code == 206:
+                                print(f"Resuming {url} at byte {offset}")
+                            else:
+                                # Whole file: first attempt, or range ignored / file changed
+                                spool.seek(0)
+                                spool.truncate()
+                                validator = current
+                                resumable = "Content-Encoding" not in response.headers
+                                length = response.headers.get("Content-Length")
+                                size = int(length) if length and resumable else None
+                            async for data in response.aiter_bytes():
+                                await asyncio.to_thread(spool.write, data)
+                            if size is None or spool.tell() >= size:
+                                return spool.tell()
+                            error = f"body truncated at byte {spool.tell()} of {size}"
+                        if attempt == settings.fhir_retries:
+                            raise httpx.RemoteProtocolError(f"GET {url}: {error}", request=response.request)
+                except httpx.TransportError as e:
+                    if attempt == settings.fhir_retries:
+                        raise
+                    error = e.__class__.__name__
+                    response = None
+                await asyncio.to_thread(spool.flush)
+                delay = retry_delay(attempt, response)
+                print(f"⚠ GET {url} failed ({error}), retry {attempt + 1}/{settings.fhir_retries} from byte {spool.tell()} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+    
     async def get_file_data(self, file_url: str) -> List[Dict[str, Any]]:
         """
         Fetch NDJSON file data from FHIR Proxy.
+        The file is downloaded to a spool file first (resumable, see
+        download_to_spool), then parsed through a memory map in a worker
+        thread, so the event loop keeps serving requests meanwhile.
         Args:
             file_url: Relative URL like "/bulk/files/Patient.000.ndjson"
         Returns:
             List of FHIR resource dicts (one per line of NDJSON)
         """
-        full_url = f"{self.base_url}{file_url}"
-        response = await self.client.get(full_url)
-        response.raise_for_status()
-        
-        # Parse NDJSON (newline-delimited JSON)
-        lines = response.text.strip().split('\n')
-        resources = []
-        for line in lines:
-            if line.strip():
-                import json
-                resources.append(json.loads(line))
+        path = await asyncio.to_thread(create_spool_file)
+        try:
+            await self.download_to_spool(f"{self.base_url}{file_url}", path)
+            return await asyncio.to_thread(read_ndjson_file, path)
+        finally:
+            await asyncio.to_thread(os.remove, path)
+    
+    async def get_manifest_file_data(
+        self, manifest: Dict[str, Any], file_info: Dict[str, Any]
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        get_file_data of a manifest file through the file cache: an unchanged
+        file of an export downloaded before is read from local disk, and a
+        downloaded file whose size matches the manifest is kept there. Parsing
+        and the cache's file operations run in worker threads.
+        Returns the resources and "hit" or "miss" (None without a cache key,
+        see file_cache.cache_key).
+        """
+        key = file_cache.cache_key(manifest, file_info)
+        if key is None:
+            return await self.get_file_data(file_info["url"]), None
+        path = await asyncio.to_thread(file_cache.lookup, key, file_info["size"])
+        if path:
+            self.cache_stats["hits"] += 1
+            return await asyncio.to_thread(read_ndjson_file, path), "hit"
         
-        return resources
+        self.cache_stats["misses"] += 1
+        path = await asyncio.to_thread(lambda: create_spool_file(file_cache.spool_dir()))
+        try:
+            size = await self.download_to_spool(f"{self.base_url}{file_info['url']}", path)
+            return await asyncio.to_thread(self._read_spool_file, path, key, size == int(file_info["size"])), "miss"
+        finally:
+            await asyncio.to_thread(self._remove_spool_file, path)
     
-    async def get_critical_files(self) -> Dict[str, List[Dict[str, Any]]]:
+    @staticmethod
+    def _read_spool_file(path: str, key: str, complete: bool) -> List[Dict[str, Any]]:
+        """Parse a downloaded file, then move it into the file cache if complete (worker thread)."""
+        data = read_ndjson_file(path)
+        if complete:
+            file_cache.store(path, key)
+        return data
+    
+    @staticmethod
+    def _remove_spool_file(path: str):
+        if os.path.exists(path):
+            os.remove(path)
+    
+    async def iter_file_lines(self, file_url: str) -> AsyncIterator[str]:
         """
-        Fetch all critical FHIR files for de-identification.
-        Returns dict with resource type as key and list of resources as value.
+        Stream the lines of an NDJSON file from FHIR Proxy as they arrive, so
+        the file is never held in memory as a whole.
         """
-        manifest = await self.get_manifest()
+        response = await self.send(f"{self.base_url}{file_url}", stream=True)
+        try:
+            async for line in response.aiter_lines():
+                yield line
+        finally:
+            await response.aclose()
+    
+    async def iter_file_chunks(self, file_url: str, chunk_size: int) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Stream NDJSON file data from FHIR Proxy in lists of at most chunk_size
+        resources. Lines are collected on the event loop; each chunk is parsed
+        in a worker thread.
+        """
+        lines = []
+        async for line in self.iter_file_lines(file_url):
+            if not line.strip():
+                continue
+            lines.append(line)
+            if len(lines) >= chunk_size:
+                yield await asyncio.to_thread(parse_ndjson_lines, lines)
+                lines = []
+        if lines:
+            yield await asyncio.to_thread(parse_ndjson_lines, lines)
+    
+    async def iter_manifest_chunks(
+        self, manifest: Dict[str, Any], chunk_size: int
+    ) -> AsyncIterator[Tuple[str, str, List[Dict[str, Any]]]]:
+        """
+        Stream every critical file of a manifest chunk by chunk.
+        Files are visited in critical_manifest_files order (patients first).
+        Files in the file cache are read from it, each chunk parsed in a worker
+        thread; the others are streamed from the proxy (and not cached: there
+        is no spool file to keep).
+        Yields (resource_type, file_name, resources) tuples.
+        """
+        for resource_type, file_info in critical_manifest_files(manifest):
+            file_name = file_info["fileName"]
+            key = file_cache.cache_key(manifest, file_info)
+            path = key and await asyncio.to_thread(file_cache.lookup, key, file_info["size"])
+            if path:
+                print(f"Streaming {file_name} from the file cache...")
+                self.cache_stats["hits"] += 1
+                resources = iter_ndjson_file(path)
+                try:
+                    while chunk := await asyncio.to_thread(lambda: list(islice(resources, chunk_size))):
+                        yield resource_type, file_name, chunk
+                finally:
+                    await asyncio.to_thread(resources.close)
+                continue
+            if key:
+                self.cache_stats["misses"] += 1
+            print(f"Streaming {file_name}...")
+            async for chunk in self.iter_file_chunks(file_info["url"], chunk_size):
+                yield resource_type, file_name, chunk
+    
+    async def fetch_manifest_files(
+        self, manifest: Dict[str, Any], concurrency: Optional[int] = None
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Download every critical file of a manifest concurrently.
+        At most `concurrency` (default settings.fetch_concurrency) files are in
+        flight at once over the shared AsyncClient, through the file cache (see
+        get_manifest_file_data). Per-file timings are kept in self.fetch_timings.
+        Returns dict with resource type as key and list of resources as value,
+        multi-part files (Patient.000, Patient.001, ...) merged in manifest order.
+        """
+        semaphore = asyncio.Semaphore(concurrency or settings.fetch_concurrency)
+        critical_files: Dict[str, List[Dict[str, Any]]] = {t: [] for t in CRITICAL_RESOURCE_TYPES}
         
-        # Map of file patterns to resource types
-        critical_files = {
-            "Patient": [],
-            "Encounter": [],
-            "Condition": [],
-            "Observation": [],
-            "MedicationRequest": [],
-            "Procedure": [],
-            "DiagnosticReport": [],
-            "DocumentReference": [],
-            "AllergyIntolerance": [],
-            "Immunization": [],
-            "Practitioner": [],
-            "PractitionerRole": [],
-            "Organization": [],
-        }
+        async def fetch(file_info: Dict[str, Any], resource_type: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+            async with semaphore:
+                file_name = file_info["fileName"]
+                print(f"Fetching {file_name}...")
+                file_start = time.time()
+                data, cache = await self.get_manifest_file_data(manifest, file_info)
+                elapsed = time.time() - file_start
+                source = " (file cache)" if cache == "hit" else ""
+                print(f"Fetched {file_name}{source}: {len(data)} resources in {elapsed:.2f}s")
+                timing = {
+                    "file_name": file_name,
+                    "resource_type": resource_type,
+                    "resources": len(data),
+                    "seconds": round(elapsed, 3),
+                    "cache": cache,
+                }
+                return timing, data
         
+        tasks = []
         for file_info in manifest.get("files", []):
-            file_name = file_info["fileName"]
-            file_url = file_info["url"]
-            
-            # Match file name to resource type
-            for resource_type in critical_files.keys():
-                if file_name.startswith(resource_type):
-                    print(f"Fetching {file_name}...")
-                    data = await self.get_file_data(file_url)
-                    critical_files[resource_type].extend(data)
-                    break
+            resource_type = match_resource_type(file_info)
+            if resource_type:
+                tasks.append(fetch(file_info, resource_type))
+        
+        self.fetch_timings = []
+        for timing, data in await asyncio.gather(*tasks):
+            critical_files[timing["resource_type"]].extend(data)
+            self.fetch_timings.append(timing)
         
         return critical_files
     
+    async def get_critical_files(self) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Fetch all critical FHIR files for de-identification.
+        Returns dict with resource type as key and list of resources as value.
+        """
+        manifest = await self.get_manifest()
+        return await self.fetch_manifest_files(manifest)
+    
     async def get_hospital_manifest(self) -> Dict[str, Any]:
         """
         Fetch the hospital bulk export manifest from FHIR Proxy.
@@ -96,9 +402,7 @@ class FHIRClient:
             "exportType": "hospital"
         }
         """
-        url = f"{self.base_url}/bulk/hospital/manifest"
-        response = await self.client.get(url)
-        response.raise_for_status()
+        response = await self.send(f"{self.base_url}/bulk/hospital/manifest")
         return response.json()
     
     async def get_hospital_critical_files(self) -> Dict[str, List[Dict[str, Any]]]:
@@ -107,40 +411,10 @@ class FHIRClient:
         Returns dict with resource type as key and list of resources as value.
         """
         manifest = await self.get_hospital_manifest()
-        
-        # Map of file patterns to resource types
-        critical_files = {
-            "Patient": [],
-            "Encounter": [],
-            "Condition": [],
-            "Observation": [],
-            "MedicationRequest": [],
-            "Procedure": [],
-            "DiagnosticReport": [],
-            "DocumentReference": [],
-            "AllergyIntolerance": [],
-            "Immunization": [],
-            "Practitioner": [],
-            "PractitionerRole": [],
-            "Organization": [],
-        }
-        
-        for file_info in manifest.get("files", []):
-            file_name = file_info["fileName"]
-            file_url = file_info["url"]
-            
-            # Match file name to resource type
-            for resource_type in critical_files.keys():
-                if file_name.startswith(resource_type):
-                    print(f"Fetching {file_name}...")
-                    data = await self.get_file_data(file_url)
-                    critical_files[resource_type].extend(data)
-                    break
-        
-        return critical_files
+        return await self.fetch_manifest_files(manifest)
 
 
-# Singleton factory
+# Per-ingest factory (the HTTP client underneath is shared)
 def get_fhir_client() -> FHIRClient:
     """Dependency for FastAPI routes."""
     return FHIRClient()
@@ -0,0 +1,62 @@
+import re
+from typing import Any, Callable, List
+
+# A path step is either a [bracket] selector or a dot-separated key
+_STEP = re.compile(r"\[([^\]]*)\]|([^.\[\]]+)")
+
+
+def _key_step(key: str) -> Callable[[Any], Any]:
+    def step(value):
+        return value.get(key) if isinstance(value, dict) else None
+    return step
+
+
+def _index_step(index: int) -> Callable[[Any], Any]:
+    def step(value):
+        return value[index] if isinstance(value, list) and len(value) > index else None
+    return step
+
+
+def _match_step(field: str, expected: str, fallback: int = None) -> Callable[[Any], Any]:
+    def step(value):
+        if not isinstance(value, list):
+            return None
+        for item in value:
+            if isinstance(item, dict) and item.get(field) == expected:
+                return item
+        if fallback is not None and len(value) > fallback:
+            return value[fallback]
+        return None
+    return step
+
+
+def compile_path(path: str) -> Callable[[Any], Any]:
+    """
+    Compile a FHIR element path into a getter that returns None as soon as a
+    step is missing (instead of chained .get(..., [{}])[0] calls).
+
+        "code.coding[0].code"                    keys and list indexes
+        "telecom[system=phone].value"            first list item whose field equals a value
+        "name[use=official|0].given[0]"          ... else the item at an index
+    """
+    steps: List[Callable[[Any], Any]] = []
+    for selector, key in _STEP.findall(path):
+        if key:
+            steps.append(_key_step(key))
+        elif "=" in selector:
+            condition, _, fallback = selector.partition("|")
+            field, _, expected = condition.partition("=")
+            steps.append(_match_step(field, expected, int(fallback) if fallback else None))
+        else:
+            steps.append(_index_step(int(selector)))
+
+    if len(steps) == 1:
+        return steps[0]
+
+    def get(value):
+        for step in steps:
+            value = step(value)
+            if value is None:
+                return None
+        return value
+    return get
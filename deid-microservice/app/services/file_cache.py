@@ -0,0 +1,89 @@
+import hashlib
+import os
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+
+
+def cache_key(manifest: Dict[str, Any], file_info: Dict[str, Any]) -> Optional[str]:
+    """
+    Content address of a manifest file: sha256 of the exportId, fileName,
+    size and lastModified / ETag given by the manifest, so a changed file
+    gets a new key. None when the cache is off (no FHIR_CACHE_DIR) or the
+    manifest gives no size to tell an unchanged file from a changed one.
+    """
+    if not settings.fhir_cache_dir or file_info.get("size") is None:
+        return None
+    identity = "\n".join(
+        str(part or "")
+        for part in (
+            manifest.get("exportId"),
+            file_info["fileName"],
+            file_info["size"],
+            file_info.get("lastModified"),
+            file_info.get("etag"),
+        )
+    )
+    return hashlib.sha256(identity.encode()).hexdigest()
+
+
+def cache_path(key: str) -> str:
+    return os.path.join(settings.fhir_cache_dir, f"{key}.ndjson")
+
+
+def spool_dir() -> str:
+    """Directory of the downloads bound for the cache (same filesystem, so store is a rename)."""
+    path = os.path.join(settings.fhir_cache_dir, "tmp")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def lookup(key: str, size: Any) -> Optional[str]:
+    """
+    Path of the cached file of key, None on a miss. A hit is marked as
+    recently used; a cached file of the wrong size is dropped.
+    """
+    path = cache_path(key)
+    try:
+        if os.path.getsize(path) != int(size):
+            os.remove(path)
+            return None
+        os.utime(path)
+    except OSError:
+        return None
+    return path
+
+
+def store(path: str, key: str) -> None:
+    """Move a downloaded file into the cache under key, then trim the cache (evict)."""
+    os.replace(path, cache_path(key))
+    evict()
+
+
+def evict(max_bytes: Optional[int] = None) -> int:
+    """
+    Remove the least recently used cached files until the cache holds at most
+    max_bytes (default FHIR_CACHE_MAX_BYTES). Returns the number removed.
+    """
+    if max_bytes is None:
+        max_bytes = settings.fhir_cache_max_bytes
+    entries = []
+    with os.scandir(settings.fhir_cache_dir) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.endswith(".ndjson"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        total -= size
+    if removed:
+        print(f"File cache: evicted {removed} files, {total} bytes kept")
+    return removed
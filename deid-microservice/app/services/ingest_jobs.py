@@ -0,0 +1,144 @@
+import json
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.ingest_job import IngestJob
+
+JOB_SOURCES = ("synthea", "hospital")
+
+# Owner of the jobs run by this process
+JOB_OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_job(job: IngestJob):
+    """Mark a job as run by this process, alive now (committed by the caller)."""
+    job.owner = JOB_OWNER
+    job.heartbeat_at = datetime.utcnow()
+
+
+def is_stale(job: IngestJob) -> bool:
+    """True if the job's process gave no sign of life for INGEST_JOB_STALE_SECONDS."""
+    stale_before = datetime.utcnow() - timedelta(seconds=settings.ingest_job_stale_seconds)
+    return job.heartbeat_at is None or job.heartbeat_at < stale_before
+
+
+def create_job(db: Session, source: str, params: Dict[str, Any]) -> IngestJob:
+    """Store a new queued ingest job."""
+    job = IngestJob(
+        job_id=str(uuid.uuid4()),
+        source=source,
+        status="queued",
+        params=json.dumps(params),
+        counts=json.dumps({}),
+        checkpoint=json.dumps({"offsets": {}, "completed": []}),
+    )
+    claim_job(job)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def get_job(db: Session, job_id: str) -> Optional[IngestJob]:
+    return db.query(IngestJob).filter(IngestJob.job_id == job_id).first()
+
+
+def queue_job(db: Session, job: IngestJob):
+    """Queue a job again (resume) in this process."""
+    job.status = "queued"
+    claim_job(job)
+    db.commit()
+
+
+def start_job(db: Session, job: IngestJob):
+    job.status = "running"
+    claim_job(job)
+    job.error = None
+    job.finished_at = None
+    if job.started_at is None:
+        job.started_at = datetime.utcnow()
+    db.commit()
+
+
+def save_manifest(db: Session, job: IngestJob, manifest: Dict[str, Any], params: Dict[str, Any]):
+    """Fix the manifest (and resolved params, e.g. since) a job ingests, so resumes use the same ones."""
+    job.manifest = json.dumps(manifest)
+    job.params = json.dumps(params)
+    db.commit()
+
+
+def save_progress(
+    db: Session,
+    job: IngestJob,
+    counts: Dict[str, int],
+    checkpoint: Dict[str, Any],
+    elapsed_seconds: float,
+):
+    """Checkpoint a job after a chunk has been written (also its heartbeat)."""
+    job.heartbeat_at = datetime.utcnow()
+    job.counts = json.dumps(counts)
+    job.checkpoint = json.dumps(checkpoint)
+    job.elapsed_seconds = elapsed_seconds
+    db.commit()
+
+
+def finish_job(db: Session, job: IngestJob, status: str, error: Optional[str] = None):
+    job.status = status
+    job.error = error
+    job.finished_at = datetime.utcnow()
+    db.commit()
+
+
+def mark_interrupted_jobs(db: Session) -> int:
+    """
+    Flag the jobs left queued or running by a previous process (crash,
+    restart) as interrupted; they can be resumed from their checkpoint.
+    Only the jobs of this process identity (a restart of the same container
+    or host process) and the stale ones are flagged: jobs that other replicas
+    sharing the database are running keep their status.
+    Called at startup.
+    """
+    stale_before = datetime.utcnow() - timedelta(seconds=settings.ingest_job_stale_seconds)
+    interrupted = (
+        db.query(IngestJob)
+        .filter(
+            IngestJob.status.in_(("queued", "running")),
+            or_(
+                IngestJob.owner == JOB_OWNER,
+                IngestJob.heartbeat_at.is_(None),
+                IngestJob.heartbeat_at < stale_before,
+            ),
+        )
+        .update({IngestJob.status: "interrupted"}, synchronize_session=False)
+    )
+    db.commit()
+    return interrupted
+
+
+def job_status(job: IngestJob) -> Dict[str, Any]:
+    """Status report of a job: counts, rates (rows/second) and checkpoint."""
+    counts = json.loads(job.counts or "{}")
+    checkpoint = json.loads(job.checkpoint or "{}")
+    elapsed = job.elapsed_seconds or 0.0
+    return {
+        "job_id": job.job_id,
+        "source": job.source,
+        "status": job.status,
+        "params": json.loads(job.params),
+        "counts": counts,
+        "rates": {resource_type: round(count / elapsed, 2) for resource_type, count in counts.items()} if elapsed else {},
+        "resources_per_second": round(sum(counts.values()) / elapsed, 2) if elapsed else 0.0,
+        "elapsed_seconds": round(elapsed, 3),
+        "file_offsets": checkpoint.get("offsets", {}),
+        "completed_files": checkpoint.get("completed", []),
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
@@ -0,0 +1,44 @@
+import json
+from typing import Any, Callable, Union
+
+from app.core.config import settings
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+def _orjson_dumps(obj: Any) -> str:
+    try:
+        return orjson.dumps(obj).decode()
+    except TypeError:
+        # Non-str keys, integers wider than 64 bits, ...
+        return json.dumps(obj)
+
+
+# name -> (loads, dumps)
+CODECS = {
+    "stdlib": (json.loads, json.dumps),
+    "orjson": (orjson.loads if orjson is not None else None, _orjson_dumps),
+}
+
+
+def select_codec(name: str) -> str:
+    """Resolve a JSON_CODEC setting value to an available codec name."""
+    if name == "auto":
+        return "orjson" if orjson is not None else "stdlib"
+    if name not in CODECS:
+        raise ValueError(f"Unknown JSON codec {name!r}, expected one of auto, {', '.join(CODECS)}")
+    if name == "orjson" and orjson is None:
+        raise ValueError("JSON_CODEC=orjson but orjson is not installed")
+    return name
+
+
+# loads(str | bytes) and dumps(obj) -> str of the configured codec. The orjson
+# output is compact UTF-8 (no spaces, no \uXXXX escapes); both parse back to
+# the same resource.
+codec_name = select_codec(settings.json_codec)
+loads: Callable[[Union[str, bytes]], Any]
+dumps: Callable[[Any], str]
+loads, dumps = CODECS[codec_name]
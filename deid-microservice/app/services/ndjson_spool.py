@@ -0,0 +1,45 @@
+import mmap
+import os
+import tempfile
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+from app.core.config import settings
+from app.services import json_codec
+
+
+def create_spool_file(directory: Optional[str] = None) -> str:
+    """Path of a new empty spool file in directory (default FHIR_SPOOL_DIR, else the system temp directory)."""
+    fd, path = tempfile.mkstemp(prefix="fhir-", suffix=".ndjson", dir=directory or settings.fhir_spool_dir)
+    os.close(fd)
+    return path
+
+
+def iter_ndjson_file(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Resources of an NDJSON file, parsed line by line from a read-only memory
+    map: the OS pages the file in on demand, it is never read whole.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            start = 0
+            size = len(mapped)
+            while start < size:
+                end = mapped.find(b"\n", start)
+                if end == -1:
+                    end = size
+                line = mapped[start:end]
+                if line.strip():
+                    yield json_codec.loads(line)
+                start = end + 1
+
+
+def read_ndjson_file(path: str) -> List[Dict[str, Any]]:
+    """Every resource of an NDJSON file (see iter_ndjson_file)."""
+    return list(iter_ndjson_file(path))
+
+
+def parse_ndjson_lines(lines: Iterable[Union[str, bytes]]) -> List[Dict[str, Any]]:
+    """Resources of NDJSON lines, blank lines skipped."""
+    return [json_codec.loads(line) for line in lines if line.strip()]
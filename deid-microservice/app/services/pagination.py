@@ -0,0 +1,82 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+from sqlalchemy.orm import Session
+
+from app.services.resource_registry import ResourceSpec
+
+
+def encode_cursor(last_id: int) -> str:
+    """Opaque cursor of the page following the row with primary key last_id."""
+    return base64.urlsafe_b64encode(json.dumps({"after": last_id}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """Primary key a cursor resumes after. Raises ValueError on a malformed cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded))["after"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid cursor {cursor!r}") from e
+
+
+def filter_query(
+    query,
+    spec: ResourceSpec,
+    patient_resource_id: Optional[str] = None,
+    encounter_resource_id: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+):
+    """
+    Restrict a query (ORM Query or select) on spec.model to the resources
+    referencing a patient / encounter and whose clinical date is in
+    [date_from, date_to), on the indexed reference and date columns.
+    Raises ValueError on a filter the resource type lacks.
+    """
+    model = spec.model
+    for column, value in (("patient_resource_id", patient_resource_id), ("encounter_resource_id", encounter_resource_id)):
+        if value is None:
+            continue
+        if not hasattr(model, column):
+            raise ValueError(f"{spec.resource_type} has no {column} filter")
+        query = query.filter(getattr(model, column) == value)
+    if date_from is not None or date_to is not None:
+        if spec.date_column is None:
+            raise ValueError(f"{spec.resource_type} has no date filter")
+        date_column = getattr(model, spec.date_column)
+        if date_from is not None:
+            query = query.filter(date_column >= date_from)
+        if date_to is not None:
+            query = query.filter(date_column < date_to)
+    return query
+
+
+def list_page(
+    db: Session,
+    spec: ResourceSpec,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    **filters: Any,
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    One page of a deid table in primary key order, and the cursor of the next
+    page (None on the last one).
+    With a cursor the page starts after its primary key (WHERE id > ..., an
+    index range scan at any depth); skip is the legacy OFFSET, used without one.
+    filters are those of filter_query.
+    Raises ValueError on a bad cursor or a filter the resource type lacks.
+    """
+    model = spec.model
+    query = filter_query(db.query(model), spec, **filters).order_by(model.id)
+    if cursor:
+        query = query.filter(model.id > decode_cursor(cursor))
+    elif skip:
+        query = query.offset(skip)
+    # One extra row tells whether there is a next page
+    rows = query.limit(limit + 1).all()
+    if limit > 0 and len(rows) > limit:
+        return rows[:limit], encode_cursor(rows[limit - 1].id)
+    return rows, None
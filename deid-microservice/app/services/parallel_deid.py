@@ -0,0 +1,139 @@
+import asyncio
+import multiprocessing
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Optional, Tuple
+
+from app.core.config import settings
+from app.services.deid_service import deid_service
+
+_pool: Optional[ProcessPoolExecutor] = None
+# One thread: the pinning/recording state of deid_service is per process, so
+# chunks de-identified in this process go through it one at a time
+_thread: Optional[ThreadPoolExecutor] = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """
+    Lazily start the shared de-identification process pool (settings.deid_workers
+    processes). Workers are spawned, not forked: the pool starts inside the
+    running server, and a fork would copy its threads' locks in whatever state
+    they are held.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.deid_workers, mp_context=multiprocessing.get_context("spawn"))
+        print(f"Started de-identification pool with {settings.deid_workers} workers")
+    return _pool
+
+
+def get_thread() -> ThreadPoolExecutor:
+    """Lazily start the thread de-identifying chunks in this process, off the event loop."""
+    global _thread
+    if _thread is None:
+        _thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="deid")
+    return _thread
+
+
+def shutdown_pool():
+    """Stop the de-identification process pool and thread, if they were started."""
+    global _pool, _thread
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+    if _thread is not None:
+        _thread.shutdown(wait=True, cancel_futures=True)
+        _thread = None
+
+
+def patient_key(fhir_resource: Dict[str, Any]) -> str:
+    """Patient id a resource belongs to (its own id for Patient and non-clinical resources)."""
+    for field in ("subject", "patient"):
+        reference = (fhir_resource.get(field) or {}).get("reference")
+        if reference:
+            return reference.split("/")[-1]
+    return fhir_resource.get("id") or ""
+
+
+def partition_by_patient(resources: List[Dict[str, Any]], partitions: int) -> List[List[Dict[str, Any]]]:
+    """Split resources into partitions by a hash of their patient id."""
+    parts: List[List[Dict[str, Any]]] = [[] for _ in range(partitions)]
+    for fhir_resource in resources:
+        parts[zlib.crc32(patient_key(fhir_resource).encode()) % partitions].append(fhir_resource)
+    return [part for part in parts if part]
+
+
+def deidentify_rows(
+    deidentify: Callable[[Dict[str, Any]], Dict[str, Any]],
+    resources: List[Dict[str, Any]],
+    pinned: Optional[Dict[str, str]] = None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Tuple[str, str]]]:
+    """
+    De-identify resources in the calling thread and return (row dicts,
+    pseudonym lookups made), using the given pinned pseudonyms if any.
+    """
+    with deid_service.pinning(pinned or {}), deid_service.pseudonyms.recording() as used:
+        rows = [deidentify(fhir_resource) for fhir_resource in resources]
+    return rows, used
+
+
+def _deidentify_partition(
+    deidentify: Callable[[Dict[str, Any]], Dict[str, Any]],
+    resources: List[Dict[str, Any]],
+    pinned: Optional[Dict[str, str]] = None,
+) -> Tuple[List[str], List[tuple], Dict[str, Tuple[str, str]]]:
+    """Worker side: de-identify a partition and return (columns, row tuples, pseudonym lookups made)."""
+    rows, used = deidentify_rows(deidentify, resources, pinned)
+    if not rows:
+        return [], [], used
+    columns = list(rows[0].keys())
+    return columns, [tuple(row[c] for c in columns) for row in rows], used
+
+
+async def deidentify_parallel(
+    deidentify: Callable[[Dict[str, Any]], Dict[str, Any]],
+    resources: List[Dict[str, Any]],
+    pinned: Optional[Dict[str, str]] = None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Tuple[str, str]]]:
+    """
+    De-identify resources across the worker processes and return (row dicts,
+    pseudonym lookups made).
+    Resources are partitioned by patient so that each patient is handled by one
+    worker; pseudonyms are derived from keyed hashes of the original values (see
+    DeIdentificationService), so every worker maps a value to the same pseudonym.
+    Workers send back plain row tuples, which are turned back into row dicts here
+    for the single writer. The partitions are awaited (asyncio.wrap_future), so
+    the event loop is free while the workers run.
+    pinned pseudonyms are applied in the workers (see PseudonymStore).
+    """
+    if not resources:
+        return [], {}
+    pool = get_pool()
+    partitions = partition_by_patient(resources, settings.deid_workers)
+    results = await asyncio.gather(*[
+        asyncio.wrap_future(pool.submit(_deidentify_partition, deidentify, part, pinned)) for part in partitions
+    ])
+
+    rows = []
+    used: Dict[str, Tuple[str, str]] = {}
+    for columns, tuples, partition_used in results:
+        rows.extend(dict(zip(columns, values)) for values in tuples)
+        used.update(partition_used)
+    return rows, used
+
+
+async def deidentify_chunk(
+    deidentify: Callable[[Dict[str, Any]], Dict[str, Any]],
+    resources: List[Dict[str, Any]],
+    parallel: bool = False,
+    pinned: Optional[Dict[str, str]] = None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Tuple[str, str]]]:
+    """
+    De-identify a chunk off the event loop: in the worker processes with
+    parallel=True (see deidentify_parallel), else in the de-identification
+    thread. Returns (row dicts, pseudonym lookups made).
+    """
+    if parallel:
+        return await deidentify_parallel(deidentify, resources, pinned)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_thread(), deidentify_rows, deidentify, resources, pinned)
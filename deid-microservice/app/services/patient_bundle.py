@@ -0,0 +1,51 @@
+from typing import Any, Dict, List, Sequence, Tuple
+from sqlalchemy.orm import Session
+
+from app.services.resource_registry import RESOURCE_SPECS
+
+# Bundle key -> resource type of the resources attached to a patient by $everything
+EVERYTHING_TYPES = {
+    "encounters": "Encounter",
+    "conditions": "Condition",
+    "observations": "Observation",
+    "medication_requests": "MedicationRequest",
+    "diagnostic_reports": "DiagnosticReport",
+    "document_references": "DocumentReference",
+}
+
+
+def patient_bundles(db: Session, patient_ids: Sequence[str]) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    The patients with the given resource ids and everything attached to them,
+    as {"patient": ..., "encounters": [...], ...} in request order, and the
+    ids with no stored patient.
+    One query per table whatever the number of patients (patient_resource_id
+    IN (...) on its index), grouped per patient here; each list is in
+    primary key order.
+    """
+    ids = list(dict.fromkeys(patient_ids))
+    if not ids:
+        return [], []
+    patient_model = RESOURCE_SPECS["Patient"].model
+    patients = {
+        row.resource_id: row
+        for row in db.query(patient_model).filter(patient_model.resource_id.in_(ids))
+    }
+    bundles = {
+        resource_id: {"patient": row, **{key: [] for key in EVERYTHING_TYPES}}
+        for resource_id, row in patients.items()
+    }
+    if bundles:
+        for key, resource_type in EVERYTHING_TYPES.items():
+            model = RESOURCE_SPECS[resource_type].model
+            rows = (
+                db.query(model)
+                .filter(model.patient_resource_id.in_(list(bundles)))
+                .order_by(model.id)
+            )
+            for row in rows:
+                bundles[row.patient_resource_id][key].append(row)
+    return (
+        [bundles[resource_id] for resource_id in ids if resource_id in bundles],
+        [resource_id for resource_id in ids if resource_id not in bundles],
+    )
@@ -0,0 +1,106 @@
+from faker import Faker
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import hashlib
+import hmac
+import time
+
+from app.core.config import settings
+
+
+# Pool kind -> Faker generator of its fake values
+POOL_GENERATORS: Dict[str, Callable[[Faker], str]] = {
+    "given": lambda fake: fake.first_name(),
+    "family": lambda fake: fake.last_name(),
+    "address": lambda fake: fake.street_address(),
+    "city": lambda fake: fake.city(),
+    "postal": lambda fake: fake.zipcode(),
+    "phone": lambda fake: fake.phone_number(),
+    "email": lambda fake: fake.email(),
+    "provider": lambda fake: fake.name(),
+    "location": lambda fake: f"{fake.city()} Medical Center",
+}
+
+
+class PseudonymEngine:
+    """
+    Deterministic pseudonyms from fixed pools of fake values.
+    Each pool is generated once by a Faker seeded with a fixed seed, so it is the
+    same in every process and after restarts. A pseudonym is picked from the pool
+    by HMAC-SHA256(secret, kind:original) mod pool size: O(1), no Faker call on
+    the hot path, and the same original always maps to the same pseudonym.
+    """
+
+    def __init__(self, secret: Optional[str] = None, pool_size: Optional[int] = None, seed: Optional[int] = None):
+        self._secret = (secret or settings.pseudonym_secret).encode()
+        self.pool_size = pool_size or settings.pseudonym_pool_size
+        self.seed = settings.pseudonym_pool_seed if seed is None else seed
+        self._pools: Dict[str, List[str]] = {}
+        # Pseudonyms loaded from the persistent mapping store that differ from the
+        # pools, for the chunk being de-identified again (see pinning)
+        self._pinned: Dict[str, str] = {}
+        # key hash -> (kind, pseudonym) of the lookups made inside recording()
+        self._recorded: Optional[Dict[str, Tuple[str, str]]] = None
+
+    def _pool(self, kind: str) -> List[str]:
+        pool = self._pools.get(kind)
+        if pool is None:
+            fake = Faker()
+            # Seed per pool so that adding a pool kind never changes the others
+            fake.seed_instance(f"{self.seed}:{kind}")
+            generate = POOL_GENERATORS[kind]
+            pool = [generate(fake) for _ in range(self.pool_size)]
+            self._pools[kind] = pool
+        return pool
+
+    def warm_up(self):
+        """Generate every pool up front (called at app startup)."""
+        start = time.time()
+        for kind in POOL_GENERATORS:
+            self._pool(kind)
+        print(f"✓ Pseudonym pools generated ({len(POOL_GENERATORS)} x {self.pool_size}) in {time.time() - start:.2f}s")
+
+    def key(self, kind: str, original: str) -> str:
+        """Keyed hash of an original value (hex), also the pseudonym store key."""
+        return hmac.new(self._secret, f"{kind}:{original}".encode(), hashlib.sha256).hexdigest()
+
+    def index(self, kind: str, original: str) -> int:
+        """Pool index of an original value: keyed hash, stable across processes."""
+        return int(self.key(kind, original)[:16], 16) % self.pool_size
+
+    def entry(self, kind: str, original: str) -> Tuple[str, str]:
+        """(key hash, pseudonym) of an original value, not recorded (see record)."""
+        key = self.key(kind, original)
+        value = self._pinned.get(key)
+        if value is None:
+            value = self._pool(kind)[int(key[:16], 16) % self.pool_size]
+        return key, value
+
+    def record(self, kind: str, key: str, value: str):
+        """Note a lookup for recording(), also when it was served from a cache."""
+        if self._recorded is not None:
+            self._recorded[key] = (kind, value)
+
+    def pseudonym(self, kind: str, original: str) -> str:
+        """Pseudonym of an original value for a pool kind (see POOL_GENERATORS)."""
+        key, value = self.entry(kind, original)
+        self.record(kind, key, value)
+        return value
+
+    @contextmanager
+    def pinning(self, pinned: Dict[str, str]) -> Iterator[None]:
+        """Use the given {key hash: pseudonym} instead of the pool values inside the block only."""
+        self._pinned = pinned
+        try:
+            yield
+        finally:
+            self._pinned = {}
+
+    @contextmanager
+    def recording(self) -> Iterator[Dict[str, Tuple[str, str]]]:
+        """Collect {key hash: (kind, pseudonym)} of every lookup made in the block."""
+        self._recorded = {}
+        try:
+            yield self._recorded
+        finally:
+            self._recorded = None
@@ -0,0 +1,110 @@
+from typing import List, Dict, Any, Callable, Iterable, Tuple, Union
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.pseudonym_mapping import PseudonymMapping
+from app.services import parallel_deid
+
+
+# INSERT ... ON CONFLICT constructs of the backends the store can be written on
+INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def check_backend(database_url: Union[str, URL]) -> str:
+    """Backend of a database URL the pseudonym store can be written on (checked at startup)."""
+    backend = make_url(database_url).get_backend_name()
+    if backend not in INSERTS:
+        raise ValueError(f"PSEUDONYM_STORE is not supported on {backend}")
+    return backend
+
+
+class PseudonymStore:
+    """
+    Persistent pseudonym mappings shared by every replica (pseudonym_mappings table).
+    A chunk is de-identified once while recording its pseudonym lookups; the
+    lookups are then checked against the table with one IN query per chunk
+    (read-through). Stored pseudonyms that differ from the computed ones are
+    pinned for a second de-identification of that chunk only (the caches then
+    hold the stored values, see DeIdentificationService.pinning); new mappings are
+    buffered and written in batches (write-behind), first writer wins.
+    """
+
+    def __init__(self, batch_size: int = None):
+        self.batch_size = batch_size or settings.pseudonym_store_batch_size
+        self._pending: Dict[str, Tuple[str, str]] = {}
+
+    def lookup(self, db: Session, keys: Iterable[str]) -> Dict[str, str]:
+        """Return {key_hash: pseudonym} of the given keys already stored."""
+        keys = list(keys)
+        if not keys:
+            return {}
+        result = db.execute(
+            select(PseudonymMapping.key_hash, PseudonymMapping.pseudonym).where(PseudonymMapping.key_hash.in_(keys))
+        )
+        return {key: pseudonym for key, pseudonym in result}
+
+    async def deidentify_chunk(
+        self,
+        db: AsyncSession,
+        deidentify: Callable[[Dict[str, Any]], Dict[str, Any]],
+        resources: List[Dict[str, Any]],
+        parallel: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        De-identify a chunk of resources with the stored pseudonyms (see class
+        docstring). Both passes run off the event loop (see
+        parallel_deid.deidentify_chunk); only the lookup and flush use db.
+        """
+        rows, used = await parallel_deid.deidentify_chunk(deidentify, resources, parallel)
+        stored = await db.run_sync(self.lookup, used.keys())
+
+        pinned = {key: pseudonym for key, pseudonym in stored.items() if pseudonym != used[key][1]}
+        if pinned:
+            print(f"Using {len(pinned)} stored pseudonyms that differ from the pseudonym pools")
+            rows, _ = await parallel_deid.deidentify_chunk(deidentify, resources, parallel, pinned)
+
+        for key, mapping in used.items():
+            if key not in stored:
+                self._pending[key] = mapping
+        if len(self._pending) >= self.batch_size:
+            await db.run_sync(self.flush)
+        return rows
+
+    def flush(self, db: Session) -> int:
+        """
+        Write the buffered new mappings (INSERT ... ON CONFLICT DO NOTHING).
+        They leave the buffer only once committed: on a database error they are
+        kept for the next flush and the error is raised to the ingest (a
+        pinned pseudonym cannot be derived again). Returns rows written.
+        """
+        if not self._pending:
+            return 0
+        sent = dict(self._pending)
+        rows = [
+            {"key_hash": key, "kind": kind, "pseudonym": pseudonym}
+            for key, (kind, pseudonym) in sent.items()
+        ]
+        stmt = INSERTS[db.get_bind().dialect.name](PseudonymMapping).on_conflict_do_nothing(index_elements=["key_hash"])
+        try:
+            db.execute(stmt, rows)
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            print(f"❌ Failed to store {len(rows)} pseudonym mappings, kept for the next flush")
+            raise
+        # Chunks de-identified while the INSERT was awaited may have buffered more
+        for key in sent:
+            self._pending.pop(key, None)
+        return len(rows)
+
+
+# Singleton instance
+pseudonym_store = PseudonymStore()
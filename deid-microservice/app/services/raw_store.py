@@ -0,0 +1,165 @@
+import zlib
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from sqlalchemy import Text, bindparam, cast, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.dialects.postgresql import JSONB, JSONPATH
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.raw_fhir_document import RawFhirDocument
+from app.models.raw_fhir_resource import RawFhirResource
+
+try:
+    import zstandard
+except ImportError:  # optional dependency, zlib is used instead
+    zstandard = None
+
+
+# Database backends each RAW_FHIR_STORAGE side table can be written on
+STORAGE_BACKENDS = {
+    "compressed": ("postgresql", "sqlite"),
+    "jsonb": ("postgresql",),
+}
+
+
+def check_storage(storage: str, database_url: str) -> str:
+    """Validate a RAW_FHIR_STORAGE setting value against the backend of the database URL."""
+    backend = make_url(database_url).get_backend_name()
+    if storage in STORAGE_BACKENDS and backend not in STORAGE_BACKENDS[storage]:
+        raise ValueError(f"RAW_FHIR_STORAGE={storage} is not supported on {backend}")
+    return storage
+
+
+# Fail at startup rather than at the first write of an ingestion
+check_storage(settings.raw_fhir_storage, settings.database_url)
+
+
+def compress(raw_fhir_data: str) -> Tuple[str, bytes]:
+    """Compress a source JSON string with zstd when available, else zlib. Returns (codec, data)."""
+    data = raw_fhir_data.encode()
+    level = settings.raw_fhir_compression_level
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=level).compress(data)
+    return "zlib", zlib.compress(data, level)
+
+
+def decompress(codec: str, data: bytes) -> str:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("raw_fhir_resources holds zstd data but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data).decode()
+    if codec == "zlib":
+        return zlib.decompress(data).decode()
+    raise ValueError(f"Unknown raw FHIR codec {codec!r}")
+
+
+def detach_raw_rows(resource_type: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    With RAW_FHIR_STORAGE=compressed or jsonb, take the raw_fhir_data out of
+    the row dicts (the column is left NULL) and return the side table rows
+    holding it (see write_raw_rows). Returns [] in inline mode.
+    """
+    storage = settings.raw_fhir_storage
+    if storage == "inline":
+        return []
+    raw_rows = []
+    for row in rows:
+        raw_fhir_data = row.get("raw_fhir_data")
+        row["raw_fhir_data"] = None
+        if raw_fhir_data is None:
+            continue
+        raw_row = {"resource_type": resource_type, "resource_id": row["resource_id"]}
+        if storage == "compressed":
+            raw_row["codec"], raw_row["data"] = compress(raw_fhir_data)
+        else:
+            # Sent as text and cast to jsonb by PostgreSQL (no parse/re-encode in Python)
+            raw_row["raw_fhir_data"] = raw_fhir_data
+        raw_rows.append(raw_row)
+    return raw_rows
+
+
+def _jsonb_insert():
+    """INSERT into raw_fhir_documents of rows carrying the source JSON text as raw_fhir_data."""
+    return postgresql.insert(RawFhirDocument).values(
+        resource_type=bindparam("resource_type"),
+        resource_id=bindparam("resource_id"),
+        payload=cast(bindparam("raw_fhir_data", type_=Text), JSONB),
+    )
+
+
+def write_raw_rows(db: Session, raw_rows: List[Dict[str, Any]]) -> int:
+    """
+    Insert or replace the side table rows of detach_raw_rows: raw_fhir_resources
+    (compressed) or raw_fhir_documents (jsonb). One multi-row
+    INSERT ... ON CONFLICT in the caller's transaction (not committed).
+    """
+    if not raw_rows:
+        return 0
+    dialect = db.get_bind().dialect.name
+    if "raw_fhir_data" in raw_rows[0]:
+        if dialect != "postgresql":
+            raise NotImplementedError(f"JSONB raw FHIR storage is not supported on {dialect}")
+        stmt = _jsonb_insert()
+        updated = {"payload": stmt.excluded.payload}
+    else:
+        if dialect == "postgresql":
+            stmt = postgresql.insert(RawFhirResource)
+        elif dialect == "sqlite":
+            stmt = sqlite.insert(RawFhirResource)
+        else:
+            raise NotImplementedError(f"Compressed raw FHIR storage is not supported on {dialect}")
+        updated = {"codec": stmt.excluded.codec, "data": stmt.excluded.data}
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["resource_type", "resource_id"],
+        set_={**updated, "updated_at": datetime.utcnow()},
+    )
+    db.execute(stmt, raw_rows)
+    return len(raw_rows)
+
+
+def raw_rows_writer(raw_rows: List[Dict[str, Any]]) -> Optional[Callable[[Session, List[Dict[str, Any]]], int]]:
+    """
+    before_commit hook of the chunk writers (see batch_writer.BeforeCommit)
+    storing the side table rows of the rows being committed only, in their
+    transaction: a row a writer skips leaves no orphan raw row. None without
+    raw rows (inline mode).
+    """
+    if not raw_rows:
+        return None
+    by_id = {raw_row["resource_id"]: raw_row for raw_row in raw_rows}
+
+    def write(db: Session, rows: List[Dict[str, Any]]) -> int:
+        return write_raw_rows(db, [by_id[row["resource_id"]] for row in rows if row["resource_id"] in by_id])
+
+    return write
+
+
+def query_documents(
+    db: Session,
+    resource_type: str,
+    where: Optional[str] = None,
+    select_paths: Optional[List[str]] = None,
+    skip: int = 0,
+    limit: int = 100,
+) -> List[Dict[str, Any]]:
+    """
+    Filter and project raw_fhir_documents inside PostgreSQL.
+    where is a JSON path predicate (payload @@ where, served by the GIN index),
+    each select path is evaluated with jsonb_path_query_first. Returns
+    [{"resource_id": ..., "values": {path: value}}] ordered by resource_id.
+    """
+    select_paths = select_paths or []
+    columns = [RawFhirDocument.resource_id] + [
+        func.jsonb_path_query_first(RawFhirDocument.payload, cast(path, JSONPATH)).label(f"v{i}")
+        for i, path in enumerate(select_paths)
+    ]
+    query = select(*columns).where(RawFhirDocument.resource_type == resource_type)
+    if where:
+        query = query.where(RawFhirDocument.payload.op("@@")(cast(where, JSONPATH)))
+    query = query.order_by(RawFhirDocument.resource_id).offset(skip).limit(limit)
+    return [
+        {"resource_id": row[0], "values": dict(zip(select_paths, row[1:]))}
+        for row in db.execute(query)
+    ]
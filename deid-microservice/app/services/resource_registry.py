@@ -0,0 +1,355 @@
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from app.db.base import Base
+from app.models import (
+    patient, encounter, condition, observation, medication_request, procedure, diagnostic_report,
+    document_reference, allergy_intolerance, immunization, practitioner, practitioner_role, organization
+)
+from app.services import json_codec
+from app.services.deid_service import deid_service
+from app.services.fhir_paths import compile_path
+
+NPI_SYSTEM = "http://hl7.org/fhir/sid/us-npi"
+
+
+def _parse_fhir_date(date_str: str) -> Optional[datetime]:
+    # fromisoformat (C) takes the FHIR shapes: YYYY-MM-DD, YYYY-MM-DDThh:mm:ss[.fff]
+    # with Z or +/-hh:mm (Z since Python 3.11); partial dates (YYYY, YYYY-MM) give None
+    try:
+        return datetime.fromisoformat(date_str)
+    except ValueError:
+        return None
+
+
+# The same dates recur across the resources of an export (birth dates, encounter periods)
+_parse_fhir_date_cached = lru_cache(maxsize=65536)(_parse_fhir_date)
+
+
+def parse_fhir_date(date_str: Optional[str]) -> Optional[datetime]:
+    """Parse FHIR date/datetime string (cached per string); None if empty or not a date."""
+    if not date_str or not isinstance(date_str, str):
+        return None
+    return _parse_fhir_date_cached(date_str)
+
+
+def parse_fhir_dates(values: Iterable[Optional[str]]) -> List[Optional[datetime]]:
+    """
+    parse_fhir_date of a whole column of values in one call, for batch code:
+    each distinct string is parsed once, without going through (and
+    flushing) the per-string cache of parse_fhir_date.
+    """
+    values = list(values)
+    distinct = {value for value in values if value and isinstance(value, str)}
+    parsed = {value: _parse_fhir_date(value) for value in distinct}
+    return [parsed.get(value) if isinstance(value, str) else None for value in values]
+
+
+def reference_id(reference: Optional[str]) -> str:
+    """Id of a "Type/id" reference; other references (urn:uuid:...) are kept whole."""
+    reference = reference or ""
+    return reference.split("/")[-1] if "/" in reference else reference
+
+
+def encounter_reference_id(reference: Optional[str]) -> Optional[str]:
+    """Id of an "Encounter/id" reference, None for anything else."""
+    return reference.split("/")[-1] if reference and "/" in reference else None
+
+
+# Value transforms applied to extracted fields, by name
+TRANSFORMS: Dict[str, Callable[[Any], Any]] = {
+    "reference_id": reference_id,
+    "encounter_id": encounter_reference_id,
+    "given_name": lambda value: deid_service.anonymize_name(value, "given"),
+    "family_name": lambda value: deid_service.anonymize_name(value, "family"),
+    "address": deid_service.anonymize_address,
+    "city": deid_service.anonymize_city,
+    "postal_code": deid_service.anonymize_postal_code,
+    "phone": deid_service.anonymize_phone,
+    "email": deid_service.anonymize_email,
+    "provider": deid_service.anonymize_provider_name,
+    "location": deid_service.anonymize_location,
+    "free_text": deid_service.remove_free_text_pii,
+}
+# Parsed as a FHIR date and shifted by the resource's date-shift key
+SHIFTED_DATE = "shifted_date"
+
+# (column, element path or function of the resource[, transform name])
+FieldSpec = Union[Tuple[str, Union[str, Callable]], Tuple[str, Union[str, Callable], str]]
+
+
+class ResourceSpec:
+    """
+    Declarative de-identification of one FHIR resource type: the element each
+    column is extracted from, and the transform applied to it. Paths are
+    compiled once (see compile_path), so deidentify() is one tight loop.
+    """
+
+    def __init__(
+        self,
+        resource_type: str,
+        model: Base,
+        result_field: str,
+        fields: Sequence[FieldSpec],
+        shift_key: str = "patient_resource_id",
+        date_column: Optional[str] = None,
+    ):
+        self.resource_type = resource_type
+        self.model = model
+        self.result_field = result_field  # IngestionResult counter
+        self.shift_key = shift_key  # column whose value keys the date shift
+        self.date_column = date_column  # (indexed) clinical date of the list endpoints' date filters
+        self._fields = []
+        self._date_fields = []
+        for column, source, *transform in fields:
+            extract = compile_path(source) if isinstance(source, str) else source
+            transform = transform[0] if transform else None
+            if transform == SHIFTED_DATE:
+                self._date_fields.append((column, extract))
+            else:
+                self._fields.append((column, extract, TRANSFORMS[transform] if transform else None))
+
+    def deidentify(self, fhir_resource: Dict[str, Any]) -> Dict[str, Any]:
+        """De-identify a resource into a row dict of the spec's table."""
+        row = {}
+        for column, extract, transform in self._fields:
+            value = extract(fhir_resource)
+            row[column] = transform(value) if transform else value
+        # Dates last: their shift depends on the (extracted) shift key
+        shift_key = row[self.shift_key]
+        for column, extract in self._date_fields:
+            row[column] = deid_service.shift_date(parse_fhir_date(extract(fhir_resource)), shift_key)
+        row["raw_fhir_data"] = json_codec.dumps(fhir_resource)
+        return row
+
+
+
+def _length_of_stay(fhir_resource: Dict[str, Any]) -> Optional[int]:
+    """Encounter length in days, from the original (unshifted) period."""
+    period = fhir_resource.get("period") or {}
+    start_date = parse_fhir_date(period.get("start"))
+    end_date = parse_fhir_date(period.get("end"))
+    if start_date and end_date:
+        return (end_date - start_date).days
+    return None
+
+
+def _value_string(fhir_resource: Dict[str, Any]) -> Optional[str]:
+    """Observation valueString, only when there is no valueQuantity."""
+    return None if "valueQuantity" in fhir_resource else fhir_resource.get("valueString")
+
+
+# Attachment MIME types whose base64 data is kept for downstream featurizers (NLP/ML)
+ATTACHMENT_TYPES = (
+    "text/plain",
+    "text/plain; charset=utf-8",
+    "application/octet-stream",
+    "application/pdf",
+    "text/html",
+)
+_first_attachment = compile_path("content[0].attachment")
+
+
+def _attachment_data(fhir_resource: Dict[str, Any]) -> Optional[str]:
+    """
+    Base64 data of the first attachment when its contentType is allowed,
+    limited to 200k chars (~150KB) to protect the database.
+    """
+    attachment = _first_attachment(fhir_resource) or {}
+    data = attachment.get("data")
+    if data and attachment.get("contentType") in ATTACHMENT_TYPES and len(data) <= 200000:
+        return data
+    return None
+
+
+RESOURCE_SPECS: Dict[str, ResourceSpec] = {
+    "Patient": ResourceSpec("Patient", patient.Patient, "patients_created", shift_key="resource_id", fields=[
+        ("resource_id", "id"),
+        # Official name (use="official"), else the first one
+        ("given_name", "name[use=official|0].given[0]", "given_name"),
+        ("family_name", "name[use=official|0].family", "family_name"),
+        # Identifiers (SSN, DL, Passport) are direct identifiers: not stored, even anonymized
+        ("birth_date", "birthDate", SHIFTED_DATE),
+        ("gender", "gender"),  # Not PII
+        ("address_line", "address[0].line[0]", "address"),
+        ("city", "address[0].city", "city"),
+        ("state", "address[0].state"),  # Can keep state level
+        ("postal_code", "address[0].postalCode", "postal_code"),
+        ("phone", "telecom[system=phone].value", "phone"),
+        ("email", "telecom[system=email].value", "email"),
+    ]),
+    "Encounter": ResourceSpec("Encounter", encounter.Encounter, "encounters_created", date_column="start_date", fields=[
+        ("resource_id", "id"),
+        ("patient_resource_id", "subject.reference", "reference_id"),
+        ("status", "status"),
+        ("class_code", "class.code"),
+        ("type_code", "type[0].coding[0].code"),
+        ("start_date", "period.start", SHIFTED_DATE),
+        ("end_date", "period.end", SHIFTED_DATE),
+        ("length_of_stay_days", _length_of_stay),
+        ("location_name", "location[0].location.display", "location"),
+    ]),
+    "Condition": ResourceSpec("Condition", condition.Condition, "conditions_created", date_column="onset_date", fields=[
+        ("resource_id", "id"),
+        ("patient_resource_id", "subject.reference", "reference_id"),
+        ("encounter_resource_id", "encounter.reference", "encounter_id"),
+        ("code", "code.coding[0].code"),  # Clinical code - keep
+        ("display", "code.coding[0].display"),  # Clinical term - keep
+        ("clinical_status", "clinicalStatus.coding[0].code"),
+        ("verification_status", "verificationStatus.coding[0].code"),
+        ("category", "category[0].coding[0].code"),
+        ("onset_date", "onsetDateTime", SHIFTED_DATE),
+        ("recorded_date", "recordedDate", SHIFTED_DATE),
+    ]),
+    "Observation": ResourceSpec("Observation", observation.Observation, "observations_created", date_column="effective_date", fields=[
+        ("resource_id", "id"),
+        ("patient_resource_id", "subject.reference", "reference_id"),
+        ("encounter_resource_id", "encounter.reference", "encounter_id"),
+        ("status", "status"),
+        ("category", "category[0].coding[0].code"),
+        ("code", "code.coding[0].code"),
+        ("display", "code.coding[0].display"),
+        # Value can be quantity, string, boolean, etc.
+        ("value_quantity", "valueQuantity.value"),
+        ("value_unit", "valueQuantity.unit"),
+        ("value_string", _value_string),
+        ("effective_date", "effectiveDateTime", SHIFTED_DATE),
+        ("issued_date", "issued", SHIFTED_DATE),
+    ]),
+    "MedicationRequest": ResourceSpec("MedicationRequest", medication_request.MedicationRequest, "medication_requests_created", date_column="authored_on", fields=[
+        ("resource_id", "id"),
+        ("patient_resource_id", "subject.reference", "reference_id"),
+        ("encounter_resource_id", "encounter.reference", "encounter_id"),
+        ("status", "status"),
+        ("intent", "intent"),
+        ("medication_code", "medicationCodeableConcept.coding[0].code"),
+        ("medication_display", "medicationCodeableConcept.coding[0].display"),
+        ("dosage_text", "dosageInstruction[0].text"),
+        ("requester_display", "requester.display", "provider"),
+        ("authored_on", "authoredOn", SHIFTED_DATE),
+    ]),
+    "Procedure": ResourceSpec("Procedure", procedure.Procedure, "procedures_created", date_column="performed_date", fields=[
+        ("resource_id", "id"),
+        ("patient_resource_id", "subject.reference", "reference_id"),
+        ("encounter_resource_id", "encounter.reference", "encounter_id"),
+        ("status", "status"),
+        ("code", "code.coding[0].code"),
+        ("display", "code.coding[0].display"),
+        ("category", "category.coding[0].code"),
+        # Performer info is in Procedure (not always present)
+        ("performer_display", "performer[0].actor.display", "provider"),
+        # performedPeriod has start/end, not performedDateTime in sample
+        ("performed_date", "performedPeriod.start", SHIFTED_DATE),
+    ]),
+    "DiagnosticReport": ResourceSpec("DiagnosticReport", diagnostic_report.DiagnosticReport, "diagnostic_reports_created", date_column="effective_date", fields=[
+        ("resource_id", "id"),
+        ("patient_resource_id", "subject.reference", "reference_id"),
+        ("encounter_resource_id", "encounter.reference", "encounter_id"),
+        ("status", "status"),
+        ("category", "category[0].coding[0].code"),
+        ("code", "code.coding[0].code"),
+        ("display", "code.coding[0].display"),
+        # Conclusion text contains free text with PII; presentedForm (base64 notes) is not stored
+        ("conclusion", "conclusion", "free_text"),
+        ("effective_date", "effectiveDateTime", SHIFTED_DATE),
+        ("issued_date", "issued", SHIFTED_DATE),
+    ]),
+    "DocumentReference": ResourceSpec("DocumentReference", document_reference.DocumentReference, "document_references_created", date_column="created_date", fields=[
+        ("resource_id", "id"),
+        ("patient_resource_id", "subject.reference", "reference_id"),
+        ("encounter_resource_id", "context.encounter[0].reference", "encounter_id"),
+        ("status", "status"),
+        ("doc_status", "docStatus"),
+        ("type_code", "type.coding[0].code"),  # LOINC
+        ("type_display", "type.coding[0].display"),
+        ("category_code", "category[0].coding[0].code"),
+        ("description", "description", "free_text"),  # May contain PII
+        ("author_display", "author[0].display", "provider"),
+        ("custodian_display", "custodian.display", "location"),
+        ("created_date", "date", SHIFTED_DATE),
+        ("attachment_data", _attachment_data),
+    ]),
+    "AllergyIntolerance": ResourceSpec("AllergyIntolerance", allergy_intolerance.AllergyIntolerance, "allergy_intolerances_created", date_column="recorded_date", fields=[
+        ("resource_id", "id"),
+        ("patient_resource_id", "patient.reference", "reference_id"),
+        ("encounter_resource_id", "encounter.reference", "encounter_id"),
+        ("clinical_status", "clinicalStatus.coding[0].code"),
+        ("verification_status", "verificationStatus.coding[0].code"),
+        ("type", "type"),
+        ("category", "category[0]"),  # Category is an array of strings
+        ("criticality", "criticality"),
+        ("code", "code.coding[0].code"),  # Allergen code (SNOMED - keep)
+        ("display", "code.coding[0].display"),
+        ("recorder_display", "recorder.display", "provider"),
+        ("onset_date", "onsetDateTime", SHIFTED_DATE),
+        ("recorded_date", "recordedDate", SHIFTED_DATE),
+    ]),
+    "Immunization": ResourceSpec("Immunization", immunization.Immunization, "immunizations_created", date_column="occurrence_date", fields=[
+        ("resource_id", "id"),
+        ("patient_resource_id", "patient.reference", "reference_id"),
+        ("encounter_resource_id", "encounter.reference", "encounter_id"),
+        ("status", "status"),
+        ("status_reason_code", "statusReason.coding[0].code"),
+        ("vaccine_code", "vaccineCode.coding[0].code"),  # CVX - keep
+        ("vaccine_display", "vaccineCode.coding[0].display"),
+        ("primary_source", "primarySource"),
+        ("performer_display", "performer[0].actor.display", "provider"),
+        ("location_display", "location.display", "location"),
+        ("lot_number", "lotNumber"),
+        ("occurrence_date", "occurrenceDateTime", SHIFTED_DATE),
+        ("recorded_date", "recorded", SHIFTED_DATE),
+    ]),
+    "Practitioner": ResourceSpec("Practitioner", practitioner.Practitioner, "practitioners_created", shift_key="resource_id", fields=[
+        ("resource_id", "id"),
+        ("given_name", "name[0].given[0]", "given_name"),
+        ("family_name", "name[0].family", "family_name"),
+        ("prefix", "name[0].prefix[0]"),  # Keep prefix (Dr., etc.)
+        ("gender", "gender"),
+        ("birth_date", "birthDate", SHIFTED_DATE),
+        ("npi", f"identifier[system={NPI_SYSTEM}].value"),  # Keep NPI for professional linking
+        ("phone", "telecom[system=phone].value", "phone"),
+        ("email", "telecom[system=email].value", "email"),
+        ("address_line", "address[0].line[0]", "address"),
+        ("city", "address[0].city", "city"),
+        ("state", "address[0].state"),
+        ("postal_code", "address[0].postalCode", "postal_code"),
+        ("active", "active"),
+    ]),
+    "PractitionerRole": ResourceSpec("PractitionerRole", practitioner_role.PractitionerRole, "practitioner_roles_created", shift_key="resource_id", fields=[
+        ("resource_id", "id"),
+        ("practitioner_resource_id", "practitioner.identifier.value"),  # NPI stored as reference
+        ("organization_resource_id", "organization.identifier.value"),
+        ("active", "active"),
+        ("role_code", "code[0].coding[0].code"),  # NUCC - keep
+        ("role_display", "code[0].coding[0].display"),
+        ("specialty_code", "specialty[0].coding[0].code"),
+        ("specialty_display", "specialty[0].coding[0].display"),
+        ("location_resource_id", "location[0].identifier.value"),
+        ("phone", "telecom[system=phone].value", "phone"),
+        ("email", "telecom[system=email].value", "email"),
+    ]),
+    "Organization": ResourceSpec("Organization", organization.Organization, "organizations_created", shift_key="resource_id", fields=[
+        ("resource_id", "id"),
+        ("name", "name", "location"),
+        ("active", "active"),
+        ("type_code", "type[0].coding[0].code"),
+        ("type_display", "type[0].coding[0].display"),
+        ("npi", f"identifier[system={NPI_SYSTEM}].value"),  # Keep for linking
+        ("phone", "telecom[system=phone].value", "phone"),
+        ("email", "telecom[system=email].value", "email"),
+        ("address_line", "address[0].line[0]", "address"),
+        ("city", "address[0].city", "city"),
+        ("state", "address[0].state"),  # Keep state
+        ("postal_code", "address[0].postalCode", "postal_code"),
+    ]),
+}
+
+
+def deidentify_resource(resource_type: str, fhir_resource: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    De-identify a resource with its registered spec. Module-level so that
+    functools.partial(deidentify_resource, resource_type) can be sent to the
+    de-identification worker processes.
+    """
+    return RESOURCE_SPECS[resource_type].deidentify(fhir_resource)
@@ -0,0 +1,108 @@
+import hashlib
+import json
+from typing import List, Dict, Any, Type, Iterable
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.db.base import Base
+from app.services.batch_writer import BeforeCommit
+
+
+def content_hash(fhir_resource: Dict[str, Any]) -> str:
+    """SHA-256 of the canonical JSON of a FHIR resource, stored in the content_hash column."""
+    canonical = json.dumps(fhir_resource, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def stored_content_hashes(db: Session, model: Type[Base], resource_ids: Iterable[str]) -> Dict[str, str]:
+    """Return {resource_id: content_hash} for the resource_ids already stored (one indexed IN query)."""
+    resource_ids = list(resource_ids)
+    if not resource_ids:
+        return {}
+    result = db.execute(
+        select(model.resource_id, model.content_hash).where(model.resource_id.in_(resource_ids))
+    )
+    return {resource_id: stored_hash for resource_id, stored_hash in result}
+
+
+def filter_changed_resources(
+    db: Session, model: Type[Base], resources: List[Dict[str, Any]], hashes: Dict[str, str]
+) -> List[Dict[str, Any]]:
+    """
+    Upsert counterpart of filter_new_resources: keep the FHIR resources of a chunk
+    that are new or whose content hash differs from the stored one.
+    Ids repeated inside the chunk are kept once.
+    """
+    stored = stored_content_hashes(db, model, hashes.keys())
+    seen = set()
+    changed = []
+    for fhir_resource in resources:
+        resource_id = fhir_resource.get("id")
+        if resource_id in seen:
+            continue
+        seen.add(resource_id)
+        if resource_id in stored and stored[resource_id] == hashes[resource_id]:
+            continue
+        changed.append(fhir_resource)
+    return changed
+
+
+def _upsert_statement(db: Session, model: Type[Base]):
+    """INSERT ... ON CONFLICT (resource_id) DO UPDATE, only where the content hash changed."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = postgresql.insert(model)
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(model)
+    else:
+        raise NotImplementedError(f"Upsert is not supported on {dialect}")
+
+    table = model.__table__
+    updated_columns = {
+        c.name: stmt.excluded[c.name]
+        for c in table.columns
+        if c.name not in ("id", "resource_id", "created_at")
+    }
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.resource_id],
+        set_=updated_columns,
+        where=table.c.content_hash.is_distinct_from(stmt.excluded.content_hash),
+    )
+
+
+def upsert_rows(db: Session, model: Type[Base], rows: List[Dict[str, Any]], before_commit: BeforeCommit = None) -> int:
+    """
+    Insert new rows and refresh changed ones in a single multi-row
+    INSERT ... ON CONFLICT (resource_id) DO UPDATE and one commit. Rows whose
+    content_hash is unchanged are left untouched. A failing chunk is retried
+    row by row, like write_batch (and before_commit is called the same way).
+    Returns the number of rows written.
+    """
+    if not rows:
+        return 0
+
+    stmt = _upsert_statement(db, model)
+    try:
+        db.execute(stmt, rows)
+        if before_commit:
+            before_commit(db, rows)
+        db.commit()
+        return len(rows)
+    except SQLAlchemyError as e:
+        db.rollback()
+        print(f"Upsert of {len(rows)} rows into {model.__tablename__} failed, retrying row by row: {e.__class__.__name__}")
+
+    written = 0
+    for row in rows:
+        try:
+            db.execute(stmt, [row])
+            if before_commit:
+                before_commit(db, [row])
+            db.commit()
+            written += 1
+        except SQLAlchemyError as e:
+            db.rollback()
+            print(f"Skipping {model.__tablename__} resource {row.get('resource_id')}: {e.__class__.__name__}")
+    return written
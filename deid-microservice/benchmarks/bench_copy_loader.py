@@ -0,0 +1,98 @@
+"""
+Benchmark: rows/sec of the deid write paths on the observations table.
+
+Compares
+  - orm:   db.add + commit + refresh per row (the ResourceSpec.process path)
+  - batch: one multi-row INSERT + one commit per chunk (write_batch)
+  - copy:  COPY ... FROM STDIN per chunk (copy_rows)
+
+Requires a PostgreSQL DATABASE_URL. Benchmark rows use a "bench-" resource_id
+prefix and are deleted afterwards.
+
+Usage (from the deid-microservice directory):
+    python -m benchmarks.bench_copy_loader --rows 20000 --chunk-size 500
+"""
+import argparse
+import time
+
+from app.db.base import Base
+from app.db.session import SessionLocal, engine
+from app.models.observation import Observation
+from app.services.resource_registry import RESOURCE_SPECS
+from app.services.batch_writer import write_batch
+from app.services.copy_loader import copy_rows
+
+
+def make_observation(i: int, prefix: str) -> dict:
+    return {
+        "resourceType": "Observation",
+        "id": f"{prefix}-{i}",
+        "status": "final",
+        "subject": {"reference": f"Patient/bench-patient-{i % 1000}"},
+        "encounter": {"reference": f"Encounter/bench-encounter-{i % 5000}"},
+        "category": [{"coding": [{"code": "vital-signs"}]}],
+        "code": {"coding": [{"code": "8867-4", "display": "Heart rate"}]},
+        "valueQuantity": {"value": 60 + i % 40, "unit": "/min"},
+        "effectiveDateTime": "2020-01-02T10:00:00+00:00",
+        "issued": "2020-01-02T10:00:00.000Z",
+    }
+
+
+def make_rows(n: int, prefix: str) -> list:
+    return [RESOURCE_SPECS["Observation"].deidentify(make_observation(i, prefix)) for i in range(n)]
+
+
+def bench_orm(db, rows, chunk_size):
+    for row in rows:
+        db_observation = Observation(**row)
+        db.add(db_observation)
+        db.commit()
+        db.refresh(db_observation)
+
+
+def bench_batch(db, rows, chunk_size):
+    for i in range(0, len(rows), chunk_size):
+        write_batch(db, Observation, rows[i:i + chunk_size])
+
+
+def bench_copy(db, rows, chunk_size):
+    for i in range(0, len(rows), chunk_size):
+        copy_rows(db, Observation, rows[i:i + chunk_size])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--orm-rows", type=int, default=2000, help="rows for the (slow) per-row ORM path")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    args = parser.parse_args()
+
+    if engine.dialect.name != "postgresql":
+        raise SystemExit("COPY benchmark requires a PostgreSQL DATABASE_URL")
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    results = {}
+    try:
+        for name, fn, n in [
+            ("orm", bench_orm, args.orm_rows),
+            ("batch", bench_batch, args.rows),
+            ("copy", bench_copy, args.rows),
+        ]:
+            prefix = f"bench-{name}"
+            rows = make_rows(n, prefix)
+            start = time.perf_counter()
+            fn(db, rows, args.chunk_size)
+            elapsed = time.perf_counter() - start
+            results[name] = n / elapsed
+            print(f"{name:>5}: {n} rows in {elapsed:.2f}s -> {results[name]:,.0f} rows/sec")
+            db.query(Observation).filter(Observation.resource_id.like(f"{prefix}-%")).delete(synchronize_session=False)
+            db.commit()
+    finally:
+        db.close()
+
+    print(f"copy vs orm: {results['copy'] / results['orm']:.1f}x, copy vs batch: {results['copy'] / results['batch']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
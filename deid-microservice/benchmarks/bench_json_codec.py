@@ -0,0 +1,85 @@
+"""
+Benchmark: per-resource cost of the JSON paths of the deid pipeline.
+
+Compares the stdlib json module with orjson on
+  - parse:     one NDJSON line -> resource dict (fhir_client)
+  - serialize: resource dict -> raw_fhir_data string (resource_registry)
+for a typical Observation and a DocumentReference carrying a base64 note.
+
+No database or FHIR proxy needed.
+
+Usage (from the deid-microservice directory):
+    python -m benchmarks.bench_json_codec --resources 20000
+"""
+import argparse
+import base64
+import time
+
+from app.core.config import settings
+from app.services import json_codec
+
+
+def make_observation(i: int) -> dict:
+    return {
+        "resourceType": "Observation",
+        "id": f"bench-observation-{i}",
+        "meta": {"lastUpdated": "2020-01-02T10:00:00.000+00:00"},
+        "status": "final",
+        "subject": {"reference": f"Patient/bench-patient-{i % 1000}"},
+        "encounter": {"reference": f"Encounter/bench-encounter-{i % 5000}"},
+        "category": [{"coding": [{"system": "http://terminology.hl7.org/CodeSystem/observation-category", "code": "vital-signs"}]}],
+        "code": {"coding": [{"system": "http://loinc.org", "code": "8867-4", "display": "Heart rate"}], "text": "Heart rate"},
+        "valueQuantity": {"value": 60 + i % 40, "unit": "/min", "system": "http://unitsofmeasure.org", "code": "/min"},
+        "effectiveDateTime": "2020-01-02T10:00:00+00:00",
+        "issued": "2020-01-02T10:00:00.000+00:00",
+    }
+
+
+def make_document_reference(i: int) -> dict:
+    note = f"Patient seen for follow-up visit {i}. Vitals stable, continue current plan. " * 40
+    return {
+        "resourceType": "DocumentReference",
+        "id": f"bench-document-{i}",
+        "status": "current",
+        "subject": {"reference": f"Patient/bench-patient-{i % 1000}"},
+        "type": {"coding": [{"system": "http://loinc.org", "code": "34117-2", "display": "History and physical note"}]},
+        "date": "2020-01-02T10:00:00.000+00:00",
+        "content": [{"attachment": {"contentType": "text/plain; charset=utf-8", "data": base64.b64encode(note.encode()).decode()}}],
+    }
+
+
+def time_per_resource(fn, items) -> float:
+    """Microseconds per item of fn over items."""
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - start) / len(items) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--resources", type=int, default=20000)
+    args = parser.parse_args()
+
+    codecs = [name for name in json_codec.CODECS if name == "stdlib" or json_codec.orjson is not None]
+    if len(codecs) == 1:
+        print("orjson is not installed: only the stdlib codec is measured")
+
+    for label, make in [("Observation", make_observation), ("DocumentReference", make_document_reference)]:
+        resources = [make(i) for i in range(args.resources)]
+        lines = [json_codec.CODECS["stdlib"][1](resource).encode() for resource in resources]
+        print(f"{label} ({sum(map(len, lines)) // len(lines)} bytes/resource):")
+        results = {}
+        for name in codecs:
+            loads, dumps = json_codec.CODECS[name]
+            results[name] = (time_per_resource(loads, lines), time_per_resource(dumps, resources))
+            print(f"  {name:>6}: parse {results[name][0]:6.2f} us, serialize {results[name][1]:6.2f} us")
+        if "orjson" in results:
+            parse_gain = results["stdlib"][0] / results["orjson"][0]
+            serialize_gain = results["stdlib"][1] / results["orjson"][1]
+            print(f"  orjson vs stdlib: parse {parse_gain:.1f}x, serialize {serialize_gain:.1f}x")
+    print(f"Active codec (JSON_CODEC={settings.json_codec}): {json_codec.codec_name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Database Migration Script - deid tables
+New tables are created automatically on app startup (Base.metadata.create_all),
+but columns added to existing tables are not. Run this once against an existing
+database to add them.
+"""
+
+from sqlalchemy import text
+
+from app.db.session import engine
+
+DEID_TABLES = [
+    "patients",
+    "encounters",
+    "conditions",
+    "observations",
+    "medication_requests",
+    "procedures",
+    "diagnostic_reports",
+    "document_references",
+    "allergy_intolerances",
+    "immunizations",
+    "practitioners",
+    "practitioner_roles",
+    "organizations",
+]
+
+
+def run_migration():
+    statements = []
+    for table in DEID_TABLES:
+        # content_hash: used by upsert re-ingestion (POST /deid/ingest?upsert=true)
+        statements.append(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)")
+    # owner / heartbeat_at: ingest jobs of other replicas are not flagged interrupted at startup
+    statements.append("ALTER TABLE ingest_jobs ADD COLUMN IF NOT EXISTS owner VARCHAR(255)")
+    statements.append("ALTER TABLE ingest_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP")
+
+    with engine.begin() as conn:
+        for statement in statements:
+            conn.execute(text(statement))
+    print(f"✅ Migration completed: {len(statements)} statements applied")
+
+
+if __name__ == "__main__":
+    try:
+        run_migration()
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        raise
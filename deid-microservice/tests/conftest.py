@@ -0,0 +1,89 @@
+"""
+Shared fixtures of the deid service tests.
+Settings are read when the app modules are first imported, so the environment
+points them at a throwaway SQLite database before any app import.
+"""
+import os
+import tempfile
+
+_data_dir = tempfile.mkdtemp(prefix="deid-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_data_dir}/deid.db"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["PSEUDONYM_SECRET"] = "test-pseudonym-secret"
+os.environ["PSEUDONYM_POOL_SIZE"] = "256"
+os.environ["PSEUDONYM_STORE"] = "false"
+os.environ["RAW_FHIR_STORAGE"] = "inline"
+os.environ["DEID_WORKERS"] = "2"
+os.environ.pop("FHIR_CACHE_DIR", None)
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.db.base import Base
+from app.db.session import SessionLocal, engine
+
+
+@pytest.fixture(scope="session", autouse=True)
+def tables():
+    Base.metadata.create_all(bind=engine)
+    yield
+    engine.dispose()
+
+
+@pytest.fixture
+def db():
+    """Session on the test database; every table is emptied after the test."""
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        with engine.begin() as connection:
+            for table in reversed(Base.metadata.sorted_tables):
+                connection.execute(table.delete())
+
+
+@pytest.fixture
+def client(db):
+    """Client of the app without its lifespan (no Eureka registration)."""
+    return TestClient(app)
+
+
+@pytest.fixture
+def make_patient():
+    """Builder of FHIR Patient resources carrying every de-identified element."""
+    def build(index: int, **overrides):
+        patient = {
+            "resourceType": "Patient",
+            "id": f"patient-{index}",
+            "name": [{"use": "official", "given": [f"Given{index % 7}"], "family": f"Family{index % 5}"}],
+            "birthDate": f"19{50 + index % 40}-0{1 + index % 9}-1{index % 10}",
+            "gender": "female" if index % 2 else "male",
+            "address": [{"line": [f"{index} Main Street"], "city": f"City{index % 3}", "state": "MA", "postalCode": f"0{index:04d}"}],
+            "telecom": [
+                {"system": "phone", "value": f"555-01{index:02d}"},
+                {"system": "email", "value": f"person{index}@example.com"},
+            ],
+        }
+        patient.update(overrides)
+        return patient
+    return build
+
+
+@pytest.fixture
+def make_observation():
+    """Builder of FHIR Observation resources of a patient."""
+    def build(index: int, patient_id: str, **overrides):
+        observation = {
+            "resourceType": "Observation",
+            "id": f"observation-{index}",
+            "status": "final",
+            "subject": {"reference": f"Patient/{patient_id}"},
+            "code": {"coding": [{"code": "8867-4", "display": "Heart rate"}]},
+            "valueQuantity": {"value": 60 + index % 40, "unit": "/min"},
+            "effectiveDateTime": f"2020-0{1 + index % 9}-1{index % 10}T08:30:00Z",
+        }
+        observation.update(overrides)
+        return observation
+    return build
@@ -0,0 +1,58 @@
+from functools import partial
+
+from sqlalchemy import func, select
+
+from app.models.patient import Patient
+from app.services.batch_writer import filter_new_resources, write_batch, write_rows
+from app.services.parallel_deid import deidentify_rows
+from app.services.resource_registry import deidentify_resource
+
+
+def patient_rows(make_patient, indexes):
+    rows, _ = deidentify_rows(partial(deidentify_resource, "Patient"), [make_patient(i) for i in indexes])
+    return rows
+
+
+def stored_ids(db):
+    return set(db.execute(select(Patient.resource_id)).scalars())
+
+
+def test_write_batch_inserts_chunk(db, make_patient):
+    assert write_batch(db, Patient, patient_rows(make_patient, range(10))) == 10
+    assert stored_ids(db) == {f"patient-{i}" for i in range(10)}
+
+
+def test_write_batch_skips_only_bad_rows(db, make_patient):
+    write_batch(db, Patient, patient_rows(make_patient, [3]))
+    rows = patient_rows(make_patient, range(6))
+    rows[1]["resource_id"] = None  # NOT NULL violation
+
+    committed = []
+    inserted = write_batch(db, Patient, rows, lambda db, rows: committed.extend(row["resource_id"] for row in rows))
+
+    # patient-3 is already stored and patient-1 has no resource_id
+    assert inserted == 4
+    assert stored_ids(db) == {"patient-0", "patient-2", "patient-3", "patient-4", "patient-5"}
+    assert committed == ["patient-0", "patient-2", "patient-4", "patient-5"]
+
+
+def test_write_batch_matches_write_rows(db, make_patient):
+    rows = patient_rows(make_patient, range(5))
+    write_rows(db, Patient, rows)
+    expected = db.execute(select(Patient.resource_id, Patient.given_name, Patient.birth_date).order_by(Patient.resource_id)).all()
+    db.execute(Patient.__table__.delete())
+    db.commit()
+
+    write_batch(db, Patient, rows)
+
+    assert db.execute(select(Patient.resource_id, Patient.given_name, Patient.birth_date).order_by(Patient.resource_id)).all() == expected
+
+
+def test_filter_new_resources_drops_stored_and_repeated_ids(db, make_patient):
+    write_batch(db, Patient, patient_rows(make_patient, [0, 1]))
+    resources = [make_patient(i) for i in [0, 2, 1, 3, 2]]
+
+    new_resources = filter_new_resources(db, Patient, resources)
+
+    assert [r["id"] for r in new_resources] == ["patient-2", "patient-3"]
+    assert db.scalar(select(func.count()).select_from(Patient)) == 2
@@ -0,0 +1,49 @@
+from datetime import date, datetime, timedelta, timezone
+from functools import partial
+
+from sqlalchemy import select
+
+from app.models.patient import Patient
+from app.services.batch_writer import write_batch
+from app.services.copy_loader import _CopyStream, _format_date, _format_value, load_rows
+from app.services.parallel_deid import deidentify_rows
+from app.services.resource_registry import deidentify_resource
+
+
+def test_format_value_escapes_copy_text():
+    assert _format_value(None) == "\\N"
+    assert _format_value(True) == "t"
+    assert _format_value(False) == "f"
+    assert _format_value(42) == "42"
+    assert _format_value("a\\b\tc\nd\re") == "a\\\\b\\tc\\nd\\re"
+
+
+def test_format_value_stores_aware_datetimes_as_naive_utc():
+    paris = timezone(timedelta(hours=2))
+
+    assert _format_value(datetime(2024, 5, 1, 10, 30, tzinfo=paris)) == "2024-05-01 08:30:00"
+    assert _format_value(datetime(2024, 5, 1, 10, 30)) == "2024-05-01 10:30:00"
+    assert _format_date(datetime(2024, 5, 1, 10, 30)) == "2024-05-01"
+    assert _format_date(date(2024, 5, 1)) == "2024-05-01"
+
+
+def test_copy_stream_reads_lines_in_any_size():
+    lines = [f"row-{i}\tvalue\n" for i in range(50)]
+    stream = _CopyStream(iter(lines))
+
+    chunks = []
+    while chunk := stream.read(7):
+        chunks.append(chunk)
+
+    assert "".join(chunks) == "".join(lines)
+    assert stream.readline() == ""
+
+
+def test_load_rows_falls_back_to_insert_outside_postgresql(db, make_patient):
+    rows, _ = deidentify_rows(partial(deidentify_resource, "Patient"), [make_patient(i) for i in range(8)])
+    write_batch(db, Patient, rows[:2])
+
+    # The two stored resource_ids fail the multi-row INSERT, the rest are kept
+    assert load_rows(db, Patient, rows) == 6
+    assert set(db.execute(select(Patient.resource_id)).scalars()) == {f"patient-{i}" for i in range(8)}
+    assert load_rows(db, Patient, []) == 0
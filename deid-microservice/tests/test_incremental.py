@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta, timezone
+
+from app.services.incremental import parse_timestamp, plan_incremental, record_ingestion, updated_since
+
+
+def manifest_of(*files, transaction_time="2024-03-01T12:00:00Z"):
+    return {
+        "exportId": "export-1",
+        "transactionTime": transaction_time,
+        "files": [
+            {"fileName": file_name, "size": size, "lastModified": last_modified}
+            for file_name, size, last_modified in files
+        ],
+    }
+
+
+def file_names(manifest):
+    return [file_info["fileName"] for file_info in manifest["files"]]
+
+
+def test_first_run_keeps_every_file(db):
+    manifest = manifest_of(("Patient.000.ndjson", 100, "2024-03-01T11:00:00Z"))
+
+    planned, since = plan_incremental(db, manifest)
+
+    assert file_names(planned) == ["Patient.000.ndjson"]
+    assert since is None
+
+
+def test_unchanged_file_is_skipped(db):
+    record_ingestion(db, manifest_of(
+        ("Patient.000.ndjson", 100, "2024-03-01T11:00:00Z"),
+        ("Observation.000.ndjson", 500, "2024-03-01T11:00:00Z"),
+    ), datetime(2024, 3, 1, 12, 30))
+
+    planned, since = plan_incremental(db, manifest_of(
+        ("Patient.000.ndjson", 100, "2024-03-01T11:00:00Z"),
+        ("Observation.000.ndjson", 620, "2024-03-02T11:00:00Z"),
+        ("Observation.001.ndjson", 80, "2024-03-02T11:00:00Z"),
+    ))
+
+    assert file_names(planned) == ["Observation.000.ndjson", "Observation.001.ndjson"]
+    assert since == datetime(2024, 3, 1, 12, 0)
+
+
+def test_file_without_size_is_never_skipped(db):
+    manifest = {"exportId": "export-1", "files": [{"fileName": "Patient.000.ndjson"}]}
+    record_ingestion(db, manifest, datetime(2024, 3, 1, 12, 30))
+
+    planned, since = plan_incremental(db, manifest)
+
+    assert file_names(planned) == ["Patient.000.ndjson"]
+    # No transactionTime: the high-water mark is the start time of the run
+    assert since == datetime(2024, 3, 1, 12, 30)
+
+
+def test_given_since_overrides_the_high_water_mark(db):
+    manifest = manifest_of(("Patient.000.ndjson", 100, "2024-03-01T11:00:00Z"))
+    record_ingestion(db, manifest, datetime(2024, 3, 1, 12, 30))
+
+    _, since = plan_incremental(db, manifest, datetime(2023, 1, 1))
+
+    assert since == datetime(2023, 1, 1)
+
+
+def test_updated_since_keeps_newer_and_undated_resources():
+    resources = [
+        {"id": "old", "meta": {"lastUpdated": "2024-02-01T00:00:00Z"}},
+        {"id": "new", "meta": {"lastUpdated": "2024-03-01T14:00:00+01:00"}},
+        {"id": "undated"},
+    ]
+    since = datetime(2024, 3, 1, 11, 0, tzinfo=timezone(timedelta(hours=-1)))
+
+    assert [r["id"] for r in updated_since(resources, since)] == ["new", "undated"]
+
+
+def test_parse_timestamp_returns_naive_utc():
+    assert parse_timestamp("2024-03-01T12:00:00+02:00") == datetime(2024, 3, 1, 10, 0)
+    assert parse_timestamp("not a date") is None
+    assert parse_timestamp(None) is None
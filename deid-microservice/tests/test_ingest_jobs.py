@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+
+from app.core.config import settings
+from app.services import ingest_jobs
+
+
+def other_process_job(db, heartbeat_age_seconds):
+    """A running job of another replica whose last heartbeat is heartbeat_age_seconds old."""
+    job = ingest_jobs.create_job(db, "synthea", {})
+    ingest_jobs.start_job(db, job)
+    job.owner = "other-host:4242"
+    job.heartbeat_at = datetime.utcnow() - timedelta(seconds=heartbeat_age_seconds)
+    db.commit()
+    return job
+
+
+def test_stale_job_is_marked_interrupted(db):
+    job = other_process_job(db, settings.ingest_job_stale_seconds + 60)
+
+    assert ingest_jobs.is_stale(job)
+    assert ingest_jobs.mark_interrupted_jobs(db) == 1
+    db.refresh(job)
+    assert job.status == "interrupted"
+
+
+def test_live_job_of_another_process_keeps_running(db):
+    job = other_process_job(db, 5)
+
+    assert not ingest_jobs.is_stale(job)
+    assert ingest_jobs.mark_interrupted_jobs(db) == 0
+    db.refresh(job)
+    assert job.status == "running"
+
+
+def test_own_jobs_are_marked_interrupted(db):
+    running = ingest_jobs.create_job(db, "synthea", {})
+    ingest_jobs.start_job(db, running)
+    queued = ingest_jobs.create_job(db, "hospital", {})
+    done = ingest_jobs.create_job(db, "synthea", {})
+    ingest_jobs.finish_job(db, done, "completed")
+
+    assert ingest_jobs.mark_interrupted_jobs(db) == 2
+    for job in (running, queued, done):
+        db.refresh(job)
+    assert (running.status, queued.status, done.status) == ("interrupted", "interrupted", "completed")
+
+
+def test_save_progress_checkpoints_the_job(db):
+    job = other_process_job(db, settings.ingest_job_stale_seconds + 60)
+    checkpoint = {"offsets": {"Patient.000.ndjson": 500}, "completed": ["Organization.000.ndjson"]}
+
+    ingest_jobs.save_progress(db, job, {"Patient": 500, "Organization": 20}, checkpoint, 10.0)
+
+    status = ingest_jobs.job_status(ingest_jobs.get_job(db, job.job_id))
+    assert not ingest_jobs.is_stale(job)
+    assert status["counts"] == {"Patient": 500, "Organization": 20}
+    assert status["file_offsets"] == {"Patient.000.ndjson": 500}
+    assert status["completed_files"] == ["Organization.000.ndjson"]
+    assert status["resources_per_second"] == 52.0
+
+
+def test_resume_refuses_live_job_of_another_process(db, client):
+    job = other_process_job(db, 5)
+
+    response = client.post(f"/deid/jobs/{job.job_id}/resume")
+
+    assert response.status_code == 409
+    assert client.post("/deid/jobs/unknown/resume").status_code == 404
+    assert client.get("/deid/jobs/unknown").status_code == 404
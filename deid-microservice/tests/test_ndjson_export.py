@@ -0,0 +1,33 @@
+import json
+from functools import partial
+
+from app.services.batch_writer import write_batch
+from app.services.parallel_deid import deidentify_rows
+from app.services.resource_registry import RESOURCE_SPECS, deidentify_resource
+
+
+def store_patients(db, make_patient, count):
+    rows, _ = deidentify_rows(partial(deidentify_resource, "Patient"), [make_patient(i) for i in range(count)])
+    write_batch(db, RESOURCE_SPECS["Patient"].model, rows)
+
+
+def test_export_streams_every_row(db, client, make_patient):
+    store_patients(db, make_patient, 12)
+
+    response = client.get("/deid/export/Patient")
+
+    assert response.status_code == 200
+    assert [json.loads(line)["resource_id"] for line in response.text.splitlines()] == [f"patient-{i}" for i in range(12)]
+
+
+def test_export_limit_returns_first_rows(db, client, make_patient):
+    store_patients(db, make_patient, 12)
+
+    response = client.get("/deid/export/Patient", params={"limit": 5, "gzip": "true"})
+
+    assert response.status_code == 200
+    assert [json.loads(line)["resource_id"] for line in response.text.splitlines()] == [f"patient-{i}" for i in range(5)]
+
+
+def test_export_rejects_non_positive_limit(client):
+    assert client.get("/deid/export/Patient", params={"limit": 0}).status_code == 422
@@ -0,0 +1,87 @@
+import base64
+from datetime import timedelta
+from functools import partial
+
+import pytest
+from sqlalchemy import select
+
+from app.models.observation import Observation
+from app.services.batch_writer import write_batch
+from app.services.pagination import decode_cursor, encode_cursor
+from app.services.parallel_deid import deidentify_rows
+from app.services.resource_registry import RESOURCE_SPECS, deidentify_resource
+
+
+def store(db, resource_type, resources):
+    rows, _ = deidentify_rows(partial(deidentify_resource, resource_type), resources)
+    write_batch(db, RESOURCE_SPECS[resource_type].model, rows)
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(0)) == 0
+    assert decode_cursor(encode_cursor(123456789)) == 123456789
+
+
+@pytest.mark.parametrize("cursor", [
+    "garbage",
+    base64.urlsafe_b64encode(b"[1, 2]").decode(),
+    base64.urlsafe_b64encode(b'{"before": 3}').decode(),
+    base64.urlsafe_b64encode(b'{"after": "x"}').decode(),
+])
+def test_decode_cursor_rejects_malformed_cursors(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
+
+
+def test_cursor_pages_cover_every_row_once(db, client, make_patient):
+    store(db, "Patient", [make_patient(i) for i in range(10)])
+
+    pages, cursor = [], None
+    while True:
+        params = {"limit": 4, **({"cursor": cursor} if cursor else {})}
+        body = client.get("/deid/patients", params=params).json()
+        pages.append([p["resource_id"] for p in body["patients"]])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+
+    assert [len(page) for page in pages] == [4, 4, 2]
+    assert sum(pages, []) == [f"patient-{i}" for i in range(10)]
+
+
+def test_skip_without_cursor_is_an_offset(db, client, make_patient):
+    store(db, "Patient", [make_patient(i) for i in range(10)])
+
+    body = client.get("/deid/patients", params={"skip": 8}).json()
+
+    assert [p["resource_id"] for p in body["patients"]] == ["patient-8", "patient-9"]
+    assert body["next_cursor"] is None
+
+
+def test_bad_cursor_is_a_400(client):
+    response = client.get("/deid/patients", params={"cursor": "garbage"})
+
+    assert response.status_code == 400
+    assert "Invalid cursor" in response.json()["detail"]
+
+
+def test_filters_on_reference_and_date(db, client, make_observation):
+    store(db, "Observation", [make_observation(i, f"patient-{i % 3}") for i in range(12)])
+
+    body = client.get("/deid/observations", params={"patient_resource_id": "patient-1"}).json()
+    assert [o["resource_id"] for o in body["observations"]] == [f"observation-{i}" for i in (1, 4, 7, 10)]
+
+    # Dates are shifted at de-identification: filter around a stored one
+    effective_date = db.scalar(select(Observation.effective_date).where(Observation.resource_id == "observation-5"))
+    params = {"date_from": effective_date.isoformat(), "date_to": (effective_date + timedelta(seconds=1)).isoformat()}
+    ids = [o["resource_id"] for o in client.get("/deid/observations", params=params).json()["observations"]]
+    assert "observation-5" in ids
+    assert all(
+        db.scalar(select(Observation.effective_date).where(Observation.resource_id == i)) == effective_date
+        for i in ids
+    )
+
+
+def test_filter_the_resource_type_lacks_is_a_400(client):
+    assert client.get("/deid/patients", params={"patient_resource_id": "patient-1"}).status_code == 400
+    assert client.get("/deid/patients", params={"date_from": "2020-01-01T00:00:00"}).status_code == 400
@@ -0,0 +1,50 @@
+import asyncio
+from functools import partial
+
+import pytest
+
+from app.services.deid_service import deid_service
+from app.services.parallel_deid import deidentify_parallel, deidentify_rows, get_pool, shutdown_pool
+from app.services.resource_registry import deidentify_resource
+
+
+@pytest.fixture
+def pool():
+    yield get_pool()
+    shutdown_pool()
+
+
+def test_pool_spawns_workers(pool):
+    assert pool._mp_context.get_start_method() == "spawn"
+
+
+@pytest.mark.parametrize("resource_type", ["Patient", "Observation"])
+def test_parallel_matches_single_process(pool, make_patient, make_observation, resource_type):
+    if resource_type == "Patient":
+        resources = [make_patient(i) for i in range(40)]
+    else:
+        resources = [make_observation(i, f"patient-{i % 9}") for i in range(40)]
+    deidentify = partial(deidentify_resource, resource_type)
+
+    expected, expected_used = deidentify_rows(deidentify, resources)
+    rows, used = asyncio.run(deidentify_parallel(deidentify, resources))
+
+    by_id = lambda rows: sorted(rows, key=lambda row: row["resource_id"])
+    assert by_id(rows) == by_id(expected)
+    assert used == expected_used
+
+
+def test_parallel_applies_pinned_pseudonyms(pool, make_patient):
+    resources = [make_patient(i) for i in range(10)]
+    deidentify = partial(deidentify_resource, "Patient")
+    expected, _ = deidentify_rows(deidentify, resources)
+    pinned = {deid_service.pseudonyms.key("given", "Given3"): "Pinned"}
+
+    rows, _ = asyncio.run(deidentify_parallel(deidentify, resources, pinned))
+
+    given_names = {row["resource_id"]: row["given_name"] for row in rows}
+    for resource, row in zip(resources, expected):
+        if resource["name"][0]["given"][0] == "Given3":
+            assert given_names[row["resource_id"]] == "Pinned"
+        else:
+            assert given_names[row["resource_id"]] == row["given_name"]
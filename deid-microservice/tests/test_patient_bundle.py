@@ -0,0 +1,56 @@
+from functools import partial
+
+from app.core.config import settings
+from app.services.batch_writer import write_batch
+from app.services.parallel_deid import deidentify_rows
+from app.services.patient_bundle import patient_bundles
+from app.services.resource_registry import RESOURCE_SPECS, deidentify_resource
+
+
+def store(db, resource_type, resources):
+    rows, _ = deidentify_rows(partial(deidentify_resource, resource_type), resources)
+    write_batch(db, RESOURCE_SPECS[resource_type].model, rows)
+
+
+def store_patients_with_observations(db, make_patient, make_observation):
+    store(db, "Patient", [make_patient(i) for i in range(3)])
+    store(db, "Observation", [make_observation(i, f"patient-{i % 3}") for i in range(9)])
+
+
+def test_patient_bundles_group_resources_per_patient(db, make_patient, make_observation):
+    store_patients_with_observations(db, make_patient, make_observation)
+
+    bundles, missing = patient_bundles(db, ["patient-2", "unknown", "patient-0", "patient-2"])
+
+    assert [bundle["patient"].resource_id for bundle in bundles] == ["patient-2", "patient-0"]
+    assert [o.resource_id for o in bundles[0]["observations"]] == ["observation-2", "observation-5", "observation-8"]
+    assert [o.resource_id for o in bundles[1]["observations"]] == ["observation-0", "observation-3", "observation-6"]
+    assert bundles[0]["encounters"] == []
+    assert missing == ["unknown"]
+
+
+def test_everything_returns_the_patient_bundle(db, client, make_patient, make_observation):
+    store_patients_with_observations(db, make_patient, make_observation)
+
+    response = client.get("/deid/patients/patient-1/everything")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["patient"]["resource_id"] == "patient-1"
+    assert [o["resource_id"] for o in body["observations"]] == ["observation-1", "observation-4", "observation-7"]
+    assert client.get("/deid/patients/unknown/everything").status_code == 404
+
+
+def test_batch_everything_reports_missing_patients(db, client, make_patient, make_observation, monkeypatch):
+    store_patients_with_observations(db, make_patient, make_observation)
+
+    response = client.post("/deid/patients/everything", json={"patient_resource_ids": ["patient-0", "unknown"]})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [bundle["patient"]["resource_id"] for bundle in body["patients"]] == ["patient-0"]
+    assert body["missing"] == ["unknown"]
+
+    monkeypatch.setattr(settings, "everything_batch_max_patients", 1)
+    response = client.post("/deid/patients/everything", json={"patient_resource_ids": ["patient-0", "patient-1"]})
+    assert response.status_code == 400
@@ -0,0 +1,79 @@
+import json
+from functools import partial
+
+import pytest
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.models.patient import Patient
+from app.models.raw_fhir_resource import RawFhirResource
+from app.services import raw_store
+from app.services.batch_writer import write_batch
+from app.services.parallel_deid import deidentify_rows
+from app.services.resource_registry import deidentify_resource
+
+
+def test_check_storage_rejects_jsonb_outside_postgresql():
+    assert raw_store.check_storage("jsonb", "postgresql+psycopg2://user@host/db") == "jsonb"
+    assert raw_store.check_storage("compressed", "sqlite:///deid.db") == "compressed"
+    assert raw_store.check_storage("inline", "mysql://user@host/db") == "inline"
+    with pytest.raises(ValueError, match="jsonb is not supported on sqlite"):
+        raw_store.check_storage("jsonb", "sqlite:///deid.db")
+
+
+def test_compress_round_trip():
+    raw_fhir_data = json.dumps({"resourceType": "Patient", "id": "patient-0", "note": "é" * 200})
+
+    codec, data = raw_store.compress(raw_fhir_data)
+
+    assert len(data) < len(raw_fhir_data)
+    assert raw_store.decompress(codec, data) == raw_fhir_data
+    with pytest.raises(ValueError):
+        raw_store.decompress("lz4", data)
+
+
+def test_compressed_storage_keeps_only_committed_raw_rows(db, make_patient, monkeypatch):
+    monkeypatch.setattr(settings, "raw_fhir_storage", "compressed")
+    resources = [make_patient(i) for i in range(4)]
+    rows, _ = deidentify_rows(partial(deidentify_resource, "Patient"), resources)
+    write_batch(db, Patient, [dict(rows[2])])
+
+    raw_rows = raw_store.detach_raw_rows("Patient", rows)
+    # patient-2 is already stored: its row is skipped, and so is its raw row
+    assert write_batch(db, Patient, rows, raw_store.raw_rows_writer(raw_rows)) == 3
+
+    assert all(row["raw_fhir_data"] is None for row in rows)
+    stored = {
+        resource_id: json.loads(raw_store.decompress(codec, data))
+        for resource_id, codec, data in db.execute(
+            select(RawFhirResource.resource_id, RawFhirResource.codec, RawFhirResource.data)
+        )
+    }
+    assert stored == {r["id"]: r for r in resources if r["id"] != "patient-2"}
+
+
+def test_inline_storage_detaches_nothing(make_patient):
+    rows, _ = deidentify_rows(partial(deidentify_resource, "Patient"), [make_patient(0)])
+
+    assert raw_store.detach_raw_rows("Patient", rows) == []
+    assert raw_store.raw_rows_writer([]) is None
+    assert rows[0]["raw_fhir_data"] is not None
+
+
+def test_raw_query_is_disabled_by_default(client, monkeypatch):
+    monkeypatch.setattr(settings, "raw_query_enabled", False)
+
+    assert client.get("/deid/raw-query", params={"resource_type": "Patient"}).status_code == 404
+
+
+def test_raw_query_requires_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "raw_query_enabled", True)
+    monkeypatch.setattr(settings, "raw_query_token", "s3cret")
+    params = {"resource_type": "Patient"}
+
+    assert client.get("/deid/raw-query", params=params).status_code == 401
+    assert client.get("/deid/raw-query", params=params, headers={"Authorization": "Bearer wrong"}).status_code == 401
+    # Authorized, but JSON path queries need PostgreSQL
+    response = client.get("/deid/raw-query", params=params, headers={"Authorization": "Bearer s3cret"})
+    assert response.status_code == 400
+    assert "PostgreSQL" in response.json()["detail"]
@@ -0,0 +1,76 @@
+import asyncio
+from functools import partial
+
+from sqlalchemy import select
+
+from app.api.deid_routes import ingest_chunk
+from app.db.session import AsyncSessionLocal, async_engine
+from app.models.patient import Patient
+from app.services.parallel_deid import deidentify_rows
+from app.services.resource_registry import deidentify_resource
+from app.services.upsert_writer import content_hash, filter_changed_resources, upsert_rows
+
+
+def upsert(resources):
+    async def run():
+        async with AsyncSessionLocal() as db:
+            stored = await ingest_chunk("Patient", resources, db, "upsert")
+        # aiosqlite connections are bound to this event loop
+        await async_engine.dispose()
+        return stored
+    return asyncio.run(run())
+
+
+def hashed_rows(resources):
+    rows, _ = deidentify_rows(partial(deidentify_resource, "Patient"), resources)
+    for row, fhir_resource in zip(rows, resources):
+        row["content_hash"] = content_hash(fhir_resource)
+    return rows
+
+
+def test_content_hash_ignores_key_order():
+    assert content_hash({"id": "a", "gender": "male"}) == content_hash({"gender": "male", "id": "a"})
+    assert content_hash({"id": "a", "gender": "male"}) != content_hash({"id": "a", "gender": "female"})
+
+
+def test_reupserting_unchanged_resources_writes_nothing(db, make_patient):
+    resources = [make_patient(i) for i in range(10)]
+
+    assert upsert(resources) == 10
+    assert upsert(resources) == 0
+    assert len(db.execute(select(Patient.id)).all()) == 10
+
+
+def test_upsert_rewrites_only_changed_resources(db, make_patient):
+    upsert([make_patient(i) for i in range(10)])
+    resources = [make_patient(i) for i in range(10)]
+    resources[4]["gender"] = "other"
+    resources.append(make_patient(10))
+
+    assert upsert(resources) == 2
+    assert db.scalar(select(Patient.gender).where(Patient.resource_id == "patient-4")) == "other"
+    assert db.scalar(select(Patient.resource_id).where(Patient.resource_id == "patient-10")) == "patient-10"
+
+
+def test_filter_changed_resources_keeps_new_and_changed(db, make_patient):
+    upsert_rows(db, Patient, hashed_rows([make_patient(i) for i in range(3)]))
+    resources = [make_patient(i) for i in range(4)] + [make_patient(3)]
+    resources[1]["gender"] = "other"
+    hashes = {r["id"]: content_hash(r) for r in resources}
+
+    changed = filter_changed_resources(db, Patient, resources, hashes)
+
+    assert [r["id"] for r in changed] == ["patient-1", "patient-3"]
+
+
+def test_upsert_rows_leaves_rows_with_same_hash_untouched(db, make_patient):
+    rows = hashed_rows([make_patient(i) for i in range(3)])
+    upsert_rows(db, Patient, rows)
+    rows[0]["gender"] = "other"  # same content_hash: the ON CONFLICT WHERE skips it
+    rows[1]["gender"] = "other"
+    rows[1]["content_hash"] = "0" * 64
+
+    upsert_rows(db, Patient, rows)
+
+    genders = dict(db.execute(select(Patient.resource_id, Patient.gender)).all())
+    assert genders == {"patient-0": "male", "patient-1": "other", "patient-2": "male"}
@@ -10,6 +10,12 @@ import numpy as np
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 
+try:
+    # orjson parses raw_fhir_data several times faster; optional
+    import orjson as json_codec
+except ImportError:
+    import json as json_codec
+
 # Load environment variables
 load_dotenv()
 
@@ -17,6 +23,19 @@ from featurizer.models import PatientFeatures
 
 logger = logging.getLogger("featurizer")
 
+# Patients per POST deid/patients/everything (at most EVERYTHING_BATCH_MAX_PATIENTS of the deid service)
+EVERYTHING_BATCH_SIZE = int(os.getenv("EVERYTHING_BATCH_SIZE", "100"))
+
+# Deid endpoint name (the resources keys used by the feature extraction) -> $everything bundle key
+EVERYTHING_KEYS = {
+    "encounters": "encounters",
+    "conditions": "conditions",
+    "observations": "observations",
+    "medication-requests": "medication_requests",
+    "diagnostic-reports": "diagnostic_reports",
+    "document-references": "document_references",
+}
+
 
 class FeaturizerService:
     """Core featurizer: fetch de-identified resources, extract structured features,
@@ -68,48 +87,74 @@ class FeaturizerService:
         r.raise_for_status()
         return r.json()
 
+    def _bundle_resources(self, bundle: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+        """Resources of a deid $everything bundle, keyed by deid endpoint name."""
+        resources = {"patients": [bundle["patient"]] if bundle.get("patient") else []}
+        for endpoint_name, key in EVERYTHING_KEYS.items():
+            resources[endpoint_name] = bundle.get(key) or []
+        return resources
+
+    def export_resources(self, resource_type: str, limit: Optional[int] = None):
+        """
+        Iterate over the rows of a deid table, streamed from deid/export/{resource_type}
+        (NDJSON). With limit, only the first limit rows are exported and read.
+        """
+        url = f"{self.base_url.rstrip('/')}/deid/export/{resource_type}"
+        params = {"gzip": "true"}
+        if limit is not None:
+            params["limit"] = limit
+        read = 0
+        with self.client.stream("GET", url, params=params) as r:
+            r.raise_for_status()
+            for line in r.iter_lines():
+                if not line:
+                    continue
+                yield json_codec.loads(line)
+                read += 1
+                if limit is not None and read >= limit:
+                    # Closing the stream stops the export
+                    return
+
     def fetch_resources_for_patient(self, patient_id: str) -> Dict[str, List[Dict[str, Any]]]:
-        endpoints = [
-            "deid/patients?limit=10000",  # Get all patients
-            "deid/encounters?limit=10000",  # Get all encounters
-            "deid/conditions?limit=10000",  # Get all conditions
-            "deid/observations?limit=10000",  # Get all observations
-            "deid/medication-requests?limit=10000",  # Get all medication requests
-            "deid/diagnostic-reports?limit=10000",  # Get all diagnostic reports
-            "deid/document-references?limit=10000",  # Get all document references
-        ]
-        resources: Dict[str, List[Dict[str, Any]]] = {}
-        for ep in endpoints:
-            try:
-                data = self._get(ep)
-                # allow either plain list or wrapper dict
-                items = data if isinstance(data, list) else list(data.values())[0] if isinstance(data, dict) else []
-                
-                # Different filtering logic for different resource types
-                endpoint_name = ep.split('/')[-1].split('?')[0]  # Remove query params
-                
-                if endpoint_name == "patients":
-                    # For patients, match resource_id
-                    filtered = [i for i in items if i.get("resource_id") == patient_id]
-                else:
-                    # For other resources, match patient_resource_id to link to patient
-                    filtered = [i for i in items if i.get("patient_resource_id") == patient_id]
-                
-                resources[endpoint_name] = filtered
-                logger.debug(f"Fetched {len(filtered)} {endpoint_name} for patient {patient_id}")
-                
-                # Debug: Log if no encounters found for this patient
-                if endpoint_name == "encounters" and len(filtered) == 0:
-                    logger.warning(f"No encounters found for patient {patient_id} - checking if encounters exist in DEID")
-                    logger.warning(f"Total {endpoint_name} in DEID service: {len(items)}")
-                    if len(items) > 0:
-                        sample_patient_ids = [item.get("patient_resource_id") for item in items[:5]]
-                        logger.warning(f"Sample patient_resource_ids in encounters: {sample_patient_ids}")
-                
-            except Exception as e:
-                logger.warning("Failed fetching %s: %s", ep, e)
-                resources[ep.split('/')[-1].split('?')[0]] = []
+        """
+        The patient and its encounters, conditions, observations, medication
+        requests, diagnostic reports and document references, in one call to
+        deid/patients/{id}/everything (each type is read from an index there).
+        """
+        try:
+            bundle = self._get(f"deid/patients/{patient_id}/everything")
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code != 404:
+                logger.warning("Failed fetching resources of patient %s: %s", patient_id, e)
+            bundle = {}
+        except Exception as e:
+            logger.warning("Failed fetching resources of patient %s: %s", patient_id, e)
+            bundle = {}
+
+        resources = self._bundle_resources(bundle)
+        if not resources["encounters"]:
+            logger.warning(f"No encounters found for patient {patient_id} in DEID")
+        return resources
 
+    def fetch_resources_for_patients(self, patient_ids: List[str]) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+        """
+        Resources of many patients (see fetch_resources_for_patient), one POST
+        deid/patients/everything per EVERYTHING_BATCH_SIZE patients.
+        Patients unknown to the deid service get empty resource lists.
+        """
+        resources: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+        for start in range(0, len(patient_ids), EVERYTHING_BATCH_SIZE):
+            batch = patient_ids[start:start + EVERYTHING_BATCH_SIZE]
+            r = self.client.post(
+                f"{self.base_url.rstrip('/')}/deid/patients/everything",
+                json={"patient_resource_ids": batch},
+            )
+            r.raise_for_status()
+            data = r.json()
+            for bundle in data["patients"]:
+                resources[bundle["patient"]["resource_id"]] = self._bundle_resources(bundle)
+            for pid in data["missing"]:
+                resources[pid] = self._bundle_resources({})
         return resources
 
     def _decode_attachments(self, doc_refs: List[Dict[str, Any]]) -> List[str]:
@@ -121,9 +166,7 @@ class FeaturizerService:
                 raw = dr.get("raw_fhir_data")
                 if raw:
                     try:
-                        import json
-
-                        raw_obj = json.loads(raw)
+                        raw_obj = json_codec.loads(raw)
                         content = raw_obj.get("content", [])
                         if content:
                             a = content[0].get("attachment", {})
@@ -439,8 +482,9 @@ class FeaturizerService:
 
         return None
 
-    def featurize_patient(self, patient_id: str) -> Dict[str, Any]:
-        resources = self.fetch_resources_for_patient(patient_id)
+    def featurize_patient(self, patient_id: str, resources: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> Dict[str, Any]:
+        if resources is None:
+            resources = self.fetch_resources_for_patient(patient_id)
         structured = self.extract_structured_features(resources)
 
         doc_refs = resources.get("document-references", []) or []
@@ -537,8 +581,13 @@ class FeaturizerService:
             logger.error(f"Database query error: {e}")
             return None
 
-    def featurize_patient_with_db(self, patient_id: str, force_refresh: bool = False) -> Dict[str, Any]:
-        """Featurize patient with database caching"""
+    def featurize_patient_with_db(
+        self,
+        patient_id: str,
+        force_refresh: bool = False,
+        resources: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+    ) -> Dict[str, Any]:
+        """Featurize patient with database caching (resources: prefetched, see fetch_resources_for_patients)"""
         # Check database first unless force refresh
         if not force_refresh and self.db:
             cached = self.get_features_from_db(patient_id)
@@ -547,7 +596,7 @@ class FeaturizerService:
                 return cached.to_dict()
         
         # Generate features
-        features = self.featurize_patient(patient_id)
+        features = self.featurize_patient(patient_id, resources)
         
         # Save to database
         if self.db:
@@ -557,3 +606,31 @@ class FeaturizerService:
                 return saved.to_dict()
         
         return features
+
+    def featurize_patients_with_db(self, patient_ids: List[str], force_refresh: bool = False):
+        """
+        featurize_patient_with_db over many patients, yielding (patient_id, features
+        or the exception raised for that patient) in order. The resources of the
+        patients without cached features are fetched EVERYTHING_BATCH_SIZE at a time.
+        """
+        for start in range(0, len(patient_ids), EVERYTHING_BATCH_SIZE):
+            batch = patient_ids[start:start + EVERYTHING_BATCH_SIZE]
+            cached = {}
+            if not force_refresh and self.db:
+                cached = {
+                    f.patient_resource_id: f
+                    for f in self.db.query(PatientFeatures).filter(PatientFeatures.patient_resource_id.in_(batch))
+                }
+            try:
+                prefetched = self.fetch_resources_for_patients([pid for pid in batch if pid not in cached])
+            except Exception as e:
+                logger.warning("Batch fetch failed (%s), fetching patients one by one", e)
+                prefetched = {}
+            for pid in batch:
+                try:
+                    if pid in cached:
+                        yield pid, cached[pid].to_dict()
+                    else:
+                        yield pid, self.featurize_patient_with_db(pid, True, prefetched.get(pid))
+                except Exception as e:
+                    yield pid, e
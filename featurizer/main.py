@@ -226,12 +226,11 @@ def featurize_bulk(request: BulkFeaturizeRequest, db: Session = Depends(get_db))
     try:
         service = FeaturizerService(base_url=BASE, db_session=db)
         results = []
-        for pid in request.patient_ids:
-            try:
-                features = service.featurize_patient_with_db(pid)
+        for pid, features in service.featurize_patients_with_db(request.patient_ids):
+            if isinstance(features, Exception):
+                results.append({"patient_resource_id": pid, "error": str(features)})
+            else:
                 results.append(features)
-            except Exception as e:
-                results.append({"patient_resource_id": pid, "error": str(e)})
         return {"rows": results, "total_processed": len(results)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -336,28 +335,13 @@ def featurize_all_patients(force_refresh: bool = Query(False, description="Force
     try:
         service = FeaturizerService(base_url=BASE, db_session=db)
         
-        # Get all patient IDs from DeID service (request large limit to get all patients)
-        patients_data = service._get("deid/patients?limit=10000")
-        
-        # Handle wrapped response format
-        if isinstance(patients_data, dict):
-            # Find the patients array in the response
-            patients = None
-            for key, value in patients_data.items():
-                if isinstance(value, list):
-                    patients = value
-                    break
-            if patients is None:
-                patients = []
-        else:
-            patients = patients_data if isinstance(patients_data, list) else []
-            
-        patient_ids = [p.get("resource_id") or p.get("patient_resource_id") for p in patients if p.get("resource_id") or p.get("patient_resource_id")]
-        
-        # Apply limit if specified
+        # Get the patient IDs from DeID service (streamed export of the patients
+        # table, only its first `limit` rows when a limit is given)
         if limit is not None and limit > 0:
-            patient_ids = patient_ids[:limit]
             print(f"Limited to first {limit} patients")
+        else:
+            limit = None
+        patient_ids = [p["resource_id"] for p in service.export_resources("Patient", limit)]
         
         if not patient_ids:
             return {"status": "no_patients", "message": "No patients found in DeID service"}
@@ -366,18 +350,16 @@ def featurize_all_patients(force_refresh: bool = Query(False, description="Force
         results = []
         errors = []
         
-        for i, pid in enumerate(patient_ids):
-            try:
-                features = service.featurize_patient_with_db(pid, force_refresh)
-                results.append(features)
-                
-                # Log progress for large datasets
-                if (i + 1) % 10 == 0:
-                    print(f"Processed {i + 1}/{len(patient_ids)} patients")
-                    
-            except Exception as e:
-                error_info = {"patient_id": pid, "error": str(e)}
+        for i, (pid, features) in enumerate(service.featurize_patients_with_db(patient_ids, force_refresh)):
+            if isinstance(features, Exception):
+                error_info = {"patient_id": pid, "error": str(features)}
                 errors.append(error_info)
+                continue
+            results.append(features)
+            
+            # Log progress for large datasets
+            if (i + 1) % 10 == 0:
+                print(f"Processed {i + 1}/{len(patient_ids)} patients")
         
         return {
             "status": "completed",